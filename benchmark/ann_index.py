@@ -0,0 +1,107 @@
+"""Recall, latency and memory of the index types of the retriever.
+
+Every index type of `racp.vector_index` is built on the same vectors and searched with the
+same queries, one query at a time like the retriever does. Recall@k is the part of the k
+nearest neighbours of the flat index that an index finds, p50 and p99 are the latencies of
+the queries and MiB the size of the index on disk. The IVF indexes are searched with every
+--nprobe and the HNSW index with every --ef-search.
+
+The vectors are the ones of an embedding store namespace with --store, or synthetic ones
+drawn around random centres, which are easier to search than real embeddings. It needs faiss.
+
+    python benchmark/ann_index.py --size 100000 --dim 768 --k 10
+    python benchmark/ann_index.py --store ../cache/embeddings/sentence-transformers_all-mpnet-base-v2
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+from racp.embedding_store import EmbeddingStore
+from racp.vector_index import INDEX_TYPES, index_memory, index_params, make_index, \
+    resolve_params, set_search_params, train_index
+
+
+def make_vectors(size, dim, centres=1000, seed=0):
+    rng = np.random.default_rng(seed)
+    means = rng.standard_normal((centres, dim)).astype(np.float32)
+    vectors = means[rng.integers(0, centres, size)] + 0.5 * rng.standard_normal((size, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def load_vectors(path):
+    store = EmbeddingStore(*os.path.split(os.path.normpath(path)))
+    if not len(store):
+        raise ValueError(f"The embedding store {path} is empty.")
+    return np.ascontiguousarray(store._vectors, dtype=np.float32)
+
+
+def search(index, queries, k):
+    ids, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        _, found = index.search(query[None], k)
+        latencies.append(time.perf_counter() - start)
+        ids.append(found[0])
+    return np.array(ids), np.array(latencies) * 1000
+
+
+def recall(ids, truth):
+    return np.mean([len(set(found) & set(true)) / len(true) for found, true in zip(ids, truth)])
+
+
+def main():
+    parser = argparse.ArgumentParser("Benchmark of the index types")
+    parser.add_argument("--store", default=None, help="The directory of an embedding store namespace")
+    parser.add_argument("--size", default=100000, type=int)
+    parser.add_argument("--dim", default=768, type=int)
+    parser.add_argument("--queries", default=1000, type=int)
+    parser.add_argument("--k", default=10, type=int)
+    parser.add_argument("--types", default=list(INDEX_TYPES), nargs="+", choices=list(INDEX_TYPES))
+    parser.add_argument("--nprobe", default=[4, 16, 64], type=int, nargs="+")
+    parser.add_argument("--ef-search", default=[16, 64, 256], type=int, nargs="+")
+    parser.add_argument("--nlist", default=None, type=int)
+    parser.add_argument("--pq-m", default=16, type=int)
+    parser.add_argument("--threads", default=1, type=int)
+    args = parser.parse_args()
+
+    import faiss
+    faiss.omp_set_num_threads(args.threads)
+    vectors = load_vectors(args.store) if args.store else make_vectors(args.size + args.queries, args.dim)
+    # The queries are vectors left out of the index, perturbed a little.
+    rng = np.random.default_rng(1)
+    queries = vectors[-args.queries:] + 0.05 * rng.standard_normal((args.queries, vectors.shape[1])).astype(np.float32)
+    vectors = vectors[:-args.queries]
+    print(f"{len(vectors)} vectors of size {vectors.shape[1]}, {len(queries)} queries, k={args.k}")
+    print(f"{'index':>8} {'search':>13} {'build s':>8} {'MiB':>8} {'recall':>7} {'p50 ms':>7} {'p99 ms':>7}")
+
+    truth = None
+    for index_type in ["flat"] + [t for t in args.types if t != "flat"]:
+        params = resolve_params(index_params(index_type=index_type, nlist=args.nlist, pq_m=args.pq_m),
+                                len(vectors))
+        start = time.perf_counter()
+        index = make_index(vectors.shape[1], params)
+        train_index(index, vectors[np.random.default_rng(0).permutation(len(vectors))[:params["train_size"]]])
+        index.add(vectors)
+        build = time.perf_counter() - start
+        memory = index_memory(index) / 2**20
+        if index_type in ("ivf", "ivfpq"):
+            settings = [("nprobe", value) for value in args.nprobe]
+        elif index_type == "hnsw":
+            settings = [("ef_search", value) for value in args.ef_search]
+        else:
+            settings = [(None, None)]
+        for name, value in settings:
+            if name is not None:
+                set_search_params(index, dict(params, **{name: value}))
+            ids, latencies = search(index, queries, args.k)
+            if truth is None:
+                truth = ids
+            label = f"{name}={value}" if name is not None else "exact" if index_type == "flat" else "-"
+            print(f"{index_type:>8} {label:>13} {build:>8.1f} {memory:>8.1f} {recall(ids, truth):>7.3f} "
+                  f"{np.percentile(latencies, 50):>7.3f} {np.percentile(latencies, 99):>7.3f}")
+
+
+if __name__ == "__main__":
+    main()
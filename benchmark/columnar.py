@@ -0,0 +1,104 @@
+"""Compare loading a RawSet from json files, a jsonl file and the columnar format.
+
+A synthetic dataset of `--papers` papers with `--content` characters of text each is saved in
+the three formats. Each format is then loaded in its own process, which reports the load
+time, the time of `publication_years` and `paper_citations`, and the memory the dataset takes
+(RSS after loading and peak RSS, both above the RSS before loading, from /proc).
+
+    python benchmark/columnar.py --papers 20000 --content 20000
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from loguru import logger
+
+from racp.data import PaperItem, RawSet, convert_to_columnar
+
+
+def make_dataset(path, papers, content):
+    random.seed(0)
+    words = "retrieval citation graph embedding transformer benchmark dataset paper".split()
+    text = " ".join(random.choice(words) for _ in range(content // 8))[:content]
+    for i in range(papers):
+        item = PaperItem(logger=logger)
+        item.arxiv_id = f"{2301 + i // 100000}.{i % 100000:05d}"
+        item.ss_id = f"{i:040x}"
+        item.citations = set(f"{random.getrandbits(160):040x}" for _ in range(random.randint(0, 40)))
+        item.references = set(f"{random.getrandbits(160):040x}" for _ in range(30))
+        item.authors = [str(random.randint(0, 10 * papers)) for _ in range(4)]
+        item.publication = ["JournalArticle"]
+        item.date = f"20{random.randint(18, 23)}-01-01"
+        item.title = f"Paper {i}"
+        item.abstract = text[:1000]
+        item.content = text
+        item.save_json(path)
+
+
+def memory(field):
+    # ru_maxrss survives exec, so it would report the parent's peak, read /proc instead.
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) / 1024
+
+
+def run(mode, path):
+    base = memory("VmRSS")
+    start = time.perf_counter()
+    if mode == "jsonl":
+        dataset = RawSet()
+        dataset.load(path)
+    else:
+        dataset = RawSet(path)
+    load = time.perf_counter() - start
+    rss = memory("VmRSS") - base
+    start = time.perf_counter()
+    dataset.publication_years()
+    dataset.paper_citations()
+    stats = time.perf_counter() - start
+    return {"papers": len(dataset), "load": load, "stats": stats, "rss": rss,
+            "peak": memory("VmHWM") - base}
+
+
+def main():
+    parser = argparse.ArgumentParser("Benchmark of the RawSet formats")
+    parser.add_argument("--papers", default=20000, type=int)
+    parser.add_argument("--content", default=20000, type=int, help="Characters of text per paper")
+    parser.add_argument("--mode", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--path", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    logger.remove()
+
+    if args.mode is not None:
+        print(json.dumps(run(args.mode, args.path)))
+        return
+
+    with tempfile.TemporaryDirectory() as root:
+        paths = {
+            "directory": os.path.join(root, "data"),
+            "jsonl": os.path.join(root, "data.jsonl"),
+            "columnar": os.path.join(root, "data.columnar"),
+        }
+        os.makedirs(paths["directory"])
+        make_dataset(paths["directory"], args.papers, args.content)
+        dataset = RawSet(paths["directory"])
+        dataset.save(paths["jsonl"])
+        convert_to_columnar(paths["directory"], paths["columnar"], logger)
+        del dataset
+        print(f"{'format':>10} {'load s':>8} {'stats s':>8} {'RSS MiB':>8} {'peak MiB':>9}")
+        for mode, path in paths.items():
+            command = [sys.executable, __file__, "--mode", mode, "--path", path]
+            out = subprocess.run(command, capture_output=True, text=True, check=True)
+            result = json.loads(out.stdout.strip().splitlines()[-1])
+            print(f"{mode:>10} {result['load']:>8.3f} {result['stats']:>8.3f} {result['rss']:>8.0f} "
+                  f"{result['peak']:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
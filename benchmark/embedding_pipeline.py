@@ -0,0 +1,60 @@
+"""Docs/sec of the CPU embedding pipeline by batch size and number of workers.
+
+The abstracts are synthetic, with lengths drawn from a lognormal law so that short and long
+texts are mixed, like real abstracts. "encode" is one `SentenceTransformer.encode` call over
+all the texts in this process, what `HuggingFaceEmbeddings.embed_documents` does. The
+pipeline rows are `EmbeddingPipeline` with every batch size and number of workers, each
+worker using the CPUs divided by the workers as threads.
+
+It needs sentence-transformers and downloads the model on first use.
+
+    python benchmark/embedding_pipeline.py --texts 5000 --batch-sizes 16 32 64 --processes 1 2 4
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+from racp.retriver import EmbeddingPipeline
+
+
+def make_texts(count, seed=0):
+    rng = np.random.default_rng(seed)
+    words = "retrieval citation graph embedding transformer benchmark dataset paper model".split()
+    lengths = np.clip(rng.lognormal(4.5, 0.6, count), 5, 600).astype(int)
+    return [" ".join(rng.choice(words, length)) for length in lengths]
+
+
+def main():
+    parser = argparse.ArgumentParser("Benchmark of the embedding pipeline")
+    parser.add_argument("--model", default="sentence-transformers/all-MiniLM-L6-v2")
+    parser.add_argument("--texts", default=5000, type=int)
+    parser.add_argument("--batch-sizes", default=[16, 32, 64], type=int, nargs="+")
+    parser.add_argument("--processes", default=[1, 2, 4], type=int, nargs="+")
+    parser.add_argument("--max-tokens", default=None, type=int)
+    args = parser.parse_args()
+
+    from sentence_transformers import SentenceTransformer
+    texts = make_texts(args.texts)
+    model = SentenceTransformer(args.model, device="cpu")
+    print(f"{os.cpu_count()} CPUs, {args.texts} texts of {np.mean([len(t.split()) for t in texts]):.0f} words")
+    print(f"{'run':>10} {'batch':>6} {'workers':>8} {'docs/s':>8}")
+
+    start = time.perf_counter()
+    expected = model.encode(texts, batch_size=32, show_progress_bar=False, convert_to_numpy=True)
+    print(f"{'encode':>10} {32:>6} {1:>8} {len(texts) / (time.perf_counter() - start):>8.1f}")
+
+    for processes in args.processes:
+        for batch_size in args.batch_sizes:
+            pipeline = EmbeddingPipeline(args.model, processes=processes, batch_size=batch_size,
+                                         max_tokens=args.max_tokens, model=model)
+            start = time.perf_counter()
+            vectors = pipeline.embed(texts)
+            speed = len(texts) / (time.perf_counter() - start)
+            assert np.allclose(vectors, expected, atol=1e-4)
+            print(f"{'pipeline':>10} {batch_size:>6} {processes:>8} {speed:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Compare the per-vector file cache with the EmbeddingStore.
+
+The file cache stores every vector as a json file named after the hash of its text, the way
+`CacheBackedEmbeddings` over a `LocalFileStore` did. Both stores are filled with `--vectors`
+random vectors, then opened again and asked for all of them at once, as a retriever
+starting up would. "files" is the number of files each store takes.
+
+    python benchmark/embedding_store.py --vectors 100000 --dim 768
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from racp.embedding_store import EmbeddingStore
+
+
+def file_put(path, texts, vectors):
+    for text, vector in zip(texts, vectors.tolist()):
+        key = hashlib.sha1(text.encode()).hexdigest()
+        with open(os.path.join(path, key), "wb") as f:
+            f.write(json.dumps(vector).encode())
+
+
+def file_get(path, texts):
+    vectors = []
+    for text in texts:
+        key = hashlib.sha1(text.encode()).hexdigest()
+        with open(os.path.join(path, key), "rb") as f:
+            vectors.append(json.loads(f.read()))
+    return np.array(vectors, dtype=np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser("Benchmark of the embedding stores")
+    parser.add_argument("--vectors", default=50000, type=int)
+    parser.add_argument("--dim", default=384, type=int)
+    parser.add_argument("--batch", default=1000, type=int, help="Vectors written per call")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    texts = [f"chunk {i} of some paper" for i in range(args.vectors)]
+    vectors = rng.standard_normal((args.vectors, args.dim)).astype(np.float32)
+    root = tempfile.mkdtemp()
+    try:
+        print(f"{'store':>10} {'write s':>8} {'open s':>8} {'lookup s':>9} {'files':>7} {'MiB':>7}")
+        path = os.path.join(root, "files")
+        os.makedirs(path)
+        start = time.perf_counter()
+        for i in range(0, args.vectors, args.batch):
+            file_put(path, texts[i:i + args.batch], vectors[i:i + args.batch])
+        write = time.perf_counter() - start
+        start = time.perf_counter()
+        found = file_get(path, texts)
+        lookup = time.perf_counter() - start
+        assert np.allclose(found, vectors)
+        size = sum(entry.stat().st_size for entry in os.scandir(path))
+        print(f"{'files':>10} {write:>8.2f} {0:>8.2f} {lookup:>9.2f} {len(os.listdir(path)):>7} "
+              f"{size / 2**20:>7.1f}")
+
+        path = os.path.join(root, "store")
+        store = EmbeddingStore(path, "model")
+        start = time.perf_counter()
+        for i in range(0, args.vectors, args.batch):
+            store.add(texts[i:i + args.batch], vectors[i:i + args.batch])
+        write = time.perf_counter() - start
+        start = time.perf_counter()
+        store = EmbeddingStore(path, "model")
+        opened = time.perf_counter() - start
+        start = time.perf_counter()
+        found, hit = store.get(texts)
+        lookup = time.perf_counter() - start
+        assert hit.all() and np.array_equal(found, vectors)
+        files = os.listdir(os.path.join(path, "model"))
+        size = sum(os.path.getsize(os.path.join(path, "model", name)) for name in files)
+        print(f"{'store':>10} {write:>8.2f} {opened:>8.2f} {lookup:>9.2f} {len(files):>7} "
+              f"{size / 2**20:>7.1f}")
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Benchmark `racp.crawl.get_ids` against a local stand-in of the arXiv listings.
+
+Every listing month has `--papers` papers, so one month costs one count page plus
+`papers // 100 + 1` id pages. The server sleeps `--latency` seconds before answering
+to simulate a remote host. The crawl is repeated for every concurrency level and
+pages/sec is reported.
+
+    python benchmark/get_ids.py --years 1 --fields cs.IR cs.CV --concurrency 1 4 16
+"""
+import argparse
+import os
+import tempfile
+import time
+from urllib.parse import parse_qs, urlsplit
+
+from loguru import logger
+
+from racp import crawl
+from mock_server import MockHandler, MockServer
+
+
+class ListingHandler(MockHandler):
+    papers = 250
+
+    def respond(self, method, path, body):
+        url = urlsplit(path)
+        month = url.path.rstrip("/").split("/")[-1]
+        query = parse_qs(url.query)
+        if "skip" not in query:
+            page = f"<html><body><small>[ total of {self.papers} entries: 1-25 ]</small></body></html>"
+        else:
+            skip = int(query["skip"][0])
+            links = "".join(
+                f'<a href="/pdf/{month}.{i:05d}" title="Download PDF">pdf</a>'
+                for i in range(skip, min(skip + 100, self.papers))
+            )
+            page = f"<html><body>{links}</body></html>"
+        return 200, "text/html", page.encode()
+
+
+def run(args, concurrency):
+    with tempfile.TemporaryDirectory() as save_path:
+        handler = type("Handler", (ListingHandler,), {"papers": args.papers})
+        with MockServer(handler, latency=args.latency) as server:
+            start = time.perf_counter()
+            ids = crawl.get_ids(
+                args.years, args.fields, save_path, logger,
+                concurrency=concurrency, interval=args.interval,
+                base_url=server.url + "/list"
+            )
+            elapsed = time.perf_counter() - start
+            assert os.path.exists(os.path.join(save_path, "all_queries.json"))
+            assert os.path.exists(os.path.join(save_path, "targets.json"))
+        return len(ids), server.requests, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser("Benchmark of the listing crawler")
+    parser.add_argument("--years", default=1, type=int)
+    parser.add_argument("--fields", default=["cs.IR", "cs.CV"], nargs="+", type=str)
+    parser.add_argument("--papers", default=250, type=int, help="Papers per listing month")
+    parser.add_argument("--latency", default=0.2, type=float, help="Seconds per response")
+    parser.add_argument("--interval", default=0.0, type=float, help="Politeness interval per host")
+    parser.add_argument("--concurrency", default=[1, 4, 16], nargs="+", type=int)
+    args = parser.parse_args()
+    logger.remove()
+
+    print(f"{'concurrency':>12} {'pages':>8} {'ids':>8} {'seconds':>9} {'pages/sec':>10}")
+    for concurrency in args.concurrency:
+        ids, pages, elapsed = run(args, concurrency)
+        print(f"{concurrency:>12} {pages:>8} {ids:>8} {elapsed:>9.2f} {pages / elapsed:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Memory and ccbc time of a RawSet before and after `build_graph`.
+
+`--papers` synthetic papers cite and reference ids drawn from a pool of `--pool` ids, so that
+papers share citations. The memory is the size of the objects holding the citations and
+references, counted with `sys.getsizeof`: freed strings don't give their memory back to the
+OS, so the RSS of the process can't show it. The ccbc time is one paper against every paper
+of the dataset.
+
+    python benchmark/graph.py --papers 100000
+"""
+import argparse
+import random
+import sys
+import time
+
+from loguru import logger
+
+from racp.data import PaperItem, RawSet
+from racp.utils import ccbc
+
+
+def set_bytes(dataset):
+    size = 0
+    for item in dataset:
+        for ids in (item.citations, item.references):
+            size += sys.getsizeof(ids) + sum(sys.getsizeof(id) for id in ids)
+    return size
+
+
+def graph_bytes(dataset, graph):
+    table = graph.table
+    size = graph.nbytes() + sys.getsizeof(table.ids) + sys.getsizeof(table.codes)
+    size += sum(sys.getsizeof(id) for id in table.ids)
+    # The IdSet views and the numpy views they wrap.
+    for item in dataset:
+        for ids in (item.citations, item.references):
+            size += sys.getsizeof(ids) + sys.getsizeof(ids.codes)
+    return size
+
+
+def make_dataset(papers, pool):
+    random.seed(0)
+    ids = [f"{random.getrandbits(160):040x}" for _ in range(pool)]
+    dataset = RawSet()
+    for i in range(papers):
+        item = PaperItem(logger=logger)
+        item.arxiv_id = f"{2301 + i // 100000}.{i % 100000:05d}"
+        item.ss_id = ids[i % pool]
+        # Fresh strings, like the ones json gives every paper.
+        item.citations = set((random.choice(ids) + " ")[:-1] for _ in range(random.randint(0, 40)))
+        item.references = set((random.choice(ids) + " ")[:-1] for _ in range(30))
+        dataset.add_item(item)
+    return dataset
+
+
+def time_ccbc(dataset):
+    paper = dataset[0]
+    start = time.perf_counter()
+    scores = [ccbc(paper, item) for item in dataset]
+    return time.perf_counter() - start, scores
+
+
+def main():
+    parser = argparse.ArgumentParser("Benchmark of the interned citation graph")
+    parser.add_argument("--papers", default=100000, type=int)
+    parser.add_argument("--pool", default=200000, type=int, help="Distinct ids cited")
+    args = parser.parse_args()
+    logger.remove()
+
+    dataset = make_dataset(args.papers, args.pool)
+    before = set_bytes(dataset) / 2**20
+    sets_time, sets_scores = time_ccbc(dataset)
+
+    start = time.perf_counter()
+    graph = dataset.build_graph()
+    build = time.perf_counter() - start
+    after = graph_bytes(dataset, graph) / 2**20
+    views_time, views_scores = time_ccbc(dataset)
+    assert sets_scores == views_scores
+
+    edges = len(graph.citations.indices) + len(graph.references.indices)
+    print(f"{args.papers} papers, {edges} edges, {len(graph.table)} distinct ids")
+    print(f"{'':>8} {'MiB':>8} {'ccbc s':>8}")
+    print(f"{'sets':>8} {before:>8.0f} {sets_time:>8.2f}")
+    print(f"{'graph':>8} {after:>8.0f} {views_time:>8.2f}")
+    print(f"build {build:.2f}s, CSR arrays {graph.nbytes() / 2**20:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
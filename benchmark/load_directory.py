@@ -0,0 +1,66 @@
+"""Time loading a RawSet from a directory of json files.
+
+`serial json` is the loop RawSet used before: `json.load` of every file in one process,
+keeping the content. The other rows are the current loader with the stdlib json or orjson
+backend and 1 or `--processes` processes.
+
+    python benchmark/load_directory.py --papers 20000 --content 20000 --processes 8
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from loguru import logger
+
+import racp.data as data
+from racp.data import PaperItem, RawSet
+from columnar import make_dataset
+
+
+def serial_json(path):
+    items = []
+    for file in os.listdir(path):
+        with open(os.path.join(path, file), "r", encoding="utf-8") as f:
+            item = PaperItem()
+            item.load_json(json.load(f))
+            items.append(item)
+    return items
+
+
+def main():
+    parser = argparse.ArgumentParser("Benchmark of RawSet directory loading")
+    parser.add_argument("--papers", default=20000, type=int)
+    parser.add_argument("--content", default=20000, type=int, help="Characters of text per paper")
+    parser.add_argument("--processes", default=os.cpu_count(), type=int)
+    args = parser.parse_args()
+    logger.remove()
+
+    try:
+        import orjson
+        backends = {"json": json.loads, "orjson": orjson.loads}
+    except ImportError:
+        backends = {"json": json.loads}
+
+    with tempfile.TemporaryDirectory() as path:
+        make_dataset(path, args.papers, args.content)
+        print(f"{os.cpu_count()} cpus, {args.papers} papers")
+        print(f"{'loader':>24} {'seconds':>8} {'files/sec':>10}")
+        start = time.perf_counter()
+        serial_json(path)
+        elapsed = time.perf_counter() - start
+        print(f"{'serial json':>24} {elapsed:>8.2f} {args.papers / elapsed:>10.0f}")
+        for name, loads in backends.items():
+            data._loads = loads
+            for processes in sorted({1, args.processes}):
+                start = time.perf_counter()
+                dataset = RawSet(path, processes=processes)
+                elapsed = time.perf_counter() - start
+                assert len(dataset) == args.papers
+                label = f"{name}, {processes} processes"
+                print(f"{label:>24} {elapsed:>8.2f} {args.papers / elapsed:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
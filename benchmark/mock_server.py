@@ -0,0 +1,68 @@
+"""Local stand-in HTTP servers used by the benchmarks.
+
+The benchmarks never talk to arXiv or Semantic Scholar. Each server answers on
+127.0.0.1 with a random port and can add an artificial latency to every response
+to simulate a remote host.
+"""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    """Base handler. Subclasses implement `respond(method, path, body)`."""
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    latency = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def _handle(self, method):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length) if length else b""
+        time.sleep(self.latency)
+        with self.server.lock:
+            self.server.requests += 1
+        status, content_type, payload = self.respond(method, self.path, body)
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def respond(self, method, path, body):
+        raise NotImplementedError
+
+
+class MockServer:
+    """Run a handler class in a background thread.
+
+    Use it as a context manager, the base url is available as `url`.
+    """
+    def __init__(self, handler, latency=0.0):
+        self.handler = type(handler.__name__, (handler,), {"latency": latency})
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), self.handler)
+        self.httpd.daemon_threads = True
+        self.httpd.requests = 0
+        self.httpd.lock = threading.Lock()
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}"
+
+    @property
+    def requests(self):
+        return self.httpd.requests
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,61 @@
+"""Time to build a neighbour table and to update it with new papers.
+
+The synthetic datasets are the ones of topk.py. The python estimate is the time of `ccbc` on
+every pair, measured on a sample of pairs.
+
+    python benchmark/neighbours.py --sizes 10000 100000 --processes 4
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from loguru import logger
+
+from racp.data import RawSet
+from racp.neighbours import NeighbourTable, build_neighbours
+from racp.utils import ccbc
+from topk import make_graph, make_items
+
+
+def main():
+    parser = argparse.ArgumentParser("Benchmark of the neighbour table")
+    parser.add_argument("--sizes", default=[10000, 100000], type=int, nargs="+")
+    parser.add_argument("--n", default=50, type=int)
+    parser.add_argument("--new", default=0.01, type=float, help="Part of the papers added by the update")
+    parser.add_argument("--processes", default=None, type=int)
+    args = parser.parse_args()
+    logger.remove()
+
+    print(f"{'papers':>8} {'python s':>10} {'build s':>8} {'MiB':>6} {'new':>6} {'update s':>8}")
+    for size in args.sizes:
+        new = int(size * args.new)
+        items = make_items(make_graph(size + new))
+        dataset = RawSet()
+        dataset.load_from_papers(items[:size])
+
+        start = time.perf_counter()
+        for item in items[:1000]:
+            ccbc(items[0], item)
+        python = (time.perf_counter() - start) / 1000 * size * (size - 1) / 2
+
+        path = tempfile.mkdtemp()
+        try:
+            start = time.perf_counter()
+            table = build_neighbours(dataset, path, n=args.n, processes=args.processes)
+            build = time.perf_counter() - start
+            disk = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+            dataset.load_from_papers(items[size:])
+            start = time.perf_counter()
+            table.update(dataset)
+            update = time.perf_counter() - start
+            assert len(NeighbourTable(path)) == size + new
+        finally:
+            shutil.rmtree(path)
+        print(f"{size:>8} {python:>10.0f} {build:>8.1f} {disk / 2**20:>6.1f} {new:>6} {update:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
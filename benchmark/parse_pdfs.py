@@ -0,0 +1,44 @@
+"""Compare a serial `utils.parse_pdf` loop with `utils.parse_pdfs` on a local corpus of pdfs.
+
+The corpus of `--papers` pdfs with `--pages` pages each is generated with PyMuPDF, see
+`pdf_pipeline.make_corpus`. The speedup of the pool is bounded by the number of CPUs.
+
+    python benchmark/parse_pdfs.py --papers 500 --pages 30 --processes 8
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from racp.utils import parse_pdf, parse_pdfs
+from pdf_pipeline import make_corpus
+
+
+def main():
+    parser = argparse.ArgumentParser("Benchmark of bulk pdf parsing")
+    parser.add_argument("--papers", default=500, type=int)
+    parser.add_argument("--pages", default=30, type=int)
+    parser.add_argument("--processes", default=None, type=int)
+    parser.add_argument("--max-pages", default=None, type=int)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as corpus:
+        make_corpus(corpus, args.papers, args.pages)
+        paths = sorted(os.path.join(corpus, file) for file in os.listdir(corpus))
+        print(f"{os.cpu_count()} cpus, {args.papers} pdfs of {args.pages} pages")
+        print(f"{'path':>12} {'seconds':>9} {'files/sec':>10} {'chars':>12}")
+
+        start = time.perf_counter()
+        chars = sum(len(parse_pdf(path, max_pages=args.max_pages)) for path in paths)
+        elapsed = time.perf_counter() - start
+        print(f"{'serial':>12} {elapsed:>9.2f} {len(paths) / elapsed:>10.1f} {chars:>12}")
+
+        start = time.perf_counter()
+        chars = sum(len(text) for _, text, error in parse_pdfs(
+            corpus, processes=args.processes, max_pages=args.max_pages) if error is None)
+        elapsed = time.perf_counter() - start
+        print(f"{'parse_pdfs':>12} {elapsed:>9.2f} {len(paths) / elapsed:>10.1f} {chars:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Compare `crawl.get_arxiv_data` with `crawl.pdf_pipeline` on a local corpus of pdfs.
+
+A corpus of `--papers` pdfs with `--pages` pages each is generated with PyMuPDF and
+served by a local stand-in of arXiv. Each path runs in its own process so that peak RSS
+is measured separately. For the pipeline, the peak RSS of the largest parsing process is
+reported as well.
+
+    python benchmark/pdf_pipeline.py --papers 200 --pages 30 --latency 0.05
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from loguru import logger
+
+from mock_server import MockHandler, MockServer
+
+WORDS = ("retrieval citation graph embedding transformer benchmark dataset "
+         "coupling similarity academic paper arxiv scholar").split()
+
+
+def make_corpus(path, papers, pages):
+    import fitz
+    text = "\n".join(" ".join(WORDS[(i + j) % len(WORDS)] for j in range(12)) for i in range(50))
+    for i in range(papers):
+        pdf = fitz.open()
+        for _ in range(pages):
+            pdf.new_page().insert_text((50, 50), text, fontsize=8)
+        pdf.save(os.path.join(path, f"2301.{i:05d}.pdf"))
+
+
+def corpus_handler(path):
+    class PdfHandler(MockHandler):
+        def respond(self, method, url, body):
+            with open(os.path.join(path, url.split("/")[-1] + ".pdf"), "rb") as f:
+                return 200, "application/pdf", f.read()
+    return PdfHandler
+
+
+def run(mode, url, arxiv_ids, processes):
+    from racp import crawl
+    crawl.ARXIV_PDF = url
+    logger.remove()
+    start = time.perf_counter()
+    count = 0
+    if mode == "serial":
+        for arxiv_id in arxiv_ids:
+            crawl.get_arxiv_data(arxiv_id, logger)
+            count += 1
+    else:
+        with tempfile.TemporaryDirectory() as save_path:
+            for _, text, error in crawl.pdf_pipeline(arxiv_ids, save_path, logger,
+                                                     download_workers=8, processes=processes,
+                                                     keep_pdf=False):
+                count += error is None
+    elapsed = time.perf_counter() - start
+    return {
+        "papers": count,
+        "seconds": elapsed,
+        "rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "child_rss": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser("Benchmark of pdf download and text extraction")
+    parser.add_argument("--papers", default=200, type=int)
+    parser.add_argument("--pages", default=30, type=int)
+    parser.add_argument("--latency", default=0.05, type=float, help="Seconds per response")
+    parser.add_argument("--processes", default=None, type=int)
+    parser.add_argument("--mode", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--url", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    arxiv_ids = [f"2301.{i:05d}" for i in range(args.papers)]
+
+    if args.mode is not None:
+        print(json.dumps(run(args.mode, args.url, arxiv_ids, args.processes)))
+        return
+
+    with tempfile.TemporaryDirectory() as corpus:
+        make_corpus(corpus, args.papers, args.pages)
+        size = sum(os.path.getsize(os.path.join(corpus, f)) for f in os.listdir(corpus))
+        print(f"corpus: {args.papers} pdfs, {size / 2**20:.1f} MiB")
+        print(f"{'path':>10} {'seconds':>9} {'papers/sec':>11} {'peak RSS MiB':>13} {'worker RSS MiB':>15}")
+        with MockServer(corpus_handler(corpus), latency=args.latency) as server:
+            for mode in ("serial", "pipeline"):
+                command = [sys.executable, __file__, "--mode", mode, "--url", server.url,
+                           "--papers", str(args.papers)]
+                if args.processes:
+                    command += ["--processes", str(args.processes)]
+                out = subprocess.run(command, capture_output=True, text=True, check=True)
+                result = json.loads(out.stdout.strip().splitlines()[-1])
+                worker = f"{result['child_rss']:.0f}" if mode == "pipeline" else "-"
+                print(f"{mode:>10} {result['seconds']:>9.2f} "
+                      f"{result['papers'] / result['seconds']:>11.1f} {result['rss']:>13.0f} {worker:>15}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Build time, size and lookup time of the powerlaw cdf as a dict and as a PowerlawCDF.
+
+The cdf is the one of `--papers` citation counts drawn from a zipf law, capped at `--max`.
+The fit itself isn't timed, the dict is built from the x and cdf of the data the way
+`powerlaw_fit_cdf` used to, and both look up the cdf of every count.
+
+    python benchmark/powerlaw_cdf.py --papers 1000000 --max 1000000
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from racp.utils import PowerlawCDF
+
+
+def dict_cdf(x, y):
+    cdf = dict([(x[i], y[i]) for i in range(len(x))])
+    count = min(cdf.keys())
+    extra_values = {}
+    last_cdf = 0
+    for k, v in cdf.items():
+        if k != count + 1:
+            for i in range(int(count)+1, int(k)):
+                extra_values[i] = last_cdf
+        last_cdf = v
+        count = k
+    cdf.update(extra_values)
+    return cdf
+
+
+def main():
+    parser = argparse.ArgumentParser("Benchmark of the powerlaw cdf")
+    parser.add_argument("--papers", default=1000000, type=int)
+    parser.add_argument("--max", default=1000000, type=int, help="Highest citation count")
+    parser.add_argument("--exponent", default=1.5, type=float)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    counts = np.minimum(rng.zipf(args.exponent, args.papers), args.max)
+    x = np.unique(counts)
+    y = np.searchsorted(np.sort(counts), x) / len(counts)
+    x = x.astype(np.float64)
+
+    print(f"{'':>12} {'build s':>8} {'MiB':>8} {'lookup s':>9}")
+    start = time.perf_counter()
+    cdf = dict_cdf(x, y)
+    build = time.perf_counter() - start
+    size = sys.getsizeof(cdf)
+    start = time.perf_counter()
+    expected = [cdf.get(count, 0.0) for count in counts.tolist()]
+    lookup = time.perf_counter() - start
+    print(f"{'dict':>12} {build:>8.3f} {size / 2**20:>8.2f} {lookup:>9.3f}")
+
+    start = time.perf_counter()
+    cdf = PowerlawCDF(x, y)
+    build = time.perf_counter() - start
+    start = time.perf_counter()
+    found = cdf(counts)
+    lookup = time.perf_counter() - start
+    size = cdf.x.nbytes + cdf.cdf.nbytes + cdf._low.nbytes + cdf._high.nbytes + cdf._table.nbytes
+    assert np.array_equal(found, expected)
+    print(f"{'PowerlawCDF':>12} {build:>8.3f} {size / 2**20:>8.2f} {lookup:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Time to score the quality of every paper, item by item and with the QualityEngine.
+
+"items" is `PaperItem.quality` on every item, "engine" reads the inputs of every paper and
+computes all the scores, "scores" computes them again from the arrays, with the date score,
+and "update" reads the inputs of `--changed` papers again.
+
+    python benchmark/quality.py --sizes 100000 1000000
+"""
+import argparse
+import time
+
+import numpy as np
+from loguru import logger
+
+from racp.data import PaperItem, RawSet
+from racp.quality import QualityEngine
+
+
+def make_items(size, seed=0):
+    rng = np.random.default_rng(seed)
+    counts = rng.integers(0, 500, size)
+    days = rng.integers(0, 3650, size)
+    items = []
+    for i in range(size):
+        item = PaperItem(logger=logger)
+        item.arxiv_id = str(i)
+        item.citation_count = int(counts[i]) if i % 10 else None
+        item.citations = set()
+        item.date = str(np.datetime64("2015-01-01") + days[i])
+        items.append(item)
+    return items
+
+
+def main():
+    parser = argparse.ArgumentParser("Benchmark of the quality scores")
+    parser.add_argument("--sizes", default=[100000, 1000000], type=int, nargs="+")
+    parser.add_argument("--changed", default=100, type=int)
+    args = parser.parse_args()
+    logger.remove()
+
+    print(f"{'papers':>8} {'items s':>8} {'engine s':>8} {'scores s':>8} {'update ms':>9}")
+    for size in args.sizes:
+        dataset = RawSet()
+        dataset.load_from_papers(make_items(size))
+
+        start = time.perf_counter()
+        expected = np.array([item.quality for item in dataset.items])
+        items = time.perf_counter() - start
+
+        engine = QualityEngine()
+        start = time.perf_counter()
+        scores = engine.compute(dataset)
+        compute = time.perf_counter() - start
+        assert np.array_equal(scores, expected)
+
+        engine.weights["date"] = 1.0
+        start = time.perf_counter()
+        engine.scores
+        rescore = time.perf_counter() - start
+
+        changed = list(range(0, size, size // args.changed))
+        for i in changed:
+            dataset[i].citation_count = 1000
+        start = time.perf_counter()
+        engine.update(dataset, changed)
+        engine.scores
+        update = (time.perf_counter() - start) * 1000
+        print(f"{size:>8} {items:>8.2f} {compute:>8.2f} {rescore:>8.3f} {update:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
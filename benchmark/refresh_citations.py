@@ -0,0 +1,72 @@
+"""Time `RawSet.refresh_citations` on a synthetic dataset against a local mock of Semantic Scholar.
+
+The dataset is a directory of `--papers` json files without content. The mock answers
+`/paper/batch` with a citationCount that changed for about `--changed` of the papers and
+fails a chunk with probability `--fail`. Only the changed files are rewritten.
+
+    python benchmark/refresh_citations.py --papers 100000 --latency 0.5
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from loguru import logger
+
+from racp import crawl
+from racp.data import PaperItem, RawSet
+from mock_server import MockHandler, MockServer
+
+
+def make_handler(changed, fail):
+    class CitationHandler(MockHandler):
+        def respond(self, method, path, body):
+            if random.random() < fail:
+                return 404, "application/json", b"{}"
+            data = []
+            for ss_id in json.loads(body)["ids"]:
+                count = int(ss_id, 16) % 100
+                if int(ss_id, 16) % 1000 < changed * 1000:
+                    count += 1
+                data.append({"paperId": ss_id, "citationCount": count})
+            return 200, "application/json", json.dumps(data).encode()
+    return CitationHandler
+
+
+def make_dataset(path, papers):
+    for i in range(papers):
+        item = PaperItem(logger=logger)
+        item.arxiv_id = f"2301.{i:05d}"
+        item.ss_id = f"{i:040x}"
+        item.citation_count = i % 100
+        item.save_json(path)
+
+
+def main():
+    parser = argparse.ArgumentParser("Benchmark of the citation refresh job")
+    parser.add_argument("--papers", default=100000, type=int)
+    parser.add_argument("--latency", default=0.5, type=float, help="Seconds per response")
+    parser.add_argument("--changed", default=0.05, type=float, help="Share of papers whose count changed")
+    parser.add_argument("--fail", default=0.0, type=float, help="Probability that a chunk fails")
+    parser.add_argument("--workers", default=[1, 8], nargs="+", type=int)
+    args = parser.parse_args()
+    logger.remove()
+
+    print(f"{'workers':>8} {'requests':>9} {'seconds':>9} {'updated':>8} {'failed':>7}")
+    for workers in args.workers:
+        with tempfile.TemporaryDirectory() as path:
+            make_dataset(path, args.papers)
+            dataset = RawSet(path)
+            with MockServer(make_handler(args.changed, args.fail), latency=args.latency) as server:
+                crawl.SEMANTIC_SCHOLAR_API = server.url
+                start = time.perf_counter()
+                summary = dataset.refresh_citations(save_path=path, workers=workers, logger=logger)
+                elapsed = time.perf_counter() - start
+            print(f"{workers:>8} {server.requests:>9} {elapsed:>9.2f} {summary['updated']:>8} "
+                  f"{summary['failed']:>7}")
+
+
+if __name__ == "__main__":
+    main()
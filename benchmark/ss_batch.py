@@ -0,0 +1,104 @@
+"""Compare per-paper and batched Semantic Scholar ingestion against a local mock of the API.
+
+The per-paper path is what `PaperItem.get_data_by_arxiv` used to do without the pdf: one
+`get_ss_data_by_arxiv` and one `get_author_info` request per paper, with the author data
+embedded in every paper. The batched path is `racp.data.get_items_by_arxiv` over chunks of
+`--chunk` papers sharing one `AuthorStore`, which only fetches authors it hasn't seen.
+Every response is delayed by `--latency` seconds. The json column is the size of the
+papers plus the author store as they are saved.
+
+    python benchmark/ss_batch.py --papers 2000 --latency 0.02
+"""
+import argparse
+import json
+import time
+
+from loguru import logger
+
+from racp import crawl
+from racp.data import AuthorStore, PaperItem, get_items_by_arxiv
+from mock_server import MockHandler, MockServer
+
+
+def fake_paper(arxiv_id):
+    seed = int(arxiv_id.replace(".", ""))
+    return {
+        "paperId": f"{seed:040x}",
+        "externalIds": {"ArXiv": arxiv_id},
+        "title": f"Paper {arxiv_id}",
+        "abstract": "An abstract.",
+        "publicationTypes": ["JournalArticle"],
+        "publicationDate": "2023-01-01",
+        "citations": [{"paperId": f"{seed * 7 + i:040x}"} for i in range(seed % 20)],
+        "references": [{"paperId": f"{seed * 11 + i:040x}"} for i in range(30)],
+        "authors": [{"authorId": str(seed % 997 + i), "name": f"Author {seed % 997 + i}"}
+                    for i in range(4)],
+    }
+
+
+def fake_author(author_id):
+    return {"authorId": author_id, "name": f"Author {author_id}",
+            "citationCount": int(author_id) * 3, "paperCount": int(author_id) % 50}
+
+
+class SemanticScholarHandler(MockHandler):
+    def respond(self, method, path, body):
+        path = path.split("?")[0]
+        if method == "GET" and path.startswith("/paper/arXiv:"):
+            data = fake_paper(path[len("/paper/arXiv:"):])
+        elif method == "POST" and path == "/paper/batch":
+            data = [fake_paper(i[len("arXiv:"):]) for i in json.loads(body)["ids"]]
+        elif method == "POST" and path == "/author/batch":
+            data = [fake_author(i) for i in json.loads(body)["ids"]]
+        else:
+            return 404, "application/json", b"{}"
+        return 200, "application/json", json.dumps(data).encode()
+
+
+def per_paper(arxiv_ids, chunk):
+    items = []
+    size = 0
+    for arxiv_id in arxiv_ids:
+        data = crawl.get_ss_data_by_arxiv(arxiv_id, logger)
+        authors = crawl.get_author_info([a["authorId"] for a in data["authors"]], logger)
+        item = PaperItem()
+        item.load_ss_data(arxiv_id, data)
+        size += len(json.dumps(dict(item.to_json(), authors=authors), indent=4))
+        items.append(item)
+    return items, size
+
+
+def batched(arxiv_ids, chunk):
+    author_store = AuthorStore()
+    items = []
+    for i in range(0, len(arxiv_ids), chunk):
+        items += get_items_by_arxiv(arxiv_ids[i:i+chunk], logger, content=False,
+                                    author_store=author_store)[0]
+    size = sum(len(json.dumps(item.to_json(), indent=4)) for item in items)
+    size += len(json.dumps(author_store.authors, indent=4))
+    return items, size
+
+
+def main():
+    parser = argparse.ArgumentParser("Benchmark of batched Semantic Scholar ingestion")
+    parser.add_argument("--papers", default=2000, type=int)
+    parser.add_argument("--latency", default=0.02, type=float, help="Seconds per response")
+    parser.add_argument("--chunk", default=500, type=int, help="Papers per get_items_by_arxiv call")
+    args = parser.parse_args()
+    logger.remove()
+
+    arxiv_ids = [f"2301.{i:05d}" for i in range(1, args.papers + 1)]
+    print(f"{'path':>10} {'requests':>9} {'seconds':>9} {'papers/sec':>11} {'json KiB':>9}")
+    for name, ingest in [("per-paper", per_paper), ("batched", batched)]:
+        with MockServer(SemanticScholarHandler, latency=args.latency) as server:
+            crawl.SEMANTIC_SCHOLAR_API = server.url
+            start = time.perf_counter()
+            items, size = ingest(arxiv_ids, args.chunk)
+            elapsed = time.perf_counter() - start
+        assert len(items) == len(arxiv_ids)
+        print(f"{name:>10} {server.requests:>9} {elapsed:>9.2f} {len(items) / elapsed:>11.1f} "
+              f"{size / 1024:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
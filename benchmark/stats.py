@@ -0,0 +1,116 @@
+"""Time of the RawSet statistics, recomputed on every call and kept by RawSet.stats.
+
+"old" runs the five statistics the way they were computed before `racp.stats`, one pass over
+the dataset each. "first" is the first call of the five with `RawSet.stats`, one fused pass,
+"again" the five calls again, and "add" the five calls after adding `--new` of the papers.
+
+    python benchmark/stats.py --sizes 10000 100000
+"""
+import argparse
+import random
+import time
+
+from loguru import logger
+
+from racp.data import PaperItem, RawSet
+
+
+def make_items(papers, seed=0):
+    random.seed(seed)
+    items = []
+    for i in range(papers):
+        item = PaperItem(logger=logger)
+        item.arxiv_id = f"{2301 + i // 100000}.{i % 100000:05d}"
+        item.ss_id = f"{i:040x}"
+        item.citations = set(f"{random.randrange(2 * papers):040x}" for _ in range(random.randint(0, 40)))
+        item.references = set(f"{random.randrange(2 * papers):040x}" for _ in range(30))
+        item.authors = [str(random.randrange(2 * papers)) for _ in range(4)]
+        item.publication = [random.choice(["JournalArticle", "Conference", "Review"])]
+        item.date = f"20{random.randint(10, 23)}-01-01"
+        item.citation_count = random.randint(0, 100) if i % 2 else None
+        items.append(item)
+    return items
+
+
+def make_store(dataset, papers):
+    for i in range(0, 2 * papers, 2):
+        dataset.author_store.add({"authorId": str(i), "name": f"Author {i}", "paperCount": 10,
+                                  "citationCount": 100})
+
+
+def old_stats(dataset):
+    papers = set(item.ss_id for item in dataset.items)
+    for item in dataset.items:
+        papers.update(item.citations)
+        papers.update(item.references)
+    all_authors = {}
+    for item in dataset.items:
+        for author_id in item.authors:
+            if author_id in all_authors:
+                continue
+            author = dataset.author_store.get(author_id)
+            if author is None:
+                continue
+            all_authors[author_id] = {"name": author["name"], "paperCount": author["paperCount"],
+                                      "citationCount": author["citationCount"]}
+    type_count = {}
+    for item in dataset.items:
+        if item.publication != None:
+            for type in item.publication:
+                type_count[type] = type_count.get(type, 0) + 1
+    year_count = {}
+    for item in dataset.items:
+        try:
+            year = item.date.split("-")[0]
+        except:
+            continue
+        year_count[year] = year_count.get(year, 0) + 1
+    citations = dict((item.arxiv_id, item.citation_count if item.citation_count is not None \
+                      else len(item.citations)) for item in dataset.items)
+    return papers, all_authors, type_count, year_count, citations
+
+
+def new_stats(dataset):
+    return (dataset.all_papers(), dataset.all_authors(), dataset.publication_types(),
+            dataset.publication_years(), dataset.paper_citations())
+
+
+def main():
+    parser = argparse.ArgumentParser("Benchmark of the RawSet statistics")
+    parser.add_argument("--sizes", default=[10000, 100000], type=int, nargs="+")
+    parser.add_argument("--new", default=0.01, type=float, help="Part of the papers added")
+    args = parser.parse_args()
+    logger.remove()
+
+    print(f"{'papers':>8} {'old s':>8} {'first s':>8} {'again ms':>9} {'new':>6} {'add ms':>8}")
+    for size in args.sizes:
+        new = int(size * args.new)
+        items = make_items(size + new)
+        dataset = RawSet()
+        dataset.load_from_papers(items[:size])
+        make_store(dataset, size)
+
+        start = time.perf_counter()
+        expected = old_stats(dataset)
+        old = time.perf_counter() - start
+
+        start = time.perf_counter()
+        stats = new_stats(dataset)
+        first = time.perf_counter() - start
+        assert stats == expected
+
+        start = time.perf_counter()
+        new_stats(dataset)
+        again = (time.perf_counter() - start) * 1000
+
+        for item in items[size:]:
+            dataset.add_item(item)
+        start = time.perf_counter()
+        stats = new_stats(dataset)
+        add = (time.perf_counter() - start) * 1000
+        assert stats == old_stats(dataset)
+        print(f"{size:>8} {old:>8.2f} {first:>8.2f} {again:>9.3f} {new:>6} {add:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Time of RawSet.topk with the python ccbc loop, the sparse scorer and the citation index.
+
+Synthetic papers cite and reference ids drawn from a pool twice the size of the dataset. The
+loop is the old `topk`: `ccbc` against every item, then a full argsort. It is only run up to
+`--loop-max` papers, building a million PaperItems with sets of strings takes gigabytes. The
+scorer and the index are timed on the graph arrays directly, and checked against `ccbc` where
+the loop runs. "add" is the time to add a paper to the index.
+
+    python benchmark/topk.py --sizes 10000 100000 1000000
+"""
+import argparse
+import time
+
+import numpy as np
+from loguru import logger
+
+from racp.data import PaperItem
+from racp.graph import CSR, CitationGraph, CitationIndex, IdTable
+from racp.scoring import CCBCScorer, ccbc_candidates, topk_sparse
+from racp.utils import ccbc
+
+
+def random_csr(rng, rows, pool, low, high):
+    lengths = rng.integers(low, high + 1, rows)
+    keys = np.repeat(np.arange(rows, dtype=np.int64), lengths) << 32 | \
+        rng.integers(0, pool, int(lengths.sum()))
+    keys = np.unique(keys)
+    indptr = np.zeros(rows + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys >> 32, minlength=rows), out=indptr[1:])
+    return CSR(indptr, (keys & 0xFFFFFFFF).astype(np.int32))
+
+
+def make_graph(papers, seed=0):
+    rng = np.random.default_rng(seed)
+    pool = 2 * papers
+    table = IdTable(f"{i:040x}" for i in range(pool))
+    paper_ids = rng.permutation(pool)[:papers].astype(np.int32)
+    return CitationGraph(table, paper_ids, random_csr(rng, papers, pool, 0, 40),
+                         random_csr(rng, papers, pool, 30, 30))
+
+
+def make_items(graph):
+    items = []
+    for i in range(len(graph)):
+        item = PaperItem(logger=logger)
+        item.arxiv_id = str(i)
+        item.ss_id = graph.table[graph.paper_ids[i]]
+        item.citations = set(graph.citation_set(i))
+        item.references = set(graph.reference_set(i))
+        items.append(item)
+    return items
+
+
+def loop_topk(items, paper, k):
+    sim = np.zeros(len(items))
+    for i, item in enumerate(items):
+        sim[i] = ccbc(paper, item)
+    return np.argsort(sim)[::-1][:k], sim
+
+
+def main():
+    parser = argparse.ArgumentParser("Benchmark of RawSet.topk")
+    parser.add_argument("--sizes", default=[10000, 100000, 1000000], type=int, nargs="+")
+    parser.add_argument("--k", default=1000, type=int)
+    parser.add_argument("--queries", default=16, type=int)
+    parser.add_argument("--loop-max", default=100000, type=int)
+    args = parser.parse_args()
+    logger.remove()
+
+    print(f"{'papers':>8} {'edges':>10} {'loop s':>8} {'setup s':>8} {'query s':>8} "
+          f"{'batch s':>8} {'index s':>8} {'query s':>8} {'add ms':>8}")
+    for size in args.sizes:
+        graph = make_graph(size)
+        edges = len(graph.citations.indices) + len(graph.references.indices)
+        queries = [i * (size // args.queries) for i in range(args.queries)]
+
+        loop = "-"
+        if size <= args.loop_max:
+            items = make_items(graph)
+            start = time.perf_counter()
+            expected = [loop_topk(items, items[q], args.k)[1] for q in queries]
+            loop = f"{(time.perf_counter() - start) / len(queries):.3f}"
+            papers = [items[q] for q in queries]
+        else:
+            papers = []
+            for q in queries:
+                paper = PaperItem(logger=logger)
+                paper.ss_id = graph.table[graph.paper_ids[q]]
+                paper.citations = graph.citation_set(q)
+                paper.references = graph.reference_set(q)
+                papers.append(paper)
+
+        start = time.perf_counter()
+        scorer = CCBCScorer(graph)
+        setup = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for paper in papers:
+            scorer.topk([paper], args.k)
+        query = (time.perf_counter() - start) / len(papers)
+
+        start = time.perf_counter()
+        results = scorer.topk(papers, args.k)
+        batch = (time.perf_counter() - start) / len(papers)
+
+        start = time.perf_counter()
+        index = CitationIndex(graph)
+        index_setup = time.perf_counter() - start
+
+        start = time.perf_counter()
+        found = [topk_sparse(*ccbc_candidates(index, paper), args.k, size) for paper in papers]
+        index_query = (time.perf_counter() - start) / len(papers)
+
+        if size <= args.loop_max:
+            for (indices, scores), top, sim in zip(results, found, expected):
+                assert np.array_equal(scores, sim[indices])
+                assert np.array_equal(scores, np.sort(sim)[::-1][:args.k])
+                assert np.array_equal(indices, top)
+
+        start = time.perf_counter()
+        for paper in papers:
+            index.add(paper.ss_id, paper.citations, paper.references)
+        add = (time.perf_counter() - start) / len(papers) * 1000
+        print(f"{size:>8} {edges:>10} {loop:>8} {setup:>8.2f} {query:>8.3f} {batch:>8.3f} "
+              f"{index_setup:>8.2f} {index_query:>8.4f} {add:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+import argparse
+import json
+import os
+from loguru import logger
+from racp.data import RawSet
+from racp.neighbours import NEIGHBOURS_META, NeighbourTable, build_neighbours
+
+
+def main(args):
+    if os.path.isdir(args.db_path):
+        database = RawSet(args.db_path)
+    else:
+        database = RawSet()
+        database.load(args.db_path)
+    weight = None
+    if args.weight:
+        with open(args.weight, "r", encoding="utf-8") as f:
+            weight = json.load(f)
+    if os.path.exists(os.path.join(args.save_path, NEIGHBOURS_META)):
+        # Only the papers added since the last run are scored.
+        try:
+            NeighbourTable(args.save_path).update(database, weight=weight, logger=logger)
+            return
+        except ValueError as e:
+            logger.warning(f"{e}")
+    build_neighbours(database, args.save_path, n=args.n, metric=args.metric, weight=weight,
+                     processes=args.processes, logger=logger)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compute the nearest neighbours of every paper of a dataset.")
+    parser.add_argument("--db_path", type=str, help="Path to the dataset, a directory of json files or a jsonl file.")
+    parser.add_argument("--save_path", type=str, help="Directory of the neighbour table, updated if it exists.")
+    parser.add_argument("--n", type=int, default=50, help="Neighbours of every paper")
+    parser.add_argument("--metric", type=str, default="ccbc", choices=["ccbc", "weighted_ccbc"])
+    parser.add_argument("--weight", type=str, default=None, help="Json file of the weights of weighted_ccbc, {ss_id : weight}")
+    parser.add_argument("--processes", type=int, default=None, help="Worker processes, default to the number of CPUs")
+    args = parser.parse_args()
+    main(args)
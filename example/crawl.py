@@ -1,9 +1,12 @@
 import racp.crawl as crawl
-from racp.utils import makedir
-from racp.data import PaperItem
+from racp.client import CrawlClient, TokenBucket, set_client
+from racp.scheduler import DownloadScheduler
+from racp.state import CrawlState, DONE, FAILED
+from racp.utils import makedir, save_json
+from racp.data import get_items_by_arxiv, AuthorStore, AUTHORS_FILE
 import argparse
 import json
-from multiprocessing import Process
+from urllib.parse import urlsplit
 import os
 from loguru import logger
 
@@ -12,10 +15,16 @@ def parser():
     parser.add_argument("--year", default=3, type=int, help="Years from 2023")
     parser.add_argument("--fields", default=["cs.IR"],nargs="+", type=str, help="Fields to crawl")
     parser.add_argument("--get-link", default=False, action="store_true", help="Get pdf links and save")
-    parser.add_argument("--threads", type=int, default=4, help="Threads used to download pdfs")
+    parser.add_argument("--threads", type=int, default=4, help="Processes used to download pdfs")
+    parser.add_argument("--batch-size", type=int, default=20, help="Papers a process takes from the queue at a time")
+    parser.add_argument("--max-retries", type=int, default=2, help="Retries of a failed paper")
     parser.add_argument("--check-download", default=False, action="store_true", help="Whether only check download")
     parser.add_argument("--save-path", default="./data", help="Directory to store data")
     parser.add_argument("--api-key", default="", type=str, help="Semantics scholar api key")
+    parser.add_argument("--rate", default=1.0, type=float, help="Semantics scholar requests per second of all processes")
+    parser.add_argument("--download-workers", type=int, default=4, help="Pdfs a process downloads at a time")
+    parser.add_argument("--parse-processes", type=int, default=1, help="Processes parsing the pdfs of a download process")
+    parser.add_argument("--keep-pdf", default=False, action="store_true", help="Keep the pdfs in save-path/pdfs")
 
     return parser.parse_args()
 
@@ -29,15 +38,33 @@ logger.add(
 
 makedir(arg.save_path, logger)
 makedir(os.path.join(arg.save_path,"data"), logger)
+makedir(os.path.join(arg.save_path,"pdfs"), logger)
 
 
-def download_worker(split, id):
-    for arxiv_id in split[id]:
-        try:
-            item = PaperItem(arxiv_id, logger=logger, key=arg.api_key)
-            item.save_json(os.path.join(arg.save_path, "data"))
-        except:
+def init_worker(limiter):
+    set_client(CrawlClient(limiters={urlsplit(crawl.SEMANTIC_SCHOLAR_API).netloc: limiter}, logger=logger))
+
+
+def download_worker(arxiv_ids):
+    items, failed_ids = get_items_by_arxiv(arxiv_ids, logger=logger, key=arg.api_key, content=False)
+    failures = dict((arxiv_id, "Not found in semantics scholar") for arxiv_id in failed_ids)
+    items = dict((item.arxiv_id, item) for item in items)
+    if not items:
+        return failures
+    # The pdfs are streamed to disk and parsed by their own processes while the next ones download.
+    results = crawl.pdf_pipeline(list(items), os.path.join(arg.save_path, "pdfs"), logger,
+                                 download_workers=arg.download_workers,
+                                 processes=arg.parse_processes, keep_pdf=arg.keep_pdf)
+    for arxiv_id, text, error in results:
+        if error is not None:
+            failures[arxiv_id] = error
             continue
+        try:
+            items[arxiv_id].content = text
+            items[arxiv_id].save_json(os.path.join(arg.save_path, "data"))
+        except Exception as e:
+            failures[arxiv_id] = repr(e)
+    return failures
 
 
 if __name__ == "__main__":
@@ -52,14 +79,32 @@ if __name__ == "__main__":
 
     if arg.check_download:
         pdfids = crawl.check_download(pdfids, arg.save_path, logger)
-    pdfnum = len(pdfids)//arg.threads
-    pdfid_split = [pdfids[pdfnum*i:pdfnum*(i+1)] for i in range(arg.threads)]
-    if len(pdfids)-pdfnum*arg.threads != 0:
-        pdfid_split[-1] += pdfids[-(len(pdfids)-pdfnum*arg.threads):]
-    threads = []
-    for i in range(arg.threads):
-        t = Process(target=download_worker,args=(pdfid_split, i))
-        t.start()
-        threads.append(t)
-    for t in threads:
-        t.join()
+    with CrawlState(arg.save_path) as state:
+        logger.info(f"Papers: {state.status('paper')}")
+
+        def record(arxiv_id, error):
+            state.mark(arxiv_id, "paper", DONE if error is None else FAILED, error=error)
+
+        limiter = TokenBucket(arg.rate)
+        scheduler = DownloadScheduler(
+            download_worker,
+            processes=arg.threads,
+            max_retries=arg.max_retries,
+            batch_size=arg.batch_size,
+            initializer=init_worker,
+            initargs=(limiter,),
+            callback=record,
+            logger=logger
+        )
+        done, dead_letters = scheduler.run(pdfids, desc="Downloading")
+    # Authors are shared by many papers, fetch the new ones once for the whole crawl.
+    authors_path = os.path.join(arg.save_path, "data", AUTHORS_FILE)
+    author_store = AuthorStore(authors_path, logger)
+    author_ids = []
+    for arxiv_id in done:
+        with open(os.path.join(arg.save_path, "data", f"{arxiv_id}.json"), "r", encoding="utf-8") as f:
+            author_ids += json.load(f)["authors"]
+    init_worker(limiter)
+    author_store.fetch(author_ids, arg.api_key)
+    author_store.save(authors_path)
+    save_json(dead_letters, os.path.join(arg.save_path, "dead_letters.json"), logger, "dead_letters.json")
@@ -0,0 +1,33 @@
+import argparse
+import os
+from urllib.parse import urlsplit
+from loguru import logger
+import racp.crawl as crawl
+from racp.client import CrawlClient, TokenBucket, set_client
+from racp.data import RawSet
+from racp.utils import save_json
+
+
+def main(args):
+    set_client(CrawlClient(limiters={urlsplit(crawl.SEMANTIC_SCHOLAR_API).netloc: TokenBucket(args.rate)},
+                           logger=logger))
+    if os.path.isdir(args.db_path):
+        database = RawSet(args.db_path)
+    else:
+        database = RawSet()
+        database.load(args.db_path)
+    summary = database.refresh_citations(args.api_key, save_path=args.db_path,
+                                         workers=args.workers, logger=logger)
+    if args.summary:
+        save_json(summary, args.summary, logger, "citation summary")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh the citation counts of a dataset.")
+    parser.add_argument("--db_path", type=str, help="Path to the dataset, a directory of json files or a jsonl file.")
+    parser.add_argument("--api_key", type=str, default="", help="Semantics scholar api key")
+    parser.add_argument("--rate", type=float, default=1.0, help="Semantics scholar requests per second")
+    parser.add_argument("--workers", type=int, default=4, help="Requests in flight")
+    parser.add_argument("--summary", type=str, default=None, help="Path to save the changes as json")
+    args = parser.parse_args()
+    main(args)
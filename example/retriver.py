@@ -1,4 +1,5 @@
 import argparse
+import torch
 from racp.retriver import Retriver
 from racp.data import RawSet 
 from racp.utils import ConfigObject
@@ -6,6 +7,8 @@ from racp.utils import ConfigObject
 
 def main(args):
     ## test retriver 
+    if args.device is None:
+        args.device = "cuda" if torch.cuda.is_available() else "cpu"
     config = ConfigObject(vars(args))
     database = RawSet()
     print("Loading dataset...")
@@ -26,8 +29,15 @@ if __name__ == "__main__":
     parser.add_argument("--chunk_size", type=int, default=1000, help="Chunk size for text splitting.")
     parser.add_argument("--chunk_overlap", type=int, default=0, help="Chunk overlap for text splitting.")
     parser.add_argument("--model_name", type=str, default="sentence-transformers/all-mpnet-base-v2", help="Hugging Face model name.")
-    parser.add_argument("--device", type=str, default="cuda", help="Device for HuggingFaceEmbeddings.")
+    parser.add_argument("--device", type=str, default=None, help="Device for HuggingFaceEmbeddings, default to cuda if it is available, else cpu.")
     parser.add_argument("--normalize_embeddings", action="store_true", help="Normalize embeddings in HuggingFaceEmbeddings.")
+    parser.add_argument("--embedding_processes", type=int, default=1, help="Worker processes embedding the documents on the CPU.")
+    parser.add_argument("--embedding_threads", type=int, default=None, help="Torch threads of every worker, default to the CPUs divided by the workers.")
+    parser.add_argument("--embedding_batch_size", type=int, default=32, help="Texts of similar length embedded together.")
+    parser.add_argument("--embedding_max_tokens", type=int, default=None, help="Most tokens in a batch, padding included.")
+    parser.add_argument("--index_type", type=str, default="flat", choices=["flat", "ivf", "hnsw", "pq", "ivfpq"], help="Type of the FAISS index.")
+    parser.add_argument("--nprobe", type=int, default=16, help="Lists an IVF index searches.")
+    parser.add_argument("--ef_search", type=int, default=64, help="Candidates an HNSW index searches.")
     #parser.add_argument("--query", type=str, default="'Research automation efforts usually employ AI as a tool to automate specific\ntasks within the research process. To create an AI that truly conduct research\nthemselves, it must independently generate hypotheses, design verification\nplans, and execute verification. Therefore, we investigated if an AI itself")
     args = parser.parse_args()
     main(args)
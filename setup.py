@@ -23,6 +23,7 @@ VERSION = '0.1.1'
 # What packages are required for this module to be executed?
 REQUIRED = [
     "requests",
+    "aiohttp",
     "PyMuPDF",
     "beautifulsoup4",
     "tqdm",
@@ -33,6 +34,7 @@ REQUIRED = [
     "langchain",
     "langchain_core",
     "powerlaw",
+    "scipy",
     "jsonlines",
     "sentence_transformers",
     "chromadb"
@@ -41,6 +43,7 @@ REQUIRED = [
 # What packages are optional?
 EXTRAS = {
     'fancy feature': ["torch==2.1.1+cu118"],
+    'fast json': ["orjson"],
 }
 
 # The rest you shouldn't have to touch too much :)
@@ -0,0 +1,211 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import tempfile
+import threading
+from urllib.parse import urlsplit
+
+# Seconds before a cached response expires, None means never.
+DEFAULT_TTLS = {
+    "listing": 24 * 3600,
+    "paper": 7 * 24 * 3600,
+    "author": 30 * 24 * 3600,
+    "pdf": None,
+    "default": 24 * 3600,
+}
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    digest TEXT NOT NULL,
+    endpoint TEXT NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed);
+CREATE INDEX IF NOT EXISTS entries_digest ON entries (digest);
+CREATE TABLE IF NOT EXISTS blobs (
+    digest TEXT PRIMARY KEY,
+    size INTEGER NOT NULL
+);
+'''
+
+class CacheMiss(ConnectionError):
+    '''Raised in replay mode when a request is not in the cache.'''
+
+def endpoint_of(url):
+    '''Classify a url into the endpoint names used by the TTLs.'''
+    path = urlsplit(url).path
+    if "/pdf/" in path:
+        return "pdf"
+    if "/list/" in path:
+        return "listing"
+    if "/author" in path:
+        return "author"
+    if "/paper" in path:
+        return "paper"
+    return "default"
+
+class ResponseCache:
+    '''A size-bounded, content-addressed cache of responses on disk.
+
+    A request is identified by the hash of its method, url, parameters and json body. Bodies
+    are stored once per sha256 of their content under `path/objects`, so identical responses
+    share one file, and an SQLite index maps requests to bodies. Entries expire after the TTL
+    of their endpoint and the least recently used ones are evicted once the bodies take more
+    than `max_bytes`.
+
+    In replay mode nothing expires and a request that isn't cached raises `CacheMiss` instead
+    of going to the network, so benchmarks and tests run offline and deterministically.
+
+    Attributes:
+        path: The directory of the cache.
+        max_bytes: Maximum total size of the cached bodies.
+        ttls: A dictionary formated as {endpoint : seconds}, see `DEFAULT_TTLS`.
+        replay: Whether to serve only from the cache.
+    '''
+    def __init__(
+        self,
+        path,
+        max_bytes=10 * 2**30,
+        ttls=None,
+        replay=False
+    ) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.replay = replay
+        os.makedirs(os.path.join(path, "objects"), exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(path, "index.db"), timeout=60,
+                                    isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(_SCHEMA)
+
+    @staticmethod
+    def key(method, url, params=None, json_body=None):
+        '''Return the cache key of a request.'''
+        request = json.dumps([method.upper(), url, params or {}, json_body], sort_keys=True)
+        return hashlib.sha256(request.encode()).hexdigest()
+
+    def _blob(self, digest):
+        return os.path.join(self.path, "objects", digest[:2], digest)
+
+    def lookup(self, key, url):
+        '''Return the path of the cached body of a request, or None if it is missing or expired.
+
+        Raises:
+            CacheMiss: The request is not cached and the cache is in replay mode.
+        '''
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT digest, created FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                digest, created = row
+                ttl = self.ttls.get(endpoint_of(url))
+                expired = ttl is not None and time.time() - created > ttl
+                if os.path.exists(self._blob(digest)) and (self.replay or not expired):
+                    self.conn.execute("UPDATE entries SET accessed = ? WHERE key = ?",
+                                      (time.time(), key))
+                    return self._blob(digest)
+        if self.replay:
+            raise CacheMiss(f"{url} is not in the cache")
+        return None
+
+    def get(self, key, url):
+        '''Return the cached body of a request as bytes, or None.'''
+        path = self.lookup(key, url)
+        if path is None:
+            return None
+        with open(path, "rb") as f:
+            return f.read()
+
+    def put(self, key, url, chunks):
+        '''Store the body of a request.
+
+        Args:
+            key: The cache key of the request.
+            url: The url of the request.
+            chunks: The body as bytes or an iterable of bytes.
+
+        Returns:
+            path: The path of the cached body.
+        '''
+        if isinstance(chunks, bytes):
+            chunks = [chunks]
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp = tempfile.mkstemp(dir=os.path.join(self.path, "objects"))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in chunks:
+                    digest.update(chunk)
+                    size += len(chunk)
+                    f.write(chunk)
+            digest = digest.hexdigest()
+            os.makedirs(os.path.dirname(self._blob(digest)), exist_ok=True)
+            os.replace(tmp, self._blob(digest))
+        except:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        now = time.time()
+        with self._lock, self.conn:
+            self.conn.execute("BEGIN")
+            self.conn.execute("INSERT OR IGNORE INTO blobs VALUES (?, ?)", (digest, size))
+            old = self.conn.execute("SELECT digest FROM entries WHERE key = ?", (key,)).fetchone()
+            self.conn.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+                              (key, digest, endpoint_of(url), now, now))
+            if old is not None and old[0] != digest:
+                self._drop_blob(old[0])
+        self.evict(keep=key)
+        return self._blob(digest)
+
+    def _drop_blob(self, digest):
+        '''Delete a body that no entry refers to anymore.'''
+        if self.conn.execute("SELECT 1 FROM entries WHERE digest = ?", (digest,)).fetchone():
+            return
+        self.conn.execute("DELETE FROM blobs WHERE digest = ?", (digest,))
+        if os.path.exists(self._blob(digest)):
+            os.remove(self._blob(digest))
+
+    def size(self):
+        '''Return the total size of the cached bodies in bytes.'''
+        return self.conn.execute("SELECT coalesce(sum(size), 0) FROM blobs").fetchone()[0]
+
+    def evict(self, keep=None):
+        '''Evict the least recently used entries until the cache fits in `max_bytes`.
+
+        Args:
+            keep: The key of an entry that must not be evicted, like the one just stored.
+        '''
+        with self._lock, self.conn:
+            self.conn.execute("BEGIN")
+            total = self.size()
+            if total <= self.max_bytes:
+                return
+            rows = self.conn.execute("SELECT key, digest FROM entries ORDER BY accessed").fetchall()
+            for key, digest in rows:
+                if total <= self.max_bytes:
+                    break
+                if key == keep:
+                    continue
+                self.conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                size = self.conn.execute("SELECT size FROM blobs WHERE digest = ?", (digest,)).fetchone()
+                self._drop_blob(digest)
+                if size is not None and not self.conn.execute(
+                        "SELECT 1 FROM blobs WHERE digest = ?", (digest,)).fetchone():
+                    total -= size[0]
+
+    def clear(self):
+        '''Delete everything in the cache.'''
+        with self._lock, self.conn:
+            self.conn.execute("BEGIN")
+            for (digest,) in self.conn.execute("SELECT digest FROM blobs").fetchall():
+                if os.path.exists(self._blob(digest)):
+                    os.remove(self._blob(digest))
+            self.conn.execute("DELETE FROM entries")
+            self.conn.execute("DELETE FROM blobs")
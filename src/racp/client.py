@@ -0,0 +1,203 @@
+import io
+import os
+import time
+import random
+import multiprocessing
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from loguru import logger
+
+class TokenBucket:
+    '''A token bucket rate limiter that can be shared by processes.
+
+    Create it in the parent process and pass it to the worker processes as an argument of
+    `multiprocessing.Process`. All of them then draw from the same bucket, so N processes
+    together stay under `rate` requests per second. Don't send it through a Queue, the shared
+    memory it uses can only be inherited.
+
+    Attributes:
+        rate: Tokens added per second.
+        capacity: Maximum number of tokens, i.e. the largest burst allowed.
+    '''
+    def __init__(self, rate=1.0, capacity=1.0, ctx=None) -> None:
+        ctx = ctx or multiprocessing.get_context()
+        self.rate = rate
+        self.capacity = capacity
+        self._lock = ctx.Lock()
+        self._tokens = ctx.RawValue("d", capacity)
+        self._last = ctx.RawValue("d", time.monotonic())
+
+    def acquire(self, tokens=1.0):
+        '''Block until `tokens` tokens are available and take them.'''
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens.value = min(self.capacity,
+                                         self._tokens.value + (now - self._last.value) * self.rate)
+                self._last.value = now
+                if self._tokens.value >= tokens:
+                    self._tokens.value -= tokens
+                    return
+                wait = (tokens - self._tokens.value) / self.rate
+            time.sleep(wait)
+
+def _retry_after(value):
+    '''Parse a Retry-After header into seconds. Returns None if it is missing or invalid.'''
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def _cached_response(url, path, stream):
+    '''Build a `requests.Response` from a cached body.'''
+    r = requests.Response()
+    r.status_code = 200
+    r.url = url
+    if stream:
+        r.raw = open(path, "rb")
+    else:
+        with open(path, "rb") as f:
+            r.raw = io.BytesIO(f.read())
+    return r
+
+class CrawlClient:
+    '''An HTTP client for crawling arXiv and semantics scholar.
+
+    All requests go through one `requests.Session`, so connections are kept alive and reused
+    instead of paying a TCP and TLS handshake per call. Failed requests are retried with
+    exponential backoff and full jitter, and a `Retry-After` header sent with 429 or 503 is
+    honoured. Hosts listed in `limiters` are rate limited by their `TokenBucket`. With a
+    `ResponseCache`, requests already cached don't touch the network at all.
+
+    Attributes:
+        session: The underlying `requests.Session`.
+        limiters: A dictionary formated as {host : TokenBucket}.
+        max_retries: Number of retries before giving up.
+        backoff: Base delay of the exponential backoff in seconds.
+        max_backoff: Maximum delay between two tries in seconds.
+        timeout: Default timeout of a request.
+        cache: A `racp.cache.ResponseCache`, default to None.
+        logger: loguru logger.
+    '''
+    RETRY_STATUS = {429, 500, 502, 503, 504}
+
+    def __init__(
+        self,
+        limiters=None,
+        max_retries=3,
+        backoff=1.0,
+        max_backoff=60.0,
+        timeout=60,
+        pool_size=10,
+        cache=None,
+        logger=logger
+    ) -> None:
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.limiters = limiters or {}
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.cache = cache
+        self.logger = logger
+
+    def backoff_delay(self, attempt, retry_after=None):
+        '''Seconds to wait before try `attempt + 1`.'''
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    def request(self, method, url, **kwargs):
+        '''Send a request and retry on failure.
+
+        If the client has a cache, the response is served from it when possible and
+        successful responses are stored in it.
+
+        Args:
+            method: "GET" or "POST".
+            url: The url to request.
+            kwargs: Passed to `requests.Session.request`, except `cache`. With `cache=False`
+                the cached response isn't used, the request goes to the network and its
+                response replaces the cached one. The cache is still read in replay mode.
+
+        Returns:
+            response: A `requests.Response` with a successful status code.
+
+        Raises:
+            ConnectionError: The request failed with a client error or failed `max_retries + 1`
+                times.
+        '''
+        use_cache = kwargs.pop("cache", True)
+        if self.cache is None:
+            return self._send(method, url, **kwargs)
+        stream = kwargs.pop("stream", False)
+        key = self.cache.key(method, url, kwargs.get("params"), kwargs.get("json"))
+        path = self.cache.lookup(key, url) if use_cache or self.cache.replay else None
+        if path is None:
+            with self._send(method, url, stream=True, **kwargs) as r:
+                path = self.cache.put(key, url, r.iter_content(1 << 16))
+        return _cached_response(url, path, stream)
+
+    def _send(self, method, url, **kwargs):
+        '''Send a request to the network and retry on failure.'''
+        kwargs.setdefault("timeout", self.timeout)
+        limiter = self.limiters.get(urlsplit(url).netloc)
+        for attempt in range(self.max_retries + 1):
+            if limiter is not None:
+                limiter.acquire()
+            retry_after = None
+            try:
+                r = self.session.request(method, url, **kwargs)
+            except requests.RequestException as e:
+                error = e
+            else:
+                if r.status_code not in self.RETRY_STATUS:
+                    try:
+                        r.raise_for_status()
+                    except requests.HTTPError as e:
+                        self.logger.error(f"Failed to get {url}: {e}")
+                        raise ConnectionError(str(e))
+                    return r
+                error = f"status {r.status_code}"
+                retry_after = _retry_after(r.headers.get("Retry-After"))
+            if attempt < self.max_retries:
+                delay = self.backoff_delay(attempt, retry_after)
+                self.logger.warning(f"Fail {attempt+1} time ({error}), try again in {delay:.1f} secs")
+                time.sleep(delay)
+        self.logger.error(f"Failed to get {url} for {self.max_retries+1} times. Give up.")
+        raise ConnectionError(f"Failed to get {url}")
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+_client = None
+_client_pid = None
+
+def get_client():
+    '''Return the CrawlClient of the current process, creating one if needed.'''
+    global _client, _client_pid
+    if _client is None or _client_pid != os.getpid():
+        _client = CrawlClient()
+        _client_pid = os.getpid()
+    return _client
+
+def set_client(client):
+    '''Make `client` the CrawlClient used by `racp.crawl` in the current process.'''
+    global _client, _client_pid
+    _client = client
+    _client_pid = os.getpid()
@@ -0,0 +1,453 @@
+import os
+import json
+import shutil
+from array import array
+from collections import OrderedDict
+from collections.abc import Set
+from functools import partial
+import numpy as np
+from racp.graph import IdSet
+
+# The file describing a columnar dataset, also used to recognize one.
+COLUMNAR_META = "columns.json"
+COLUMNAR_VERSION = 1
+
+# Items a ColumnarItems keeps built, the least recently used ones are dropped.
+CACHE_SIZE = 4096
+
+# (PaperItem attribute, json key, column type) of every column.
+FIELDS = [
+    ("arxiv_id", "arxivId", "str"),
+    ("ss_id", "paperId", "str"),
+    ("citations", "citations", "list"),
+    ("citation_count", "citationCount", "int"),
+    ("references", "references", "list"),
+    ("authors", "authors", "list"),
+    ("publication", "publication", "list"),
+    ("date", "date", "str"),
+    ("title", "title", "str"),
+    ("abstract", "abstract", "str"),
+    ("content", "content", "str"),
+]
+
+def is_columnar(path):
+    '''Whether `path` is a directory written by `write_columnar`.'''
+    return os.path.isfile(os.path.join(path, COLUMNAR_META))
+
+def _load_bytes(path):
+    '''Memory map a file of bytes, mmap can't map an empty file.'''
+    if os.path.getsize(path) == 0:
+        return np.empty(0, dtype=np.uint8)
+    return np.memmap(path, dtype=np.uint8, mode="r")
+
+class _StringWriter:
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path + ".data", "wb")
+        self.offsets = array("q", [0])
+        self.nulls = array("b")
+
+    def append(self, value):
+        self.nulls.append(value is None)
+        data = value.encode("utf-8") if value is not None else b""
+        self.file.write(data)
+        self.offsets.append(self.offsets[-1] + len(data))
+
+    def close(self):
+        self.file.close()
+        np.save(self.path + ".offsets.npy", np.frombuffer(self.offsets, dtype=np.int64))
+        if any(self.nulls):
+            np.save(self.path + ".nulls.npy", np.frombuffer(self.nulls, dtype=np.bool_))
+
+class _ListWriter:
+    def __init__(self, path):
+        self.path = path
+        self.values = _StringWriter(path + ".values")
+        self.offsets = array("q", [0])
+        self.nulls = array("b")
+
+    def append(self, value):
+        self.nulls.append(value is None)
+        for item in value or []:
+            self.values.append(item)
+        self.offsets.append(self.offsets[-1] + len(value or []))
+
+    def close(self):
+        self.values.close()
+        np.save(self.path + ".offsets.npy", np.frombuffer(self.offsets, dtype=np.int64))
+        if any(self.nulls):
+            np.save(self.path + ".nulls.npy", np.frombuffer(self.nulls, dtype=np.bool_))
+
+class _IntWriter:
+    def __init__(self, path):
+        self.path = path
+        self.values = array("q")
+        self.nulls = array("b")
+
+    def append(self, value):
+        self.nulls.append(value is None)
+        self.values.append(value if value is not None else 0)
+
+    def close(self):
+        np.save(self.path + ".npy", np.frombuffer(self.values, dtype=np.int64))
+        if any(self.nulls):
+            np.save(self.path + ".nulls.npy", np.frombuffer(self.nulls, dtype=np.bool_))
+
+_WRITERS = {"str": _StringWriter, "list": _ListWriter, "int": _IntWriter}
+
+def write_columnar(items, path):
+    '''Write papers as a columnar dataset.
+
+    Every field is stored in its own files under `path`. Strings are concatenated in a
+    `.data` file with their boundaries in an `.offsets.npy` array, lists of strings add one
+    more level of offsets, and integers are a plain `.npy` array. Missing values are marked
+    in a `.nulls.npy` mask. The items are written one by one, so a dataset doesn't have to
+    fit in memory.
+
+    Args:
+        items: An iterable of PaperItems.
+        path: The directory to write, created if needed.
+
+    Returns:
+        length: The number of papers written.
+    '''
+    os.makedirs(path, exist_ok=True)
+    writers = [(attr, _WRITERS[kind](os.path.join(path, key))) for attr, key, kind in FIELDS]
+    length = 0
+    try:
+        for item in items:
+            for attr, writer in writers:
+                value = getattr(item, attr)
+                if isinstance(value, (Set, tuple)):
+                    value = list(value)
+                writer.append(value)
+            length += 1
+    finally:
+        for _, writer in writers:
+            writer.close()
+    with open(os.path.join(path, COLUMNAR_META), "w", encoding="utf-8") as f:
+        json.dump({"version": COLUMNAR_VERSION, "length": length,
+                   "columns": dict((key, kind) for _, key, kind in FIELDS)}, f, indent=4)
+    return length
+
+class StringColumn:
+    '''A memory mapped column of strings.'''
+    def __init__(self, path) -> None:
+        self.offsets = np.load(path + ".offsets.npy", mmap_mode="r")
+        self.data = _load_bytes(path + ".data")
+        self.nulls = np.load(path + ".nulls.npy") if os.path.exists(path + ".nulls.npy") else None
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if self.nulls is not None and self.nulls[index]:
+            return None
+        return bytes(self.data[self.offsets[index]:self.offsets[index + 1]]).decode("utf-8")
+
+    def slice(self, start, stop):
+        '''Return the strings of the rows in [start, stop) as a list.'''
+        offsets = np.asarray(self.offsets[start:stop + 1]) - self.offsets[start]
+        raw = bytes(self.data[self.offsets[start]:self.offsets[stop]])
+        try:
+            # Byte offsets are character offsets for ascii, like ids and dates.
+            text = raw.decode("ascii")
+        except UnicodeDecodeError:
+            text = None
+        bounds = offsets.tolist()
+        if text is not None:
+            values = [text[a:b] for a, b in zip(bounds[:-1], bounds[1:])]
+        else:
+            values = [raw[a:b].decode("utf-8") for a, b in zip(bounds[:-1], bounds[1:])]
+        if self.nulls is not None:
+            for i in np.flatnonzero(self.nulls[start:stop]):
+                values[i] = None
+        return values
+
+    def tolist(self):
+        return self.slice(0, len(self))
+
+class ListColumn:
+    '''A memory mapped column of lists of strings.'''
+    def __init__(self, path) -> None:
+        self.offsets = np.load(path + ".offsets.npy", mmap_mode="r")
+        self.values = StringColumn(path + ".values")
+        self.nulls = np.load(path + ".nulls.npy") if os.path.exists(path + ".nulls.npy") else None
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if self.nulls is not None and self.nulls[index]:
+            return None
+        return self.values.slice(self.offsets[index], self.offsets[index + 1])
+
+    def lengths(self):
+        '''Return the length of every list as an array, without reading the strings.'''
+        return np.diff(self.offsets)
+
+    def tolist(self):
+        values = self.values.tolist()
+        bounds = self.offsets.tolist()
+        lists = [values[a:b] for a, b in zip(bounds[:-1], bounds[1:])]
+        if self.nulls is not None:
+            for i in np.flatnonzero(self.nulls):
+                lists[i] = None
+        return lists
+
+class IntColumn:
+    '''A memory mapped column of integers.'''
+    def __init__(self, path) -> None:
+        self.values = np.load(path + ".npy", mmap_mode="r")
+        self.nulls = np.load(path + ".nulls.npy") if os.path.exists(path + ".nulls.npy") else None
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, index):
+        if self.nulls is not None and self.nulls[index]:
+            return None
+        return int(self.values[index])
+
+    def tolist(self):
+        values = self.values.tolist()
+        if self.nulls is not None:
+            for i in np.flatnonzero(self.nulls):
+                values[i] = None
+        return values
+
+_COLUMNS = {"str": StringColumn, "list": ListColumn, "int": IntColumn}
+
+class ColumnarStore:
+    '''A columnar dataset written by `write_columnar`, opened with memory maps.
+
+    Opening only reads the small offset arrays' headers, and a column is mapped the first
+    time it is used. Reading the titles of all the papers therefore never touches the bytes
+    of their content.
+
+    Attributes:
+        path: The directory of the dataset.
+        length: The number of papers.
+    '''
+    def __init__(self, path) -> None:
+        with open(os.path.join(path, COLUMNAR_META), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta["version"] != COLUMNAR_VERSION:
+            raise ValueError(f"Unsupported columnar version {meta['version']}")
+        self.path = path
+        self.length = meta["length"]
+        self._kinds = meta["columns"]
+        self._columns = {}
+
+    def __len__(self):
+        return self.length
+
+    def column(self, key):
+        '''Return the column of a json key of PaperItem, like "title" or "citations".'''
+        if key not in self._columns:
+            self._columns[key] = _COLUMNS[self._kinds[key]](os.path.join(self.path, key))
+        return self._columns[key]
+
+    def row(self, index, exclude=()):
+        '''Return the paper at `index` as a json dictionary of PaperItem without `exclude`.'''
+        return dict((key, self.column(key)[index]) for _, key, _ in FIELDS if key not in exclude)
+
+    def write_column(self, key, values):
+        '''Replace the column of a json key by `values`, one per paper.
+
+        The column is written to a temporary directory and its files are moved over the old
+        ones, the memory maps already open keep reading the old files.
+        '''
+        if len(values) != self.length:
+            raise ValueError(f"{len(values)} values for a column of {self.length} papers.")
+        tmp = os.path.join(self.path, key + ".tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        writer = _WRITERS[self._kinds[key]](os.path.join(tmp, key))
+        try:
+            for value in values:
+                writer.append(list(value) if isinstance(value, (Set, tuple)) else value)
+        finally:
+            writer.close()
+        names = os.listdir(tmp)
+        for name in os.listdir(self.path):
+            # Like a nulls mask the new column doesn't need.
+            if name.startswith(key + ".") and name not in names and \
+                    os.path.isfile(os.path.join(self.path, name)):
+                os.remove(os.path.join(self.path, name))
+        for name in names:
+            os.replace(os.path.join(tmp, name), os.path.join(self.path, name))
+        os.rmdir(tmp)
+        self._columns.pop(key, None)
+
+class ColumnarItems:
+    '''A read-mostly sequence of PaperItems backed by a `ColumnarStore`.
+
+    An item is only built when it is accessed. The last `cache_size` items built are kept in
+    an LRU cache, so iterating over all the items never holds more than that in memory. The
+    row an item was built from is kept with it, and an item that differs from its row when
+    it is dropped from the cache, because a field was set or a list or set field changed in
+    place, is held until its changes are written by `write_column`, so they stick. Changes
+    made to an item after it was dropped are lost, change the items you get from the
+    dataset. `keep` holds an item until `release` as well. `column` reads a field of all the
+    items from its column, taking the changed items into account. If `graph` is set, the
+    citations and references of new items are views into it.
+    '''
+    def __init__(self, store, author_store=None, length=-1, cache_size=CACHE_SIZE) -> None:
+        self.store = store
+        self.author_store = author_store
+        self.length = min(length, len(store)) if length > 0 else len(store)
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        # {index : item} of the items changed or kept, and the rows of the items in memory.
+        self.changed = {}
+        self.kept = set()
+        self.rows = {}
+        self.graph = None
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("index out of range")
+        if index in self.changed:
+            return self.changed[index]
+        if index in self.cache:
+            self.cache.move_to_end(index)
+            return self.cache[index]
+        from racp.data import PaperItem
+        row = self.store.row(index, exclude=("content",))
+        # The content is only read from its column when the item needs it.
+        item = PaperItem(data=row, author_store=self.author_store,
+                         content_source=partial(self._read_content, index))
+        if row.get("publication") is not None:
+            # The item holds the list of the row, which must not change with it.
+            row["publication"] = list(row["publication"])
+        if self.graph is not None:
+            item.citations = self.graph.citation_set(index)
+            item.references = self.graph.reference_set(index)
+        self.rows[index] = row
+        self.cache[index] = item
+        if len(self.cache) > self.cache_size:
+            self._evict()
+        return item
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def _read_content(self, index):
+        content = self.store.column("content")[index]
+        if index in self.rows:
+            self.rows[index]["content"] = content
+        return content
+
+    def _differs(self, index, item, attr, key, kind):
+        '''Whether a field of an item differs from the row it was built from.'''
+        row = self.rows[index]
+        if attr == "content":
+            # Content that was never read is the one of the row.
+            return item._content_source is None and item._content is not row.get("content")
+        value, saved = getattr(item, attr), row[key]
+        if value is saved:
+            return False
+        if isinstance(value, IdSet):
+            if value.ids is None:
+                # A view is the row until it is changed.
+                return False
+            value = value.ids
+        if kind == "list" and isinstance(value, (set, frozenset)) and saved is not None:
+            return len(value) != len(saved) or not value.issuperset(saved)
+        return value != saved
+
+    def _is_changed(self, index, item):
+        '''Whether any field of a built item differs from its row.'''
+        row = self.rows[index]
+        for attr, key, kind in FIELDS:
+            # Most fields are still the objects of the row.
+            if (attr == "content" or getattr(item, attr) is not row[key]) and \
+                    self._differs(index, item, attr, key, kind):
+                return True
+        return False
+
+    def _evict(self):
+        '''Drop the least recently used item, unless it was changed.'''
+        index, item = self.cache.popitem(last=False)
+        if self._is_changed(index, item):
+            self.changed[index] = item
+        else:
+            del self.rows[index]
+
+    def keep(self, index):
+        '''Hold the item at `index` until `release`.'''
+        item = self[index]
+        self.kept.add(index)
+        self.cache.pop(index, None)
+        self.changed[index] = item
+        return item
+
+    def release(self, indices):
+        '''Let the items kept at `indices` be dropped again, once their changes are written.'''
+        for index in indices:
+            self.kept.discard(index)
+            self._settle(index)
+
+    def _settle(self, index):
+        '''Put a held item back in the cache if it isn't kept and all its changes are written.'''
+        item = self.changed.get(index)
+        if item is None or index in self.kept or self._is_changed(index, item):
+            return
+        del self.changed[index]
+        self.cache[index] = item
+        if len(self.cache) > self.cache_size:
+            self._evict()
+
+    def built(self):
+        '''Yield (index, item) for the items built and still in memory.'''
+        yield from self.changed.items()
+        yield from self.cache.items()
+
+    def _changed(self, attr):
+        '''Return {index : item} of the items whose field `attr` may differ from its column.'''
+        key, kind = dict((attr, (key, kind)) for attr, key, kind in FIELDS)[attr]
+        for index, item in list(self.cache.items()):
+            if self._differs(index, item, attr, key, kind):
+                self.cache.pop(index)
+                self.changed[index] = item
+        return self.changed
+
+    def column(self, attr):
+        '''Return the values of a PaperItem attribute of all the items as a list.'''
+        key = dict((attr, key) for attr, key, _ in FIELDS)[attr]
+        column = self.store.column(key)
+        values = column.tolist() if self.length == len(column) else \
+            [column[i] for i in range(self.length)]
+        for i, item in self._changed(attr).items():
+            values[i] = getattr(item, attr)
+        return values
+
+    def write_column(self, attr):
+        '''Write a PaperItem attribute of all the items, with the changes of the changed ones,
+        to its column. The changed items whose changes are all written go back to the cache.'''
+        key, kind = dict((attr, (key, kind)) for attr, key, kind in FIELDS)[attr]
+        values = self.store.column(key).tolist()
+        for i, item in self._changed(attr).items():
+            values[i] = getattr(item, attr)
+        self.store.write_column(key, values)
+        for index, item in list(self.changed.items()):
+            value = getattr(item, attr)
+            self.rows[index][key] = list(value) if kind == "list" and value is not None else value
+            self._settle(index)
+
+    def lengths(self, attr):
+        '''Return the length of a list attribute, like citations, of all the items.'''
+        key = dict((attr, key) for attr, key, _ in FIELDS)[attr]
+        lengths = self.store.column(key).lengths()[:self.length].tolist()
+        for i, item in self._changed(attr).items():
+            lengths[i] = len(getattr(item, attr) or [])
+        return lengths
@@ -1,11 +1,17 @@
-import requests
+import asyncio
+import aiohttp
 from bs4 import BeautifulSoup
 from tqdm import tqdm
 import os
 import json
-import time
-import fitz
-from racp.utils import save_json, makedir
+import tempfile
+import requests
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED, \
+    as_completed
+from urllib.parse import urlsplit
+from racp.utils import save_json, makedir, parse_pdf
+from racp.client import get_client
+from racp.state import CrawlState, PENDING, DONE, FAILED
 from loguru import logger
 
 logger.add(
@@ -14,13 +20,200 @@ logger.add(
     level="ERROR"
 )
 
+ARXIV_LIST = "https://arxiv.org/list"
+ARXIV_PDF = "https://arxiv.org/pdf"
+SEMANTIC_SCHOLAR_API = "https://api.semanticscholar.org/graph/v1"
+PAPER_FIELDS = "title,externalIds,citations,publicationTypes,authors,references,publicationDate,abstract"
+# Maximum number of ids accepted by one request to the batch endpoints.
+PAPER_BATCH_SIZE = 500
+AUTHOR_BATCH_SIZE = 1000
+
+class HostRateLimiter:
+    '''A per-host politeness limiter for asyncio crawls.
+
+    Every host gets its own schedule and two requests to the same host never start
+    closer than `interval` seconds. Requests to different hosts don't wait for each other.
+
+    Attributes:
+        interval: Minimum seconds between two requests to the same host.
+    '''
+    def __init__(self, interval=1.0) -> None:
+        self.interval = interval
+        self._next = {}
+
+    async def wait(self, url):
+        '''Sleep until `url` is allowed to be requested.'''
+        host = urlsplit(url).netloc
+        now = asyncio.get_running_loop().time()
+        start = max(now, self._next.get(host, now))
+        self._next[host] = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+def _parse_paper_num(text):
+    '''Get the total number of papers from the first page of an arXiv listing.'''
+    bs = BeautifulSoup(text, features="xml")
+    return int(bs.find_all("small")[0].text.split(" ")[3])
+
+def _parse_pdf_ids(text):
+    '''Get all pdf ids on an arXiv listing page.'''
+    bs = BeautifulSoup(text, features="xml")
+    return [link['href'].split("/")[-1] for link in bs.find_all('a', title="Download PDF")]
+
+async def crawl_pages(
+        urls : list,
+        parse,
+        concurrency=4,
+        interval=1.0,
+        logger=logger,
+        headers=None,
+        timeout=30,
+        desc=None,
+        callback=None,
+        cache=None
+):
+    '''Fetch pages concurrently and parse them.
+
+    At most `concurrency` requests are in flight at the same time and requests to the same
+    host are spaced by a `HostRateLimiter`. Internet and parsing errors will be logged and pass.
+
+    Args:
+        urls: List of urls to crawl.
+        parse: A function that turns the text of a page into the result you want.
+        concurrency: Maximum number of requests in flight.
+        interval: Minimum seconds between two requests to the same host.
+        logger: loguru logger.
+        headers: Default to None.
+        timeout: Default to 30.
+        desc: Description shown in the progress bar.
+        callback: A function called as `callback(url, result, error)` as soon as a page is
+            done. `error` is None if the page succeeded and `result` is None if it failed.
+        cache: A `racp.cache.ResponseCache` to serve pages from, default to None.
+
+    Returns:
+        results: A dictionary formated as {url : parse(text)}.
+        failed_cases: List of urls failed to crawl.
+    '''
+    limiter = HostRateLimiter(interval)
+    semaphore = asyncio.Semaphore(concurrency)
+    results = {}
+    failed_cases = []
+
+    async def fetch(session, url):
+        async with semaphore:
+            try:
+                body = None
+                if cache is not None:
+                    key = cache.key("GET", url)
+                    body = cache.get(key, url)
+                if body is None:
+                    await limiter.wait(url)
+                    async with session.get(url) as res:
+                        res.raise_for_status()
+                        body = await res.read()
+                    if cache is not None:
+                        cache.put(key, url, body)
+                results[url] = parse(body.decode("utf-8", errors="replace"))
+            except Exception as e:
+                logger.error(f"Fail to get {url}")
+                failed_cases.append(url)
+                if callback is not None:
+                    callback(url, None, repr(e))
+            else:
+                if callback is not None:
+                    callback(url, results[url], None)
+
+    async with aiohttp.ClientSession(
+        headers=headers,
+        timeout=aiohttp.ClientTimeout(total=timeout),
+        connector=aiohttp.TCPConnector(limit=concurrency)
+    ) as session:
+        tasks = [asyncio.ensure_future(fetch(session, url)) for url in urls]
+        for task in tqdm(asyncio.as_completed(tasks), total=len(tasks), desc=desc):
+            await task
+    return results, failed_cases
+
+def _listing_pages(url, paper_num):
+    '''All the pages of an arXiv listing that has `paper_num` papers.'''
+    return [url + f"?skip={100*i}&show=100" for i in range(paper_num//100+1)]
+
+async def get_ids_async(
+        years : int,
+        fields : list,
+        save_path : str,
+        logger=logger,
+        headers=None,
+        timeout=30,
+        concurrency=4,
+        interval=1.0,
+        base_url=ARXIV_LIST,
+        cache=None
+):
+    '''The coroutine behind `get_ids`. Use it directly if an event loop is already running.'''
+    times = ["{}{:02}".format(23-i,j) for i in range(years) for j in range(1,13)]
+    first_queries = ["/".join([base_url,field,month]) for field in fields for month in times]
+    options = dict(concurrency=concurrency, interval=interval, logger=logger,
+                   headers=headers, timeout=timeout, cache=cache)
+    with CrawlState(save_path) as state:
+        queries_path = os.path.join(save_path, "all_queries.json")
+        if os.path.exists(queries_path) and not state.status("page")[DONE]:
+            # Pick up the urls of a crawl made before the state existed.
+            with open(queries_path) as f:
+                pages = {}
+                for url in json.load(f):
+                    pages.setdefault(url.split("?")[0], []).append(url)
+            for url, urls in pages.items():
+                state.add(urls, "page")
+                state.mark(url, "month", DONE, result=str(100*(len(urls)-1)))
+        state.add(first_queries, "month")
+
+        def month_done(url, paper_num, error):
+            if error is not None:
+                state.mark(url, "month", FAILED, error=error)
+            else:
+                state.add(_listing_pages(url, paper_num), "page")
+                state.mark(url, "month", DONE, result=str(paper_num))
+
+        todo = set(state.keys("month", (PENDING, FAILED)))
+        months = [url for url in first_queries if url in todo]
+        if months:
+            logger.debug("Start to construct all urls to crawl")
+            _, failed_cases = await crawl_pages(months, _parse_paper_num, callback=month_done, **options)
+            if failed_cases:
+                logger.debug("Trying again to get failed cases")
+                await crawl_pages(failed_cases, _parse_paper_num, callback=month_done, **options)
+        paper_nums = state.results("month")
+        all_queries = [page for url in first_queries if url in paper_nums \
+                       for page in _listing_pages(url, int(paper_nums[url]))]
+        save_json(all_queries, queries_path, logger, "all_queries.json")
+
+        def page_done(url, pdf_ids, error):
+            if error is not None:
+                state.mark(url, "page", FAILED, error=error)
+            else:
+                state.add(pdf_ids, "paper")
+                state.mark(url, "page", DONE, result=json.dumps(pdf_ids))
+
+        todo = set(state.keys("page", (PENDING, FAILED)))
+        await crawl_pages([url for url in all_queries if url in todo], _parse_pdf_ids,
+                          callback=page_done, **options)
+        pages = state.results("page")
+    ids = list(set(pdf_id for url in all_queries if url in pages for pdf_id in json.loads(pages[url])))
+    save_json(ids, os.path.join(save_path, "targets.json"), logger, "targets.json")
+    logger.info(f"Get {len(ids)} pdf to crawl")
+    return ids
+
 def get_ids(
         years : int, 
         fields : list, 
         save_path : str,
         logger=logger, 
         headers=None, 
-        timeout=30
+        timeout=30,
+        concurrency=4,
+        interval=1.0,
+        base_url=ARXIV_LIST,
+        cache=None
 ):
     '''Get pdf arXiv ids from specified field and years.
     
@@ -28,8 +221,15 @@ def get_ids(
     For example, get_links(3, [cs.IR], ..) returns all cs.IR papers in 2021-2023 and saves data into
     the given path. The json file is named "targets.json". Internet errors will be logged and pass.
     Note that we first need to get all urls to crawl since arXiv defaultly set one page contains 25
-    paper. The cache will be saved as "all_queries.json". If you want to crawl again, please delete
-    the cache.
+    paper. The urls will be saved as "all_queries.json".
+
+    The status of every listing url is recorded in a `CrawlState` in `save_path` as soon as it is
+    fetched, so a rerun or a crawl resumed after a crash only fetches months and pages that are
+    new or failed. If you want to crawl everything again, please delete "crawl_state.db".
+
+    Pages are fetched concurrently by an asyncio crawler. Instead of sleeping a fixed time after
+    every page, requests to arXiv are spaced by `interval` seconds and at most `concurrency` of
+    them are in flight.
 
     Args:
         years: The num of years you want to crawl from 2023.
@@ -38,73 +238,26 @@ def get_ids(
         logger: loguru logger.
         headers: Default to None.
         timeout: Default to 30.
+        concurrency: Maximum number of requests in flight, default to 4.
+        interval: Minimum seconds between two requests to the same host, default to 1.0.
+        base_url: The url of arXiv listings. Change it to crawl from a mirror.
+        cache: A `racp.cache.ResponseCache` to serve listing pages from, default to None.
 
     Returns:
         ids: A List that contains all the pdf ids needed.
     '''
+    return asyncio.run(get_ids_async(years, fields, save_path, logger, headers, timeout,
+                                     concurrency, interval, base_url, cache))
 
-    times = ["{}{:02}".format(23-i,j) for i in range(years) for j in range(1,13)]
-    base_url = "https://arxiv.org/list"
-    failed_cases = []
-    first_queries = []
-    all_queries = []
-    if os.path.exists(os.path.join(save_path, "all_queries.json")):
-        with open(os.path.join(save_path, "all_queries.json")) as f:
-            all_queries = json.load(f)
-    else:
-        for field in fields:
-            queries = ["/".join([base_url,field,times[i]]) for i in range(len(times))]
-            first_queries += queries
-        logger.debug("Start to construct all urls to crawl")
-        for url in tqdm(first_queries):
-            try:
-                res = requests.get(url, headers=headers, timeout=timeout)
-                res.raise_for_status()
-                bs = BeautifulSoup(res.text, features="xml")
-                paper_num = int(bs.find_all("small")[0].text.split(" ")[3])
-                queries = [url + f"?skip={100*i}&show=100" for i in range(paper_num//100+1)]
-                all_queries += queries
-                time.sleep(5)
-            except:
-                logger.error(f"Fail to get {url}")
-                failed_cases.append(url)
-                pass
-        logger.debug("Trying again to get failed cases")
-        for url in tqdm(failed_cases):
-            try:
-                res = requests.get(url, headers=headers, timeout=timeout)
-                res.raise_for_status()
-                bs = BeautifulSoup(res.text, features="xml")
-                paper_num = int(bs.find_all("small")[0].text.split(" ")[3])
-                queries = [url + f"?skip={100*i}&show=100" for i in range(paper_num//100+1)]
-                all_queries += queries
-                time.sleep(5)
-            except:
-                logger.error(f"Fail to get {url}")
-                pass
-        save_json(all_queries, os.path.join(save_path, "all_queries.json"),logger, "all_queries.json")
-    ids = []
-    for url in tqdm(all_queries):
-        try:
-            res = requests.get(url, headers=headers, timeout=timeout)
-            res.raise_for_status()
-            bs = BeautifulSoup(res.text, features="xml")
-            pdf_links = bs.find_all('a', title="Download PDF")
-            for link in pdf_links:
-                ids.append(link['href'].split("/")[-1])
-        except:
-            logger.error(f"Fail to get {url}")
-            pass
-    ids = list(set(ids))
-    save_json(ids, os.path.join(save_path, "targets.json"), logger, "targets.json")
-    logger.info(f"Get {len(ids)} pdf to crawl")
-    return ids
+def _headers(key):
+    '''Request headers carrying the semantics scholar api key.'''
+    return {"x-api-key": key} if key else None
 
 def get_ss_data_by_arxiv(
         arxiv_id, 
         logger=logger, 
         key="",
-        count=0
+        client=None
 ):
     '''Get semantics scholar data given arXiv id.
     
@@ -112,34 +265,28 @@ def get_ss_data_by_arxiv(
         arxiv_id: The arXiv id of the paper.
         logger: loguru logger.
         key: The semantics api key, default to "".
-        count: Record the number of trys.
+        client: The CrawlClient to use, default to the one of the current process.
 
     Returns:
         data: A json dictionary from semantics scholar api.
     '''
-    headers = {"x-api-key": key}
+    client = client or get_client()
     try:
-        r = requests.get(
-            f'https://api.semanticscholar.org/graph/v1/paper/arXiv:{arxiv_id}',
-            params={'fields': 'title,externalIds,citations,publicationTypes,authors,references,publicationDate,abstract',},
-            headers=headers
+        r = client.get(
+            f'{SEMANTIC_SCHOLAR_API}/paper/arXiv:{arxiv_id}',
+            params={'fields': PAPER_FIELDS},
+            headers=_headers(key)
         )
-        r.raise_for_status()
         return r.json()
-    except:
-        if count < 3:
-            logger.warning(f"Fail {count+1} time, try again in 3 secs")
-            time.sleep(3)
-            return get_ss_data_by_arxiv(arxiv_id, logger, key, count+1)
-        else:
-            logger.error(f"Failed to get {arxiv_id} for 3 times. Give up.")
-            raise ConnectionError()
+    except ConnectionError:
+        logger.error(f"Failed to get {arxiv_id}. Give up.")
+        raise
     
 def get_ss_data_by_ss(
         ss_id, 
         logger=logger, 
         key = "",
-        count = 0
+        client=None
 ):
     '''Get semantics scholar data given semantics scholar ids.
     
@@ -147,109 +294,297 @@ def get_ss_data_by_ss(
         ss_id: The semantics scholar paper id.
         loggger: loguru logger.
         key: The semantics api key, default to "".
-        count: Record the number of trys.
+        client: The CrawlClient to use, default to the one of the current process.
     
     Returns:
         data: A json dictionary from semantics scholar api.
     '''
-    headers = {"x-api-key": key}
+    client = client or get_client()
     try:
-        r = requests.get(
-            f'https://api.semanticscholar.org/graph/v1/paper/{ss_id}',
-            params={'fields': 'title,externalIds,citations,publicationTypes,authors,references,publicationDate,abstract',},
-            headers=headers
+        r = client.get(
+            f'{SEMANTIC_SCHOLAR_API}/paper/{ss_id}',
+            params={'fields': PAPER_FIELDS},
+            headers=_headers(key)
         )
-        r.raise_for_status()
         return r.json()
-    except:
-        if count < 3:
-            logger.warning(f"Fail {count+1} time, try again in 3 secs")
-            time.sleep(3)
-            return get_ss_data_by_ss(ss_id, logger, key, count+1)
-        else:
-            logger.error(f"Failed to get {ss_id} for 3 times. Give up.")
-            raise ConnectionError()
+    except ConnectionError:
+        logger.error(f"Failed to get {ss_id}. Give up.")
+        raise
         
 def get_arxiv_data(
         arxiv_id : str,
-        logger=logger
+        logger=logger,
+        client=None
     ):
     '''Given arXiv id, this function gets pdf text data from arXiv.
-    
+
+    The pdf is streamed to a temporary file with `download_pdf` and parsed from there, so it
+    is never held in memory as a whole. Use `pdf_pipeline` to parse many pdfs in a pool of
+    processes while the next ones download.
+
     Args:
         arxiv_id: The arXiv id of the paper you want.
         logger: loguru logger.
-        
+        client: The CrawlClient to use, default to the one of the current process.
+
     Returns:
         text: Raw text of the pdf extracted by PyMuPDF.
     '''
+    client = client or get_client()
+    with tempfile.TemporaryDirectory() as save_path:
+        path = download_pdf(arxiv_id, save_path, logger, client)
+        try:
+            text = parse_pdf(path)
+        except:
+            logger.error(f"Fail to parse {arxiv_id}")
+            raise ConnectionError()
+    logger.debug(f"Successfully get {arxiv_id}")
+    return text
+
+def download_pdf(
+        arxiv_id : str,
+        save_path : str,
+        logger=logger,
+        client=None,
+        chunk_size=1<<16
+    ):
+    '''Stream the pdf of a paper from arXiv to disk.
+
+    The pdf is written chunk by chunk, so it is never held in memory as a whole. It is saved as
+    "{arxiv_id}.pdf" in `save_path` and only appears there once it is complete.
+
+    Args:
+        arxiv_id: The arXiv id of the paper you want.
+        save_path: The directory to save the pdf.
+        logger: loguru logger.
+        client: The CrawlClient to use, default to the one of the current process.
+        chunk_size: Bytes written at a time.
+
+    Returns:
+        path: The path of the saved pdf.
+    '''
+    client = client or get_client()
+    path = os.path.join(save_path, f"{arxiv_id}.pdf")
     try:
-        document = requests.get(f"https://arxiv.org/pdf/{arxiv_id}",timeout=60)
-        document.raise_for_status()
-        text = ""
-        pdf = fitz.open(stream=document.content, filetype="pdf")
-        for page in pdf.pages():
-            text += page.get_text()
-        logger.debug(f"Successfully get {arxiv_id}")
-        return text
+        with client.get(f"{ARXIV_PDF}/{arxiv_id}", stream=True) as document:
+            with open(path + ".part", "wb") as f:
+                for chunk in document.iter_content(chunk_size):
+                    f.write(chunk)
+        os.replace(path + ".part", path)
+        logger.debug(f"Successfully download {arxiv_id}")
+        return path
     except:
         logger.error(f"Fail to download {arxiv_id}")
+        if os.path.exists(path + ".part"):
+            os.remove(path + ".part")
         raise ConnectionError()
 
-def get_author_info(
-        author_ids,
+def pdf_pipeline(
+        arxiv_ids : list,
+        save_path : str,
+        logger=logger,
+        client=None,
+        download_workers=4,
+        processes=None,
+        max_pages=None,
+        keep_pdf=True
+    ):
+    '''Download pdfs and extract their text with overlapping network I/O and parsing.
+
+    Pdfs are streamed to `save_path` by a pool of `download_workers` threads. As soon as a pdf
+    is on disk, its text is extracted by a pool of `processes` processes with
+    `racp.utils.parse_pdf`, so the CPU bound parsing never blocks a download.
+
+    Args:
+        arxiv_ids: A list of arXiv ids.
+        save_path: The directory to save the pdfs.
+        logger: loguru logger.
+        client: The CrawlClient to use, default to the one of the current process.
+        download_workers: Number of concurrent downloads.
+        processes: Number of parsing processes, default to the number of CPUs.
+        max_pages: Only extract the first `max_pages` pages of a pdf, default to all pages.
+        keep_pdf: Whether to keep the pdf files after their text is extracted.
+
+    Yields:
+        result: A tuple (arxiv_id, text, error) per paper in the order they finish. `text` is
+            None and `error` describes the failure if the paper failed.
+    '''
+    client = client or get_client()
+    with ThreadPoolExecutor(download_workers) as downloads, \
+         ProcessPoolExecutor(processes) as parsers:
+        pending = {downloads.submit(download_pdf, arxiv_id, save_path, logger, client): \
+                   (arxiv_id, None) for arxiv_id in arxiv_ids}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                arxiv_id, path = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    yield arxiv_id, None, repr(e)
+                    continue
+                if path is None:
+                    pending[parsers.submit(parse_pdf, result, max_pages=max_pages)] = (arxiv_id, result)
+                    continue
+                if not keep_pdf:
+                    os.remove(path)
+                yield arxiv_id, result, None
+
+def _post_batch(
+        endpoint,
+        ids,
+        fields,
         logger=logger,
         key="",
-        count=0
+        client=None,
+        cache=True
 ):
-    '''Get author data from semantics scholar'''
-    headers = {"x-api-key": key}
+    '''Post one chunk of ids to a semantics scholar batch endpoint, bypassing the response
+    cache of the client if `cache` is False.'''
+    client = client or get_client()
     try:
-        r = requests.post(
-            'https://api.semanticscholar.org/graph/v1/author/batch',
-            params={'fields': 'name,citationCount,paperCount'},
-            json={"ids": author_ids},
-            headers=headers
+        r = client.post(
+            f'{SEMANTIC_SCHOLAR_API}/{endpoint}/batch',
+            params={'fields': fields},
+            json={"ids": ids},
+            headers=_headers(key),
+            cache=cache
         )
-        r.raise_for_status()
         return r.json()
-    except:
-        if count < 3:
-            logger.warning(f"Fail {count+1} time, try again in 3 secs")
-            time.sleep(3)
-            get_author_info(author_ids, logger, key, count+1)
-        else:
-            logger.error(f"Failed to get {author_ids} for 3 times. Give up.")
-            raise ConnectionError()
+    except ConnectionError:
+        logger.error(f"Failed to get {len(ids)} {endpoint}s. Give up.")
+        raise
 
-def get_citaions(
+def get_ss_data_batch(
+        arxiv_ids : list,
+        logger=logger,
+        key="",
+        batch_size=PAPER_BATCH_SIZE,
+        client=None
+):
+    '''Get semantics scholar data of many papers given their arXiv ids.
+
+    The ids are sent to the `/paper/batch` endpoint in chunks of `batch_size`, so ingesting
+    N papers costs N / `batch_size` requests instead of N.
+
+    Args:
+        arxiv_ids: A list of arXiv ids.
+        logger: loguru logger.
+        key: The semantics api key, default to "".
+        batch_size: Number of ids per request, at most `PAPER_BATCH_SIZE`.
+        client: The CrawlClient to use, default to the one of the current process.
+
+    Returns:
+        data: A dictionary formated as {arxiv_id : data}. Papers unknown to semantics scholar
+            are mapped to None.
+    '''
+    data = {}
+    for i in range(0, len(arxiv_ids), batch_size):
+        chunk = arxiv_ids[i:i+batch_size]
+        result = _post_batch("paper", [f"arXiv:{arxiv_id}" for arxiv_id in chunk],
+                             PAPER_FIELDS, logger, key, client)
+        data.update(zip(chunk, result))
+    return data
+
+def get_author_info(
+        author_ids,
+        logger=logger,
+        key="",
+        count=0,
+        *,
+        batch_size=AUTHOR_BATCH_SIZE,
+        client=None
+):
+    '''Get author data from semantics scholar.
+
+    Args:
+        author_ids: A list of semantics scholar author ids.
+        logger: loguru logger.
+        key: The semantics api key, default to "".
+        count: The number of failed attempts so far. The client retries the requests now,
+            it is kept for the callers that pass it.
+        batch_size: Number of ids per request, at most `AUTHOR_BATCH_SIZE`.
+        client: The CrawlClient to use, default to the one of the current process.
+
+    Returns:
+        authors: A list of author data in the same order as `author_ids`. Unknown authors
+            are None.
+    '''
+    authors = []
+    for i in range(0, len(author_ids), batch_size):
+        authors += _post_batch("author", author_ids[i:i+batch_size],
+                               'name,citationCount,paperCount', logger, key, client)
+    return authors
+
+def get_citation_counts(
     ss_ids : list,
-    key=""
+    key="",
+    client=None,
+    batch_size=PAPER_BATCH_SIZE,
+    workers=4,
+    logger=logger
 ):
-    '''Get citationCount from semantics scholar.
-    
+    '''Get citationCount from semantics scholar, with the ids that failed.
+
+    The ids are sent to the `/paper/batch` endpoint in chunks of `batch_size`, `workers`
+    chunks at a time. The counts are always fetched from the network, a response cache of
+    the client is only updated. A chunk that fails, by a connection error or a response
+    that isn't a json list, doesn't stop the others, its ids are returned as failed.
+
     Args:
         ss_ids: A list of semantics scholar id.
         key: Semanctics scholar api key.
-        
+        client: The CrawlClient to use, default to the one of the current process.
+        batch_size: Number of ids per request, at most `PAPER_BATCH_SIZE`.
+        workers: Number of requests in flight.
+        logger: loguru logger.
+
     Returns:
-        citationcount: A dict.
+        A tuple (citationcount, failed_ids):
+        citationcount: A dict formated as {ss_id : citationCount}. Papers unknown to
+            semantics scholar are left out.
+        failed_ids: A list of the ids of the chunks that failed.
     '''
     citaioncount = {}
-    try:
-        r = requests.post(
-            'https://api.semanticscholar.org/graph/v1/paper/batch',
-            params={'fields': 'citationCount'},
-            json={"ids": ss_ids},
-            headers={"x-api-key": key},
-            timeout=10
-        )
-        r.raise_for_status()
-        for item in r.json():
-            citaioncount[item["paperId"]] = item["citationCount"]
-        return citaioncount
-    except:
-        raise ConnectionError()
+    failed_ids = []
+    client = client or get_client()
+    chunks = [ss_ids[i:i+batch_size] for i in range(0, len(ss_ids), batch_size)]
+    with ThreadPoolExecutor(workers) as executor:
+        futures = dict((executor.submit(_post_batch, "paper", chunk, "citationCount",
+                                        logger, key, client, False), chunk) for chunk in chunks)
+        for future in tqdm(as_completed(futures), total=len(futures), desc="Citations"):
+            try:
+                result = future.result()
+                if not isinstance(result, list):
+                    raise ValueError(f"Unexpected response {str(result)[:200]}")
+            except (ConnectionError, requests.RequestException, ValueError) as e:
+                logger.error(f"Failed to get the citations of {len(futures[future])} papers: {e!r}")
+                failed_ids += futures[future]
+                continue
+            for ss_id, item in zip(futures[future], result):
+                if item is not None:
+                    citaioncount[ss_id] = item["citationCount"]
+    return citaioncount, failed_ids
+
+def get_citaions(
+    ss_ids : list,
+    key="",
+    client=None,
+    batch_size=PAPER_BATCH_SIZE,
+    workers=4,
+    logger=logger
+):
+    '''Get citationCount from semantics scholar.
+
+    Like `get_citation_counts`, the chunks that fail are only logged.
+
+    Returns:
+        citationcount: A dict formated as {ss_id : citationCount}.
+    '''
+    citaioncount, failed_ids = get_citation_counts(ss_ids, key, client, batch_size, workers, logger)
+    if failed_ids:
+        logger.warning(f"Failed to get the citations of {len(failed_ids)} papers")
+    return citaioncount
     
 def check_download(
         pdfids : list,
@@ -258,8 +593,10 @@ def check_download(
     ):
     '''Check whether all pdf have been downloaded and download fail cases.
     
-    Given a List of pdf ids, it will check the `data` directory under `save_path`. It returns the
-    pdf ids failed to download.
+    Given a List of pdf ids, it will check the `CrawlState` in `save_path`. It returns the
+    pdf ids failed to download. The first time it is called on a state without any downloaded
+    paper, the `data` directory under `save_path` is scanned once and the papers found there
+    are recorded as done.
 
     Args:
         pdfids: List of pdf ids.
@@ -269,8 +606,14 @@ def check_download(
     Returns:
         failed_ids: The ids of failed pdfs.
     '''
-    existing = set(map(lambda file: os.path.splitext(file)[0], os.listdir(os.path.join(save_path, "data"))))
-    failed_ids = list(set(pdfids) - existing)
+    with CrawlState(save_path) as state:
+        data_path = os.path.join(save_path, "data")
+        if not state.status("paper")[DONE] and os.path.exists(data_path):
+            existing = [os.path.splitext(file)[0] for file in os.listdir(data_path) \
+                        if file.endswith(".json") and file != "authors.json"]
+            state.mark(existing, "paper", DONE)
+        state.add(pdfids, "paper")
+        pdfids = set(pdfids)
+        failed_ids = [pdfid for pdfid in state.keys("paper", (PENDING, FAILED)) if pdfid in pdfids]
     logger.info(f"{len(failed_ids)} pdfs are failed")
     return failed_ids
-
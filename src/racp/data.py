@@ -1,79 +1,217 @@
 import os
 import json
+import hashlib
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
 import jsonlines
 from tqdm import tqdm
 import racp.crawl as crawl
-from racp.utils import save_json,ccbc 
+from racp.utils import save_json
+from racp.columnar import ColumnarStore, ColumnarItems, is_columnar, write_columnar
+from racp.graph import CitationGraph, CitationIndex
+from racp.scoring import CCBCScorer, ccbc_candidates, topk_sparse
+from racp.quality import QUALITY_FILE, QualityEngine, citation_score
+from racp.stats import DatasetStats
 from torch.utils.data import Dataset
 import numpy as np 
 from datetime import datetime
+try:
+    # orjson parses the json files of a dataset several times faster if it is installed.
+    from orjson import loads as _loads
+except ImportError:
+    _loads = json.loads
+
+AUTHORS_FILE = "authors.json"
+
+class AuthorStore:
+    '''Semantics scholar data of the authors of a dataset, stored once per author.
+
+    Papers only keep the ids of their authors, and the name, paperCount and citationCount of
+    each author are stored here. `fetch` only requests the authors that aren't in the store
+    yet, with `/author/batch` requests of `crawl.AUTHOR_BATCH_SIZE` ids, so an author of many
+    papers is fetched and saved once for the whole dataset.
+
+    Attributes:
+        authors: A dictionary formated as {author id : author data}. Authors unknown to
+            semantics scholar are None, so they aren't requested again.
+        logger: loguru logger.
+    '''
+    def __init__(self, path=None, logger=crawl.logger) -> None:
+        '''Initialize empty, or from a json file saved by `save` if `path` exists.'''
+        self.authors = {}
+        self.logger = logger
+        if path != None and os.path.exists(path):
+            self.load(path)
+
+    def __len__(self):
+        return len(self.authors)
+
+    def __contains__(self, author_id):
+        return author_id in self.authors
+
+    def __getitem__(self, author_id):
+        return self.authors[author_id]
+
+    def get(self, author_id, default=None):
+        return self.authors.get(author_id, default)
+
+    def add(self, author):
+        '''Add the semantics scholar data of an author.'''
+        if isinstance(author, dict) and author.get("authorId") != None:
+            self.authors[author["authorId"]] = author
+
+    def fetch(self, author_ids, key=""):
+        '''Fetch the data of the authors that aren't in the store yet.
+
+        Args:
+            author_ids: A list of semantics scholar author ids, duplicates are fine.
+            key: The semantics api key, default to "".
+
+        Returns:
+            unseen: The author ids that were requested.
+        '''
+        unseen = [author_id for author_id in dict.fromkeys(author_ids) \
+                  if author_id != None and author_id not in self.authors]
+        if unseen:
+            for author_id, author in zip(unseen, crawl.get_author_info(unseen, self.logger, key)):
+                self.authors[author_id] = author
+        return unseen
+
+    def save(self, path):
+        '''Save as a json file.'''
+        save_json(self.authors, path, self.logger, os.path.basename(path))
+
+    def load(self, path):
+        '''Load from a json file, keeping the authors already in the store.'''
+        with open(path, "r", encoding="utf-8") as f:
+            self.authors.update(json.load(f))
+
+def _json_content(path):
+    '''Read the content of a paper saved as a json file.'''
+    with open(path, "rb") as f:
+        return _loads(f.read()).get("content", "")
+
+def _read_paper(path):
+    '''Read a paper saved as a json file without its content, None if it can't be parsed.'''
+    try:
+        with open(path, "rb") as f:
+            data = _loads(f.read())
+    except Exception:
+        return None
+    if not isinstance(data, dict):
+        return None
+    data.pop("content", None)
+    return data
+
+def _jsonl_content(path, offset):
+    '''Read the content of the paper on the line starting at byte `offset` of a jsonl file.'''
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return json.loads(f.readline()).get("content", "")
+
 class PaperItem:
     '''A structure that store data of a paper.
+
+    Items use `__slots__` to stay small. The content of an item loaded by `RawSet` is not
+    kept in memory: it is read from the file it was loaded from the first time `content` is
+    accessed.
     
     Attributes:
        arxiv_id: The arXiv id of the paper.
        ss_id: The semantics scholar id of the paper.
        citations: Set of ss_ids of the papers cite this paper.
+       citation_count: The citationCount from semantics scholar, kept up to date by
+           `RawSet.refresh_citations`. None until it is refreshed.
        references: Set of ss_ids of the papers cited by this paper.
-       authors: List of semantics scholar author data of this paper.
+       authors: List of semantics scholar author ids of this paper. Their data is kept in
+           an `AuthorStore`.
        publication: The publication type of the paper(A list).
        date: The publication date from arXiv.
        title: The title of the paper from arXiv.
        abstract: The abstract of this paper from arXiv.
        content: The text of this paper from arXiv.
-       logger: logurus logger
+       logger: logurus logger, the one of the module, shared by all the items.
     '''
+    __slots__ = ("arxiv_id", "ss_id", "citations", "citation_count", "references", "authors",
+                 "publication", "date", "title", "abstract", "_content", "_content_source",
+                 "_quality")
+    logger = crawl.logger
+
     def __init__(
         self,
         arxiv_id = None,
         ss_id = None,
         data = None,
         logger = crawl.logger,
-        key = ""
+        key = "",
+        author_store = None,
+        content_source = None
     ) -> None:
-        '''Initialize with arxiv id or ss id. Pass in an api key if you have.'''
+        '''Initialize with arxiv id or ss id. Pass in an api key if you have.
+
+        Author data fetched or loaded on the way is added to `author_store` if given, and
+        `content_source` is passed to `load_json`. `logger` only logs the fetch of `arxiv_id`.
+        '''
         self.arxiv_id = ""
         self.ss_id = ""
         self.citations = set()
+        self.citation_count = None
         self.references = set()
         self.authors = []
         self.publication = []
         self.date = ""
         self.title = ""
         self.abstract = ""
-        self.content = ""
-        self.logger = logger
+        self._content = ""
+        self._content_source = None
         self._quality = None 
         if arxiv_id != None:
-            self.get_data_by_arxiv(arxiv_id, key)
+            self.get_data_by_arxiv(arxiv_id, key, author_store, logger)
         if data != None:
-            self.load_json(data)
+            self.load_json(data, author_store, content_source)
+
+    @property
+    def content(self):
+        if self._content_source is not None:
+            self._content = self._content_source()
+            self._content_source = None
+        return self._content
+
+    @content.setter
+    def content(self, content):
+        self._content = content
+        self._content_source = None
 
     def __repr__(self) -> str:
         return json.dumps(self.to_json(), indent=2)
     
-    def get_data_by_arxiv(self, arxiv_id, key):
+    def get_data_by_arxiv(self, arxiv_id, key, author_store=None, logger=crawl.logger):
         try:
-            data = crawl.get_ss_data_by_arxiv(arxiv_id, self.logger, key)
+            data = crawl.get_ss_data_by_arxiv(arxiv_id, logger, key)
         except:
             raise ConnectionError("Fail to get semantics scholar data.")
+        if author_store != None:
+            try:
+                author_store.fetch([item["authorId"] for item in data["authors"]], key)
+            except:
+                raise ConnectionError("Fail to get semantics scholar data.")
+        self.load_ss_data(arxiv_id, data)
+        try:
+            self.content = crawl.get_arxiv_data(self.arxiv_id, logger)
+        except:
+            raise ConnectionError("Fail to get arXiv data.")
+
+    def load_ss_data(self, arxiv_id, data):
+        '''Fill in the fields given semantics scholar paper data.'''
         self.arxiv_id = arxiv_id
         self.ss_id = data["paperId"]
         self.citations = set([item["paperId"] for item in data["citations"]])
         self.references = set([item["paperId"] for item in data["references"]])
-        try:
-            self.authors = crawl.get_author_info([item["authorId"] \
-                                                  for item in data["authors"]], self.logger, key)
-        except:
-            raise ConnectionError("Fail to get semantics scholar data.")
+        self.authors = [item["authorId"] for item in data["authors"] if item["authorId"] != None]
         self.publication = data["publicationTypes"]
         self.date = data["publicationDate"]
         self.title = data["title"]
         self.abstract = data["abstract"]
-        try:
-            self.content = crawl.get_arxiv_data(self.arxiv_id, self.logger)
-        except:
-            raise ConnectionError("Fail to get arXiv data.")
     
     def to_json(self):
         '''Convert to json format'''
@@ -81,6 +219,7 @@ class PaperItem:
             "arxivId": self.arxiv_id,
             "paperId": self.ss_id,
             "citations": list(self.citations),
+            "citationCount": self.citation_count,
             "references": list(self.references),
             "authors": self.authors,
             "publication": self.publication,
@@ -90,8 +229,12 @@ class PaperItem:
             "content": self.content
         }
         
-    def to_Document(self):
-        """Convert to document format"""
+    def to_Document(self, quality=None):
+        """Convert to document format
+
+        `quality` goes to the metadata, default to `self.quality`. `RawSet.to_Documents` passes
+        the scores of `RawSet.quality`.
+        """
         from langchain_core.documents.base import Document
         abstract = self.abstract
         content = self.content
@@ -100,8 +243,8 @@ class PaperItem:
         # TODO : content retrival 
         if abstract is None:
             abstract = ""
-        metadata = {"source":self.arxiv_id,"title":self.title,"quality":self.quality}
-        metadata = {"source":self.arxiv_id,"title":self.title,"quality":str(self.quality)}
+        quality = quality if quality is not None else self.quality
+        metadata = {"source":self.arxiv_id,"title":self.title,"quality":str(quality)}
         doc = Document(metadata=metadata,page_content=abstract)
         return doc 
     
@@ -110,40 +253,53 @@ class PaperItem:
         save_json(self.to_json(),os.path.join(save_path, f"{self.arxiv_id}.json"),\
                   self.logger, f"{self.arxiv_id}.json")
     
-    def load_json(self, json_data):
-        '''Load from a json dictionary'''
+    def load_json(self, json_data, author_store=None, content_source=None):
+        '''Load from a json dictionary.
+
+        Items saved before the author store embed the data of their authors. It is moved to
+        `author_store` if given and only the ids are kept.
+
+        If `content_source` is given, `content` is ignored and the function is called
+        without arguments to read it when `content` is first accessed.
+        '''
         if not isinstance(json_data, dict):
             raise ValueError("Please pass in a dictionary")
         try:
             self.arxiv_id = json_data.get("arxivId", "")
             self.ss_id = json_data.get("paperId", "")
             self.citations = set(json_data.get("citations", []))
+            self.citation_count = json_data.get("citationCount")
             self.references = set(json_data.get("references",[]))
-            self.authors =  json_data.get("authors", [])
+            self.authors = []
+            for author in json_data.get("authors", []):
+                if isinstance(author, dict):
+                    if author_store != None:
+                        author_store.add(author)
+                    author = author.get("authorId")
+                if author != None:
+                    self.authors.append(author)
             self.publication = json_data.get("publication", [])
             self.date = json_data.get("date", "")
             self.title = json_data.get("title", "")
             self.abstract = json_data.get("abstract", "")
-            self.content = json_data.get("content", "")
+            if content_source is None:
+                self.content = json_data.get("content", "")
+            else:
+                self._content = None
+                self._content_source = content_source
         except:
             raise ValueError("Fail to load data, please check the items.")
     @property
     def quality(self):
-        """Evaluate confidence quality."""
+        """Evaluate confidence quality.
+
+        This is the citation score of this paper alone. `RawSet.quality` scores all the papers
+        of a dataset at once, with the date and author scores as well, see `racp.quality`.
+        """
         if self._quality is None:  # Calculate only if not computed yet
             # TODO: normalize citation 
-            cite_num = len(self.citations)
-            # pubdate = datetime.strptime(self.date, "%Y-%m-%d").date()
-            # today = datetime.now().date()
-            # days_diff = (today - pubdate).days
-            # cite_diff =  cite_num/ days_diff
-            cite_score =  np.log(cite_num+1) # the citation larger than dozens is enough for reality 
-            # TODO: Author score considering the history of publication
-            author_score = 0 
-            # x = (days_diff / 225)
-            # dates_core = np.e * x * np.exp(-x)
-            dates_core=0
-            self._quality = dates_core+cite_score+ author_score 
+            cite_num = self.citation_count if self.citation_count is not None else len(self.citations)
+            self._quality = citation_score(cite_num)
 
         return self._quality
             
@@ -151,36 +307,261 @@ class PaperItem:
         
         
 
+def get_items_by_arxiv(
+    arxiv_ids,
+    logger = crawl.logger,
+    key = "",
+    content = True,
+    author_store = None
+):
+    '''Build PaperItems of many papers with batched semantics scholar requests.
+
+    Paper data is fetched with `crawl.get_ss_data_batch`, so N papers cost about N/500
+    requests instead of N. With an `author_store`, the authors of all the papers that aren't
+    in it yet are fetched together. The pdf text is still downloaded paper by paper.
+
+    Args:
+        arxiv_ids: A list of arXiv ids.
+        logger: loguru logger.
+        key: The semantics api key, default to "".
+        content: Whether to download the pdf text from arXiv. If False, `content` is left
+            empty and you can fill it in later with `crawl.get_arxiv_data`.
+        author_store: An `AuthorStore` to add the authors to, default to None, which doesn't
+            fetch authors.
+
+    Returns:
+        items: A list of PaperItems.
+        failed_ids: The arXiv ids of papers that failed.
+    '''
+    try:
+        papers = crawl.get_ss_data_batch(arxiv_ids, logger, key)
+        if author_store != None:
+            author_store.fetch([author["authorId"] for data in papers.values() \
+                                if data is not None for author in data["authors"]], key)
+    except ConnectionError:
+        raise ConnectionError("Fail to get semantics scholar data.")
+    items = []
+    failed_ids = []
+    for arxiv_id in arxiv_ids:
+        data = papers.get(arxiv_id)
+        if data is None:
+            logger.error(f"{arxiv_id} is not found in semantics scholar")
+            failed_ids.append(arxiv_id)
+            continue
+        item = PaperItem(logger=logger)
+        item.load_ss_data(arxiv_id, data)
+        if content:
+            try:
+                item.content = crawl.get_arxiv_data(arxiv_id, logger)
+            except ConnectionError:
+                failed_ids.append(arxiv_id)
+                continue
+        items.append(item)
+    return items, failed_ids
+
+def iter_items(path, author_store=None, logger=crawl.logger):
+    '''Read PaperItems one by one from a directory of json files or a jsonl file.
+
+    The authors saved with them are loaded into `author_store` if given.
+    '''
+    if os.path.isdir(path):
+        if author_store != None and os.path.exists(os.path.join(path, AUTHORS_FILE)):
+            author_store.load(os.path.join(path, AUTHORS_FILE))
+        for file in sorted(os.listdir(path)):
+            if file == AUTHORS_FILE or not file.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(path, file), "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except:
+                logger.error(f"Fail to load {file}")
+                continue
+            yield PaperItem(data=data, logger=logger, author_store=author_store)
+    else:
+        if author_store != None and os.path.exists(_authors_path(path)):
+            author_store.load(_authors_path(path))
+        with jsonlines.open(path, "r") as f:
+            for data in f:
+                yield PaperItem(data=data, logger=logger, author_store=author_store)
+
+def convert_to_columnar(src, dst, logger=crawl.logger):
+    '''Convert a directory of json files or a jsonl file to a columnar dataset.
+
+    The papers are streamed, so the dataset doesn't have to fit in memory.
+
+    Args:
+        src: A directory of json files or a jsonl file saved by `RawSet.save`.
+        dst: The directory of the columnar dataset.
+        logger: loguru logger.
+
+    Returns:
+        length: The number of papers converted.
+    '''
+    author_store = AuthorStore(logger=logger)
+    length = write_columnar(tqdm(iter_items(src, author_store, logger)), dst)
+    author_store.save(os.path.join(dst, AUTHORS_FILE))
+    return length
+
+def _authors_path(filepath):
+    '''Return the path of the author store saved with a jsonl file.'''
+    return os.path.splitext(filepath)[0] + ".authors.json"
+
+def _quality_path(filepath):
+    '''Return the path of the quality scores saved with a jsonl file.'''
+    return os.path.splitext(filepath)[0] + ".quality.npz"
+
 class RawSet(Dataset):
-    '''A torch Dataset storing raw data.'''
-    def __init__(self, save_path=None,length = -1 ) -> None:
+    '''A torch Dataset storing raw data.
+
+    The author data of the papers is kept in `author_store`. It is saved next to the papers,
+    as `authors.json` in a directory or `{name}.authors.json` next to a jsonl file. The
+    inputs of the quality scores of `quality` are saved the same way, as `quality.npz`.
+
+    A dataset saved with `save_columnar` is opened with memory maps instead of being parsed:
+    items are only built when they are accessed, and the statistics read only the columns
+    they need.
+
+    `graph` holds the citations and references of all the papers as int32 arrays, see
+    `build_graph`.
+    '''
+    def __init__(self, save_path=None,length = -1, author_store=None, processes=None) -> None:
+        '''Load from `save_path` if given, at most `length` papers if it is positive.
+
+        A directory of json files is read by `processes` processes, default to the number of
+        CPUs.
+        '''
         super().__init__()
         self.items = []  # List of PaperItems
         self.id2idx = {}
+        self._graph = None
+        self._scorer = None
+        self._index = None
+        self._quality_engine = None
+        self._quality_path = None
+        self._stats = None
+        self.author_store = author_store if author_store != None else AuthorStore()
         if save_path != None:
-            self._load_from_directory(save_path,length)
+            if is_columnar(save_path):
+                self.open_columnar(save_path, length)
+            else:
+                self._load_from_directory(save_path,length,processes)
 
-    def _load_from_directory(self, save_path,length = -1 ):
-        '''Load json files from given directory.'''
-        filenames = os.listdir(save_path)
-        for idx, file in tqdm(enumerate(filenames), total=len(filenames)):
-            path = os.path.join(save_path, file)
-            try:
-                with open(path, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-            except:
-                print(path)
-                continue
-            item = PaperItem()
-            item.load_json(data)
-            self.id2idx[item.arxiv_id] = idx
-            self.items.append(item)
-            # TODO : remove for deveplop 
-            if length>0 and len(self.items)>length:
-                break
+    def _load_from_directory(self, save_path,length = -1, processes=None):
+        '''Load json files from given directory.
+
+        Files are read and decoded by a pool of processes and sent back without their
+        content, which stays lazy. With a positive `length`, only as many files as needed to
+        get `length` papers are read.
+        '''
+        filenames = sorted(os.listdir(save_path))
+        self._quality_path = os.path.join(save_path, QUALITY_FILE)
+        if QUALITY_FILE in filenames:
+            filenames.remove(QUALITY_FILE)
+        if AUTHORS_FILE in filenames:
+            filenames.remove(AUTHORS_FILE)
+            self.author_store.load(os.path.join(save_path, AUTHORS_FILE))
+        paths = [os.path.join(save_path, file) for file in filenames]
+        processes = processes or os.cpu_count() or 1
+        executor = ProcessPoolExecutor(processes) if processes > 1 and len(paths) > 1 else None
+        start = 0
+        try:
+            with tqdm(total=min(length, len(paths)) if length > 0 else len(paths)) as bar:
+                while start < len(paths) and (length <= 0 or len(self.items) < length):
+                    # Files that fail to parse are replaced by the next ones.
+                    stop = len(paths) if length <= 0 else start + length - len(self.items)
+                    chunk = paths[start:stop]
+                    start = stop
+                    if executor is None:
+                        results = map(_read_paper, chunk)
+                    else:
+                        results = executor.map(_read_paper, chunk,
+                                               chunksize=max(1, len(chunk) // (processes * 8)))
+                    for path, data in zip(chunk, results):
+                        if data is None:
+                            crawl.logger.error(f"Fail to load {path}")
+                            continue
+                        item = PaperItem()
+                        item.load_json(data, self.author_store, partial(_json_content, path))
+                        self.id2idx[item.arxiv_id] = len(self.items)
+                        self.items.append(item)
+                        bar.update(1)
+        finally:
+            if executor is not None:
+                executor.shutdown()
     
+    def open_columnar(self, path, length=-1):
+        '''Open a dataset saved by `save_columnar`.'''
+        if os.path.exists(os.path.join(path, AUTHORS_FILE)):
+            self.author_store.load(os.path.join(path, AUTHORS_FILE))
+        self.items = ColumnarItems(ColumnarStore(path), self.author_store, length)
+        self._graph = self._index = self._quality_engine = self._stats = None
+        self._quality_path = os.path.join(path, QUALITY_FILE)
+        self.id2idx = dict((arxiv_id, idx) for idx, arxiv_id in enumerate(self.items.column("arxiv_id")))
+
+    def save_columnar(self, path):
+        '''Save as a columnar dataset in directory `path`, see `racp.columnar.write_columnar`.'''
+        if isinstance(self.items, ColumnarItems) and \
+                os.path.abspath(self.items.store.path) == os.path.abspath(path):
+            raise ValueError("Can't overwrite the columnar dataset the items are read from.")
+        write_columnar(self.items, path)
+        self.author_store.save(os.path.join(path, AUTHORS_FILE))
+        if self._quality_engine is not None:
+            self.quality.save(os.path.join(path, QUALITY_FILE))
+
+    def _writable_items(self):
+        '''Turn items read from a columnar dataset into a plain list before changing it.'''
+        if isinstance(self.items, ColumnarItems):
+            self.items = list(self.items)
+        return self.items
+
+    @property
+    def graph(self):
+        '''The `racp.graph.CitationGraph` of the dataset, built on first use.
+
+        It is rebuilt when items are added, call `build_graph` after changing the citations
+        or references of existing items.
+        '''
+        if self._graph is None or len(self._graph) != len(self.items):
+            self.build_graph()
+        return self._graph
+
+    def build_graph(self, views=True):
+        '''Intern all the ids of the dataset and build its citation graph.
+
+        Args:
+            views: Whether to replace the citations and references of the items by
+                `racp.graph.IdSet` views into the graph. They work like the sets of ids they
+                replace, but the ids are only stored once for the whole dataset. A view that
+                is changed copies its ids to a set of its own. Items built later from a
+                columnar dataset get views too.
+
+        Returns:
+            graph: The `racp.graph.CitationGraph`, also available as `graph`.
+        '''
+        self._graph = CitationGraph.build(self._column("ss_id"), self._column("citations"),
+                                          self._column("references"))
+        if views:
+            if isinstance(self.items, ColumnarItems):
+                self.items.graph = self._graph
+                # The changed items keep their sets, their rows don't have them.
+                items = list(self.items.cache.items())
+            else:
+                items = enumerate(self.items)
+            for idx, item in items:
+                item.citations = self._graph.citation_set(idx)
+                item.references = self._graph.reference_set(idx)
+        return self._graph
+
+    def _column(self, attr):
+        '''Return an attribute of all the items, reading only its column if possible.'''
+        if isinstance(self.items, ColumnarItems):
+            return self.items.column(attr)
+        return [getattr(item, attr) for item in self.items]
+
     def add_item(self, item : PaperItem):
-        self.items.append(item)
+        self.id2idx[item.arxiv_id] = len(self.items)
+        self._writable_items().append(item)
+        self._index_new_items()
     
     def get_item_by_arxivid(self,arxiv_id):
         if self.id2idx.get(arxiv_id,-1) !=-1:
@@ -194,86 +575,260 @@ class RawSet(Dataset):
         return len(self.items)
     
     def save(self, filepath):
-        '''Save as jsonl file.'''
-        with jsonlines.open(filepath, "w") as f:
+        '''Save as jsonl file, and the authors as `{name}.authors.json` next to it.
+
+        Content that isn't loaded yet is only read to be written and stays lazy. The file is
+        written aside and moved in place, so a dataset can be saved over the file it was
+        loaded from.
+        '''
+        lazy = []
+        with open(filepath + ".tmp", "wb") as f:
             for item in self.items:
-                data = item.to_json()
-                f.write(data)
-    
+                source = item._content_source
+                offset = f.tell()
+                f.write((json.dumps(item.to_json(), ensure_ascii=False) + "\n").encode("utf-8"))
+                if source is not None:
+                    lazy.append((item, source, offset))
+        os.replace(filepath + ".tmp", filepath)
+        for item, source, offset in lazy:
+            if isinstance(source, partial) and source.func is _jsonl_content and \
+                    os.path.abspath(source.args[0]) == os.path.abspath(filepath):
+                source = partial(_jsonl_content, filepath, offset)
+            item._content = None
+            item._content_source = source
+        self.author_store.save(_authors_path(filepath))
+        if self._quality_engine is not None:
+            self._quality_path = _quality_path(filepath)
+            self.save_quality()
+
     def load(self, filepath):
         '''Load from a jsonl file.'''
-        with jsonlines.open(filepath, "r") as f:
-            for item in f:
-                self.items.append(PaperItem(data=item))
+        if os.path.exists(_authors_path(filepath)):
+            self.author_store.load(_authors_path(filepath))
+        if not self.items:
+            self._quality_path = _quality_path(filepath)
+        items = self._writable_items()
+        with open(filepath, "rb") as f:
+            offset = 0
+            for line in f:
+                if line.strip():
+                    item = PaperItem(data=json.loads(line), author_store=self.author_store,
+                                     content_source=partial(_jsonl_content, filepath, offset))
+                    self.id2idx[item.arxiv_id] = len(items)
+                    items.append(item)
+                offset += len(line)
     
+    @property
+    def stats(self):
+        '''The `racp.stats.DatasetStats` of the dataset.
+
+        The statistics are computed in one pass on first use, and only the papers added since
+        are read when they are used again, unless a paper was changed in place.
+        '''
+        if self._stats is None:
+            self._stats = DatasetStats()
+        return self._stats.sync(self)
+
+    def compute_stats(self):
+        '''Compute all the statistics again, see `stats`.'''
+        self._stats = None
+        return self.stats
+
     def all_papers(self):
         '''Return a set of semantics scholar ids involved.'''
-        papers = set()
-        for item in self.items:
-            papers.add(item.ss_id)
-            for cite in item.citations:
-                papers.add(cite)
-            for ref in item.references:
-                papers.add(ref)
-        return papers
+        return set(self.stats.papers)
     
     def all_authors(self):
         '''Return a dictionary with all author ids in the dataset as keys.'''
-        all_authors = {}
-        for item in self.items:
-            try:
-                for author in item.authors:
-                    all_authors[author["authorId"]] = {
-                        "name": author["name"],
-                        "paperCount": author["paperCount"],
-                        "citationCount": author["citationCount"]
-                    }
-            except:
-                continue
-        
-        return all_authors
+        return dict((author_id, dict(author)) for author_id, author in self.stats.authors.items())
     
     def publication_types(self):
         '''Return a dictionary counting all publication types' papers.'''
-        type_count = {}
-        for item in self.items:
-            if item.publication != None:
-                for type in item.publication:
-                    type_count[type] = type_count.get(type, 0) + 1
-        
-        return type_count
+        return dict(self.stats.publication_types)
     
     def publication_years(self):
         '''Return a dictionary counting papers each year.'''
-        year_count = {}
-        for item in self.items:
-            try:
-                year = item.date.split("-")[0]
-            except:
+        return dict(self.stats.publication_years)
+
+    def refresh_citations(self, key="", save_path=None, workers=4, logger=crawl.logger):
+        '''Refresh the citation counts of all the papers from semantics scholar.
+
+        Only citationCount is requested, with `crawl.get_citation_counts`, so nothing but the counts
+        is downloaded again. Items whose count changed are updated in place.
+
+        Args:
+            key: The semantics api key, default to "".
+            save_path: Where the dataset is saved. In a directory of json files only the
+                changed items are rewritten, in the columnar dataset the items are read from
+                only the citationCount column is, other columnar datasets and jsonl files are
+                rewritten if any item changed.
+                Default to None, which doesn't save.
+            workers: Number of requests in flight.
+            logger: loguru logger.
+
+        Returns:
+            summary: A dictionary with the number of papers `updated`, `unchanged`, `failed`
+                and `missing` from semantics scholar, the total change of citations `delta`,
+                and `changes` formated as {arxiv_id : [old count, new count]}.
+        '''
+        ss_ids = list(dict.fromkeys(item.ss_id for item in self.items if item.ss_id))
+        counts, failed_ids = crawl.get_citation_counts(ss_ids, key, workers=workers, logger=logger)
+        failed_ids = set(failed_ids)
+        changed = []
+        summary = {"updated": 0, "unchanged": 0, "failed": 0, "missing": 0, "delta": 0,
+                   "changes": {}}
+        changed_indices = []
+        for idx, item in enumerate(self.items):
+            if item.ss_id in failed_ids:
+                summary["failed"] += 1
                 continue
-            year_count[year] = year_count.get(year,0) + 1
-    
-        return year_count
+            count = counts.get(item.ss_id)
+            if count is None:
+                summary["missing"] += 1
+                continue
+            if count == item.citation_count:
+                summary["unchanged"] += 1
+                continue
+            old = item.citation_count if item.citation_count is not None else len(item.citations)
+            summary["updated"] += 1
+            summary["delta"] += count - old
+            summary["changes"][item.arxiv_id] = [old, count]
+            item.citation_count = count
+            item._quality = None
+            changed.append(item)
+            changed_indices.append(idx)
+        if self._quality_engine is not None:
+            # Only the scores of the changed papers are computed again.
+            self._quality_engine.update(self, changed_indices)
+        if self._stats is not None:
+            self._stats.update_citations(self, changed_indices)
+        if save_path != None and changed:
+            if is_columnar(save_path):
+                if isinstance(self.items, ColumnarItems) and \
+                        os.path.abspath(self.items.store.path) == os.path.abspath(save_path):
+                    # Only the citationCount column of the store the items are read from changes.
+                    self.items.write_column("citation_count")
+                    if self._quality_engine is not None:
+                        self.save_quality(os.path.join(save_path, QUALITY_FILE))
+                else:
+                    self.save_columnar(save_path)
+            elif os.path.isdir(save_path):
+                for item in changed:
+                    item.save_json(save_path)
+                if self._quality_engine is not None:
+                    self.save_quality(os.path.join(save_path, QUALITY_FILE))
+            else:
+                self.save(save_path)
+        logger.info(f"Citations of {summary['updated']} papers updated ({summary['delta']:+d}), "
+                    f"{summary['unchanged']} unchanged, {summary['failed']} failed, "
+                    f"{summary['missing']} missing")
+        return summary
 
     def paper_citations(self):
         '''Return a dictionary of papers' citaiton counts.'''
-        return dict([(item.arxiv_id, len(item.citations)) for item in self.items])
+        return dict(self.stats.paper_citations)
+    @property
+    def quality(self):
+        '''The `racp.quality.QualityEngine` scoring all the papers.
+
+        On first use it is loaded from the quality file saved with the dataset if there is
+        one, with the papers that changed since it was saved read again, and computed
+        otherwise. Papers added later, and the author inputs after the author store grew, are
+        scored when it is used again, and `refresh_citations` scores the papers whose citations
+        changed again. Call `quality.check(dataset)` after editing items in place.
+        '''
+        if self._quality_engine is None:
+            engine = QualityEngine()
+            if self._quality_path is not None and os.path.exists(self._quality_path):
+                engine.load(self._quality_path)
+                if engine.arxiv_ids != self._column("arxiv_id")[:len(engine)]:
+                    engine = QualityEngine()
+                else:
+                    engine.check(self)
+            self._quality_engine = engine
+        if len(self._quality_engine) != len(self.items) or \
+                self._quality_engine.author_count != len(self.author_store):
+            self._quality_engine.sync(self)
+        return self._quality_engine
+
+    def save_quality(self, path=None):
+        '''Save the inputs of the quality scores, default to the file of the dataset.'''
+        path = path if path is not None else self._quality_path
+        if path is None:
+            raise ValueError("The dataset wasn't loaded from a file, give a path.")
+        self.quality.save(path)
+
+    def to_Documents(self):
+        '''Convert all the papers to documents, with the scores of `quality`.'''
+        return [item.to_Document(quality) for item, quality in zip(self.items, self.quality.scores)]
+
+    def document_fields(self):
+        '''Yield the arxiv id, title, text and quality `to_Documents` puts in every document.
+
+        Only the arxiv ids, titles and abstracts are read, from the columns of a columnar
+        dataset, and the content of the papers without an abstract.
+        '''
+        scores = self.quality.scores
+        for idx, (arxiv_id, title, abstract) in enumerate(zip(
+                self._column("arxiv_id"), self._column("title"), self._column("abstract"))):
+            if abstract is None:
+                abstract = (self.items[idx].content or "")[:250]
+            yield arxiv_id, title, abstract, scores[idx]
+
+    def documents_fingerprint(self):
+        '''Return a sha1 hex digest of what `to_Documents` converts, without building them.'''
+        digest = hashlib.sha1()
+        for arxiv_id, title, text, quality in self.document_fields():
+            digest.update(f"{arxiv_id}\0{title}\0{text}\0{quality}\1".encode("utf-8", "surrogatepass"))
+        return digest.hexdigest()
+
+    @property
+    def index(self):
+        '''The `racp.graph.CitationIndex` of the dataset, built from `graph` on first use.
+
+        Items added by `add_item` and `load_from_papers` are then added to it as they come.
+        '''
+        if self._index is None or len(self._index) > len(self.items):
+            self._index = CitationIndex(self.graph)
+        self._index_new_items()
+        return self._index
+
+    def _index_new_items(self):
+        if self._index is not None:
+            for idx in range(len(self._index), len(self.items)):
+                item = self.items[idx]
+                self._index.add(item.ss_id, item.citations, item.references)
+
+    @property
+    def scorer(self):
+        '''The `racp.scoring.CCBCScorer` of `graph`.'''
+        if self._scorer is None or self._scorer.graph is not self.graph:
+            self._scorer = CCBCScorer(self.graph)
+        return self._scorer
+
     def topk(self, paper, k=100):
-        """Return top k relevance paper"""
-        sim = np.zeros(self.__len__())
-        for i in range(self.__len__()):
-            paper_i = self.__getitem__(i)
-            sim[i] = ccbc(paper, paper_i)
-        
-        # 使用np.argsort获取排序后的索引数组
-        print(sim)
-        print(np.argsort(sim))
-        print(k,type(k))
-        topk_indices = np.argsort(sim)[::-1][:k]
+        """Return top k relevance paper
+
+        Only the papers linked to `paper` in `index` are scored, the others have a ccbc of 0.
+        Ties go to the paper loaded first.
+        """
+        candidates, scores = ccbc_candidates(self.index, paper)
+        indices = topk_sparse(candidates, scores, k, len(self))
         # 获取对应的top k项
-        topk_items = [self.__getitem__(i) for i in topk_indices]
+        topk_items = [self.__getitem__(i) for i in indices]
         return topk_items
+
+    def topk_batch(self, papers, k=100):
+        """Return top k relevance paper of every paper in `papers`
+
+        All the papers are scored against all the dataset by `scorer`, faster than `topk`
+        for large batches of papers with many links.
+        """
+        return [[self.__getitem__(i) for i in indices] for indices, _ in self.scorer.topk(papers, k)]
     def load_from_papers(self,papers):
         """Build dataset from papers list """
+        items = self._writable_items()
         for paperitem in papers:
-            self.items.append(paperitem)
\ No newline at end of file
+            self.id2idx[paperitem.arxiv_id] = len(items)
+            items.append(paperitem)
+        self._index_new_items()
\ No newline at end of file
@@ -0,0 +1,261 @@
+import os
+import re
+import json
+import hashlib
+import threading
+from contextlib import contextmanager
+import numpy as np
+try:
+    import fcntl
+except ImportError:
+    # Without it, like on Windows, only the stores of one process are kept in step.
+    fcntl = None
+
+STORE_META = "store.json"
+STORE_LOCK = "store.lock"
+
+# Rows are keyed by the sha1 digest of their text.
+KEY_DTYPE = "S20"
+
+def namespace_of(model_name, normalize=False):
+    '''Return the namespace of the embeddings of a model, one per model and normalization.'''
+    name = re.sub(r"[^A-Za-z0-9._-]+", "_", model_name).strip("_")
+    return name + ("-normalized" if normalize else "")
+
+def text_keys(texts):
+    '''Return the keys of some texts as an array of sha1 digests.'''
+    return np.array([hashlib.sha1(text.encode("utf-8", "surrogatepass")).digest() for text in texts],
+                    dtype=KEY_DTYPE)
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_store(path, namespace="default"):
+    '''Return the `EmbeddingStore` of a namespace shared by the whole process.'''
+    key = (os.path.realpath(path), namespace)
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = EmbeddingStore(path, namespace)
+        return _stores[key]
+
+class EmbeddingStore:
+    '''Embeddings of texts kept in two append-only files, read through a memory map.
+
+    Every namespace, like a model, is a directory of `path` holding `vectors.{gen}.bin`, the
+    rows of float32 vectors, and `keys.{gen}.bin`, the sha1 digest of the text of every row.
+    The keys are read and sorted once when the store is opened, so looking up a whole batch of
+    texts is one `np.searchsorted` and one gather from the memory map, instead of one file
+    per vector. Vectors are appended to the end of the files and `compact` rewrites them
+    without the duplicated or unwanted rows, as a new generation `gen` recorded in
+    `store.json`.
+
+    Appending takes an exclusive lock on `store.lock`, and the new rows are numbered from
+    the size of the files read under it, so stores of several processes can share a
+    namespace. A store catches up with the rows the others appended before every lookup.
+    In a process, use `get_store` to share one store per namespace. A process that dies
+    while appending leaves at most a partial row at the end of the files, which is cut off
+    by the next append.
+
+    Attributes:
+        path: The directory of the namespace.
+        dim: The size of the vectors, None until the first vectors are added.
+    '''
+    def __init__(self, path, namespace="default") -> None:
+        self.path = os.path.join(path, namespace)
+        os.makedirs(self.path, exist_ok=True)
+        self._lock = threading.Lock()
+        self._open()
+
+    def _file(self, name):
+        return os.path.join(self.path, f"{name}.{self.generation}.bin")
+
+    @contextmanager
+    def _file_lock(self):
+        '''Lock the namespace against the stores of other processes.'''
+        with open(os.path.join(self.path, STORE_LOCK), "ab") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _meta(self):
+        meta_path = os.path.join(self.path, STORE_META)
+        if not os.path.exists(meta_path):
+            return {}
+        with open(meta_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _disk_rows(self):
+        '''The number of complete rows in the files, a key is written after its vector.'''
+        if self.dim is None or not os.path.exists(self._file("keys")):
+            return 0
+        return min(os.path.getsize(self._file("keys")) // 20,
+                   os.path.getsize(self._file("vectors")) // (4 * self.dim))
+
+    def _open(self, meta=None):
+        meta = self._meta() if meta is None else meta
+        self.dim = meta.get("dim")
+        self.generation = meta.get("generation", 0)
+        rows = self._disk_rows()
+        self._keys = np.fromfile(self._file("keys"), dtype=KEY_DTYPE, count=rows) \
+            if rows else np.empty(0, dtype=KEY_DTYPE)
+        # A stable sort keeps the rows of a key in order, the last one is the newest.
+        self._order = np.argsort(self._keys, kind="stable")
+        self._sorted = self._keys[self._order]
+        # Rows appended since the keys were sorted.
+        self._tail = {}
+        self._rows = rows
+        self._map()
+
+    def _sync(self):
+        '''Catch up with the rows appended by other stores, or open the store again after
+        another one compacted it.'''
+        meta = self._meta()
+        if meta.get("generation", 0) != self.generation or meta.get("dim") != self.dim:
+            self._open(meta)
+            return
+        rows = self._disk_rows()
+        if rows > self._rows:
+            keys = np.fromfile(self._file("keys"), dtype=KEY_DTYPE, count=rows - self._rows,
+                               offset=self._rows * 20)
+            for row, key in enumerate(keys.tolist(), self._rows):
+                self._tail[key] = row
+            self._rows = rows
+            self._map()
+
+    def _truncate(self):
+        '''Cut off a row only partly written by a process that died, under the file lock.'''
+        if self.dim is not None and os.path.exists(self._file("keys")):
+            os.truncate(self._file("keys"), self._rows * 20)
+            os.truncate(self._file("vectors"), self._rows * 4 * self.dim)
+
+    def _map(self):
+        self._vectors = np.memmap(self._file("vectors"), dtype=np.float32, mode="r",
+                                  shape=(self._rows, self.dim)) if self._rows else None
+
+    def _save_meta(self):
+        meta_path = os.path.join(self.path, STORE_META)
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"dim": self.dim, "generation": self.generation, "rows": self._rows}, f)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    def __len__(self):
+        return self._rows
+
+    def rows(self, keys):
+        '''Return the row of every key, -1 for the keys that aren't in the store.'''
+        keys = np.asarray(keys, dtype=KEY_DTYPE)
+        rows = np.full(len(keys), -1, dtype=np.int64)
+        if len(self._sorted):
+            pos = np.searchsorted(self._sorted, keys, side="right") - 1
+            found = (pos >= 0) & (self._sorted[np.maximum(pos, 0)] == keys)
+            rows[found] = self._order[pos[found]]
+        if self._tail:
+            for i, key in enumerate(keys.tolist()):
+                rows[i] = self._tail.get(key, rows[i])
+        return rows
+
+    def get(self, texts):
+        '''Look up the vectors of a batch of texts.
+
+        Args:
+            texts: A list of strings.
+
+        Returns:
+            vectors: A float32 array of shape (len(texts), dim), zeros for the missing texts,
+                None if the store is empty.
+            found: A bool array, whether every text was in the store.
+        '''
+        keys = text_keys(texts)
+        with self._lock:
+            self._sync()
+            rows = self.rows(keys)
+            store = self._vectors
+        found = rows >= 0
+        if store is None:
+            return None, found
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        # Read the rows in file order.
+        hits = np.flatnonzero(found)
+        order = np.argsort(rows[hits])
+        vectors[hits[order]] = store[rows[hits[order]]]
+        return vectors, found
+
+    def add(self, texts, vectors):
+        '''Append the vectors of some texts, the texts already in the store are skipped.
+
+        Args:
+            texts: A list of strings.
+            vectors: An array-like of shape (len(texts), dim).
+        '''
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if not len(texts):
+            return
+        with self._lock, self._file_lock():
+            self._sync()
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self._save_meta()
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Vectors of size {vectors.shape[1]} in a store of size {self.dim}.")
+            # The new rows are numbered from the size of the files.
+            self._truncate()
+            keys = text_keys(texts)
+            new = np.flatnonzero(self.rows(keys) < 0)
+            # Only the first of the texts repeated in the batch.
+            _, first = np.unique(keys[new], return_index=True)
+            new = new[np.sort(first)]
+            if not len(new):
+                return
+            # The vectors go first, a key is only written once its row is complete.
+            with open(self._file("vectors"), "ab") as f:
+                f.write(vectors[new].tobytes())
+            with open(self._file("keys"), "ab") as f:
+                f.write(keys[new].tobytes())
+            for row, key in enumerate(keys[new].tolist(), self._rows):
+                self._tail[key] = row
+            self._rows += len(new)
+            self._map()
+
+    def compact(self, keep=None):
+        '''Rewrite the store with one row per text, the newest.
+
+        Args:
+            keep: The texts to keep, default to None which keeps all of them.
+
+        Returns:
+            rows: The number of rows left.
+        '''
+        with self._lock, self._file_lock():
+            self._sync()
+            self._truncate()
+            if not self._rows:
+                return 0
+            keys = self._keys if not self._tail else \
+                np.fromfile(self._file("keys"), dtype=KEY_DTYPE, count=self._rows)
+            # The last row of every key, in file order.
+            reverse = keys[::-1]
+            _, last = np.unique(reverse, return_index=True)
+            rows = np.sort(len(keys) - 1 - last)
+            if keep is not None:
+                rows = rows[np.isin(keys[rows], text_keys(list(keep)))]
+            vectors = np.memmap(self._file("vectors"), dtype=np.float32, mode="r",
+                                shape=(self._rows, self.dim))
+            old = [self._file("keys"), self._file("vectors")]
+            self.generation += 1
+            with open(self._file("vectors"), "wb") as f:
+                for start in range(0, len(rows), 65536):
+                    f.write(np.ascontiguousarray(vectors[rows[start:start + 65536]]).tobytes())
+            keys[rows].tofile(self._file("keys"))
+            del vectors
+            self._rows = len(rows)
+            # The new generation is only used once store.json points to it.
+            self._save_meta()
+            self._vectors = None
+            for path in old:
+                os.remove(path)
+            self._open()
+        return self._rows
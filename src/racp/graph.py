@@ -0,0 +1,376 @@
+import os
+from collections.abc import MutableSet, Set
+from itertools import chain
+import numpy as np
+from scipy import sparse
+
+class IdTable:
+    '''Interns semantics scholar ids into consecutive int32 codes.
+
+    Every distinct id of a dataset is stored once, and papers, citations and references
+    refer to it by its code.
+
+    Attributes:
+        ids: A list of ids, `ids[code]` is the id of a code.
+        codes: A dictionary formated as {id : code}.
+    '''
+    def __init__(self, ids=()) -> None:
+        self.ids = []
+        self.codes = {}
+        for id in ids:
+            self.intern(id)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, code):
+        return self.ids[code]
+
+    def __contains__(self, id):
+        return id in self.codes
+
+    def intern(self, id):
+        '''Return the code of an id, adding it if it is new.'''
+        code = self.codes.get(id)
+        if code is None:
+            code = self.codes[id] = len(self.ids)
+            self.ids.append(id)
+        return code
+
+    def get(self, id, default=-1):
+        '''Return the code of an id, or `default` if it is unknown.'''
+        return self.codes.get(id, default)
+
+    def encode(self, ids):
+        '''Intern ids and return their codes as a sorted int32 array without duplicates.'''
+        return np.unique(np.fromiter((self.intern(id) for id in ids), dtype=np.int32))
+
+# Below this size, set operations on python ints beat the overhead of numpy calls.
+_SMALL = 256
+
+def _intersect(a, b):
+    '''Intersection of two sorted arrays without duplicates.'''
+    if len(a) > len(b):
+        a, b = b, a
+    if len(a) == 0:
+        return a
+    if len(b) <= _SMALL:
+        return np.array(sorted(set(a.tolist()).intersection(b.tolist())), dtype=np.int32)
+    pos = np.searchsorted(b, a)
+    pos[pos == len(b)] = 0
+    return a[b[pos] == a]
+
+class IdSet(MutableSet):
+    '''A set of ids viewing a sorted array of codes.
+
+    It behaves like the set of id strings it replaces: `in`, iteration, `len`,
+    `intersection` and `union` work with ids, and the operations between two IdSets of the
+    same table run on the int32 codes. Changing it, with `add`, `discard`, `update` or the
+    other methods of a set, copies its ids to a python set it uses from then on, the graph
+    it views doesn't change until it is built again.
+
+    Attributes:
+        table: The `IdTable` of the codes.
+        codes: The sorted int32 codes, None once the set is changed.
+        ids: The python set of the ids once the set is changed, None before.
+    '''
+    __slots__ = ("table", "codes", "ids")
+
+    def __init__(self, table, codes) -> None:
+        self.table = table
+        self.codes = codes
+        self.ids = None
+
+    def __contains__(self, id):
+        if self.ids is not None:
+            return id in self.ids
+        code = self.table.get(id)
+        if code < 0 or len(self.codes) == 0:
+            return False
+        if len(self.codes) <= _SMALL:
+            return code in self.codes.tolist()
+        pos = np.searchsorted(self.codes, code)
+        return pos < len(self.codes) and self.codes[pos] == code
+
+    def __iter__(self):
+        if self.ids is not None:
+            return iter(self.ids)
+        ids = self.table.ids
+        return (ids[code] for code in self.codes.tolist())
+
+    def __len__(self):
+        return len(self.ids) if self.ids is not None else len(self.codes)
+
+    def __repr__(self) -> str:
+        return f"IdSet({set(self)!r})"
+
+    @classmethod
+    def _from_iterable(cls, ids):
+        # The results of `-` and `^` are python sets.
+        return set(ids)
+
+    def _same_table(self, other):
+        return isinstance(other, IdSet) and other.table is self.table and \
+            self.codes is not None and other.codes is not None
+
+    def _detach(self):
+        '''Copy the ids to a python set before changing them.'''
+        if self.ids is None:
+            self.ids = set(self)
+            self.codes = None
+        return self.ids
+
+    def add(self, id):
+        self._detach().add(id)
+
+    def discard(self, id):
+        self._detach().discard(id)
+
+    def update(self, *others):
+        self._detach().update(*others)
+
+    def intersection(self, other):
+        if self._same_table(other):
+            return IdSet(self.table, _intersect(self.codes, other.codes))
+        return set(self).intersection(other)
+
+    def union(self, other):
+        if self._same_table(other):
+            return IdSet(self.table, np.union1d(self.codes, other.codes))
+        return set(self).union(other)
+
+    __and__ = intersection
+    __or__ = union
+
+    def __eq__(self, other):
+        if self._same_table(other):
+            return np.array_equal(self.codes, other.codes)
+        return Set.__eq__(self, other)
+
+    __hash__ = None
+
+class CSR:
+    '''Rows of sorted int32 codes in compressed sparse row form.
+
+    Attributes:
+        indptr: An int64 array, row `i` is `indices[indptr[i]:indptr[i+1]]`.
+        indices: An int32 array of codes.
+    '''
+    def __init__(self, indptr, indices) -> None:
+        self.indptr = indptr
+        self.indices = indices
+
+    @classmethod
+    def from_lists(cls, table, rows):
+        '''Intern the ids of every row and build the rows sorted and without duplicates.'''
+        rows = [row if isinstance(row, (list, set, frozenset)) else list(row or ()) for row in rows]
+        lengths = np.fromiter((len(row) for row in rows), dtype=np.int64, count=len(rows))
+        for id in set().union(*rows).difference(table.codes):
+            table.intern(id)
+        indices = np.fromiter(map(table.codes.__getitem__, chain.from_iterable(rows)),
+                              dtype=np.int32, count=int(lengths.sum()))
+        # Sorting row << 32 | code sorts every row in place, then duplicates are neighbours.
+        keys = np.repeat(np.arange(len(rows), dtype=np.int64), lengths) << 32 | indices
+        keys.sort()
+        keys = keys[np.concatenate(([True], keys[1:] != keys[:-1]))] if len(keys) else keys
+        indices = (keys & 0xFFFFFFFF).astype(np.int32)
+        row_ids = keys >> 32
+        indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(row_ids, minlength=len(rows)), out=indptr[1:])
+        return cls(indptr, indices)
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    def __getitem__(self, i):
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    def lengths(self):
+        return np.diff(self.indptr)
+
+    def transpose(self, columns):
+        '''Return the CSR whose row `code` holds the rows containing `code`, in order.'''
+        # scipy's conversion to compressed columns is a counting sort.
+        matrix = sparse.csr_matrix((np.ones(len(self.indices), dtype=np.int8), self.indices,
+                                    self.indptr), shape=(len(self), columns)).tocsc()
+        return CSR(matrix.indptr.astype(np.int64), matrix.indices.astype(np.int32, copy=False))
+
+class CitationGraph:
+    '''The citation graph of a dataset as CSR arrays of interned ids.
+
+    Attributes:
+        table: The `IdTable` of all the ids of the dataset.
+        paper_ids: An int32 array of the code of every paper's ss_id.
+        citations: A `CSR` whose row `i` holds the codes of the papers citing paper `i`.
+        references: A `CSR` whose row `i` holds the codes of the papers cited by paper `i`.
+    '''
+    def __init__(self, table, paper_ids, citations, references) -> None:
+        self.table = table
+        self.paper_ids = paper_ids
+        self.citations = citations
+        self.references = references
+
+    @classmethod
+    def build(cls, ss_ids, citations, references, table=None):
+        '''Build the graph.
+
+        Args:
+            ss_ids: The ss_id of every paper.
+            citations: The citations of every paper, iterables of ss_ids.
+            references: The references of every paper, iterables of ss_ids.
+            table: An `IdTable` to extend, default to a new one.
+
+        Returns:
+            graph: A CitationGraph.
+        '''
+        table = table if table is not None else IdTable()
+        paper_ids = np.fromiter((table.intern(ss_id) for ss_id in ss_ids), dtype=np.int32)
+        citations = CSR.from_lists(table, citations)
+        references = CSR.from_lists(table, references)
+        return cls(table, paper_ids, citations, references)
+
+    def __len__(self):
+        return len(self.paper_ids)
+
+    def citation_set(self, i):
+        '''Return the citations of paper `i` as an `IdSet`.'''
+        return IdSet(self.table, self.citations[i])
+
+    def reference_set(self, i):
+        '''Return the references of paper `i` as an `IdSet`.'''
+        return IdSet(self.table, self.references[i])
+
+    def nbytes(self):
+        '''Memory taken by the arrays, without the id table.'''
+        return self.paper_ids.nbytes + self.citations.indptr.nbytes + \
+            self.citations.indices.nbytes + self.references.indptr.nbytes + \
+            self.references.indices.nbytes
+
+class CitationIndex:
+    '''An inverted index from ids to the papers of a dataset linked to them.
+
+    For every code of the table, `postings` finds the papers whose citations, references or
+    ss_id contain it. The papers of the graph it is built from are in CSR arrays, the papers
+    added later go to a delta of python lists, merged into the arrays by `compact` once it
+    holds `compact_ratio` as many links as them.
+
+    Attributes:
+        table: The `IdTable` of the graph, new ids are interned in it.
+        citation_lengths: An int64 array of the number of citations of every paper, it is
+            longer than the index, see `__len__`.
+        reference_lengths: Same for references.
+    '''
+    KINDS = ("citations", "references", "papers")
+
+    def __init__(self, graph, compact_ratio=0.1) -> None:
+        self.table = graph.table
+        self.compact_ratio = compact_ratio
+        self.length = len(graph)
+        self.citation_lengths = graph.citations.lengths()
+        self.reference_lengths = graph.references.lengths()
+        self._base = dict(zip(self.KINDS, self._transpose(graph)))
+        self._delta = dict((kind, {}) for kind in self.KINDS)
+        self._delta_size = 0
+
+    def _transpose(self, graph):
+        papers = CSR(np.arange(len(graph) + 1, dtype=np.int64), graph.paper_ids)
+        return [rows.transpose(len(self.table)) for rows in
+                (graph.citations, graph.references, papers)]
+
+    def __len__(self):
+        return self.length
+
+    def add(self, ss_id, citations, references):
+        '''Add the next paper of the dataset.'''
+        index = self.length
+        rows = []
+        for kind, ids in (("citations", citations), ("references", references),
+                          ("papers", [ss_id])):
+            codes = set(self.table.intern(id) for id in ids or ())
+            for code in codes:
+                self._delta[kind].setdefault(code, []).append(index)
+            rows.append(len(codes))
+        for name, length in (("citation_lengths", rows[0]), ("reference_lengths", rows[1])):
+            lengths = getattr(self, name)
+            if index == len(lengths):
+                lengths = np.resize(lengths, max(16, 2 * len(lengths)))
+                setattr(self, name, lengths)
+            lengths[index] = length
+        self.length += 1
+        self._delta_size += sum(rows)
+        if self._delta_size > self.compact_ratio * sum(len(base.indices) for base in self._base.values()):
+            self.compact()
+
+    def compact(self):
+        '''Merge the delta into the CSR arrays.'''
+        for kind in self.KINDS:
+            base, delta = self._base[kind], self._delta[kind]
+            codes = np.repeat(np.arange(len(base), dtype=np.int64), base.lengths())
+            rows = base.indices
+            if delta:
+                codes = np.concatenate((codes, np.fromiter(
+                    (code for code, papers in delta.items() for _ in papers), dtype=np.int64)))
+                rows = np.concatenate((rows, np.fromiter(
+                    (paper for papers in delta.values() for paper in papers), dtype=np.int32)))
+            matrix = sparse.csr_matrix((np.ones(len(rows), dtype=np.int8), (codes, rows)),
+                                       shape=(len(self.table), self.length))
+            matrix.sort_indices()
+            self._base[kind] = CSR(matrix.indptr.astype(np.int64),
+                                   matrix.indices.astype(np.int32, copy=False))
+            self._delta[kind] = {}
+        self._delta_size = 0
+
+    def save(self, path):
+        '''Save the arrays of the index in directory `path`, after a `compact`.'''
+        self.compact()
+        os.makedirs(path, exist_ok=True)
+        for kind, base in self._base.items():
+            np.save(os.path.join(path, f"{kind}.indptr.npy"), base.indptr)
+            np.save(os.path.join(path, f"{kind}.indices.npy"), base.indices)
+        np.save(os.path.join(path, "citation_lengths.npy"), self.citation_lengths[:self.length])
+        np.save(os.path.join(path, "reference_lengths.npy"), self.reference_lengths[:self.length])
+
+    @classmethod
+    def load(cls, path, table=None, mmap_mode="r"):
+        '''Load an index saved by `save`, memory mapped by default.
+
+        Args:
+            path: The directory of the index.
+            table: The `IdTable` it was built with, only needed to `add` papers.
+            mmap_mode: The mmap_mode of `np.load`.
+
+        Returns:
+            index: A CitationIndex.
+        '''
+        index = cls.__new__(cls)
+        index.table = table if table is not None else IdTable()
+        index.compact_ratio = 0.1
+        index._base = dict((kind, CSR(np.load(os.path.join(path, f"{kind}.indptr.npy"), mmap_mode=mmap_mode),
+                                      np.load(os.path.join(path, f"{kind}.indices.npy"), mmap_mode=mmap_mode)))
+                           for kind in cls.KINDS)
+        index.citation_lengths = np.load(os.path.join(path, "citation_lengths.npy"), mmap_mode=mmap_mode)
+        index.reference_lengths = np.load(os.path.join(path, "reference_lengths.npy"), mmap_mode=mmap_mode)
+        index.length = len(index.citation_lengths)
+        index._delta = dict((kind, {}) for kind in cls.KINDS)
+        index._delta_size = 0
+        return index
+
+    def postings(self, kind, codes, values=None):
+        '''Return the papers linked to any of `codes` as "citations", "references" or
+        "papers", once per code they are linked to.
+
+        If `values` is given, one per code, the value of the code of every paper is returned
+        too.
+        '''
+        base, delta = self._base[kind], self._delta[kind]
+        parts, codes = [], list(codes)
+        for code in codes:
+            part = base[code] if code < len(base) else np.empty(0, dtype=np.int32)
+            if code in delta:
+                part = np.concatenate((part, np.array(delta[code], dtype=np.int32)))
+            parts.append(part)
+        papers = np.concatenate(parts) if parts else np.empty(0, dtype=np.int32)
+        if values is None:
+            return papers
+        return papers, np.repeat(np.asarray(values, dtype=np.float64),
+                                 [len(part) for part in parts])
@@ -0,0 +1,369 @@
+import os
+import json
+import shutil
+import hashlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from loguru import logger
+from tqdm import tqdm
+from racp.graph import CSR, CitationIndex
+from racp.scoring import ccbc_codes, weighted_ccbc_codes, topk_indices
+from racp.utils import bounded_map
+
+# The file describing a neighbour table, see `NeighbourTable`.
+NEIGHBOURS_META = "neighbours.json"
+# The arxiv id of every row, to find the rows in a dataset loaded again.
+NEIGHBOURS_PAPERS = "papers.json"
+NEIGHBOURS_VERSION = 1
+METRICS = ("ccbc", "weighted_ccbc")
+
+def weight_fingerprint(weight):
+    '''A hash of a weight dictionary, to check that a table is updated with its weights.'''
+    return hashlib.sha1(json.dumps(sorted((weight or {}).items())).encode("utf-8")).hexdigest()
+
+def _code_weights(table, weight):
+    '''The weight of every code of a table, default to 1.'''
+    weights = np.ones(len(table))
+    for ss_id, value in (weight or {}).items():
+        code = table.get(ss_id)
+        if code >= 0:
+            weights[code] = value
+    return weights
+
+def _top(candidates, scores, paper, n):
+    '''The row of `paper` in the table: its n best neighbours, padded with -1.'''
+    keep = (scores > 0) & (candidates != paper)
+    candidates, scores = candidates[keep], scores[keep]
+    top = topk_indices(scores, n)
+    indices = np.full(n, -1, dtype=np.int32)
+    values = np.zeros(n, dtype=np.float32)
+    indices[:len(top)] = candidates[top]
+    values[:len(top)] = scores[top]
+    return indices, values
+
+class _Scorer:
+    '''Scores papers of a dataset given by index against the whole dataset.'''
+    def __init__(self, index, citations, references, paper_ids, metric, weights=None,
+                 paper_weights=None, reference_weights=None) -> None:
+        self.index = index
+        self.citations = citations
+        self.references = references
+        self.paper_ids = paper_ids
+        self.metric = metric
+        self.weights = weights
+        self.paper_weights = paper_weights
+        self.reference_weights = reference_weights
+
+    def scores(self, paper):
+        citations = self.citations[paper].tolist()
+        references = self.references[paper].tolist()
+        code = int(self.paper_ids[paper])
+        if self.metric == "ccbc":
+            candidates, scores = ccbc_codes(self.index, code, citations, len(citations),
+                                            references, len(references))
+        else:
+            candidates, scores = weighted_ccbc_codes(self.index, code, citations, references,
+                                                     self.weights, self.paper_weights,
+                                                     self.reference_weights)
+        return candidates, scores
+
+    def row(self, paper, n):
+        return _top(*self.scores(paper), paper, n)
+
+# The scorer of a worker process, loaded once by `_init_worker`.
+_scorer = None
+
+def _init_worker(work_path, metric):
+    global _scorer
+    load = lambda name: np.load(os.path.join(work_path, name + ".npy"), mmap_mode="r")
+    weights = [load(name) for name in ("weights", "paper_weights", "reference_weights")] \
+        if metric == "weighted_ccbc" else []
+    _scorer = _Scorer(CitationIndex.load(os.path.join(work_path, "index")),
+                      CSR(load("citations.indptr"), load("citations.indices")),
+                      CSR(load("references.indptr"), load("references.indices")),
+                      load("paper_ids"), metric, *weights)
+
+def _score_chunk(start, stop, n):
+    rows = [_scorer.row(paper, n) for paper in range(start, stop)]
+    return start, np.stack([row[0] for row in rows]), np.stack([row[1] for row in rows])
+
+def build_neighbours(dataset, path, n=50, metric="ccbc", weight=None, processes=None,
+                     chunk_size=1024, logger=logger):
+    '''Compute the top `n` neighbours of every paper of a dataset and save them.
+
+    The graph of the dataset and its `racp.graph.CitationIndex` are saved to a work
+    directory, that every worker process memory maps, so the memory taken doesn't grow with
+    the number of processes. The papers are scored by chunks of `chunk_size`, with at most
+    two chunks per process in flight, and the rows are written to the table as they come.
+    Only the papers linked to a paper are scored, see `racp.scoring.ccbc_codes`.
+
+    Args:
+        dataset: A RawSet.
+        path: The directory to save the table to, created if needed.
+        n: The number of neighbours of every paper.
+        metric: "ccbc" or "weighted_ccbc".
+        weight: The weight dictionary of "weighted_ccbc", formated as {ss_id : weight}.
+        processes: The number of worker processes, default to the number of CPUs.
+        chunk_size: The number of papers scored by a task.
+        logger: loguru logger.
+
+    Returns:
+        table: The NeighbourTable.
+    '''
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric {metric}, expected one of {METRICS}")
+    os.makedirs(path, exist_ok=True)
+    work_path = os.path.join(path, "work")
+    graph = dataset.graph
+    length = len(graph)
+    weights = _code_weights(graph.table, weight)
+    paper_weights = weights[graph.paper_ids]
+    reference_weights = np.bincount(np.repeat(np.arange(length), graph.references.lengths()),
+                                    weights=weights[graph.references.indices], minlength=length)
+    CitationIndex(graph).save(os.path.join(work_path, "index"))
+    arrays = {"citations.indptr": graph.citations.indptr, "citations.indices": graph.citations.indices,
+              "references.indptr": graph.references.indptr, "references.indices": graph.references.indices,
+              "paper_ids": graph.paper_ids, "weights": weights, "paper_weights": paper_weights,
+              "reference_weights": reference_weights}
+    for name, array in arrays.items():
+        np.save(os.path.join(work_path, name + ".npy"), array)
+
+    indices = _open_rows(path, "neighbours", np.int32, length, n, "w+")
+    scores = _open_rows(path, "scores", np.float32, length, n, "w+")
+    chunks = deque((start, min(start + chunk_size, length), n) for start in range(0, length, chunk_size))
+    processes = processes or os.cpu_count() or 1
+    executor = ProcessPoolExecutor(processes, initializer=_init_worker,
+                                   initargs=(work_path, metric)) if processes > 1 else None
+    try:
+        with tqdm(total=length) as bar:
+            if executor is None:
+                _init_worker(work_path, metric)
+                results = (_score_chunk(*chunk) for chunk in chunks)
+            else:
+                results = bounded_map(executor, _score_chunk, chunks, 2 * processes)
+            for start, rows, values in results:
+                indices[start:start + len(rows)] = rows
+                scores[start:start + len(rows)] = values
+                bar.update(len(rows))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        shutil.rmtree(work_path, ignore_errors=True)
+    for rows in (indices, scores):
+        if isinstance(rows, np.memmap):
+            rows.flush()
+    del indices, scores
+    _write_rows(path, "paper_weights", paper_weights, "wb")
+    _write_rows(path, "reference_weights", reference_weights, "wb")
+    _save_papers(path, dataset._column("arxiv_id"))
+    _save_meta(path, {"version": NEIGHBOURS_VERSION, "metric": metric, "n": n, "length": length,
+                      "weights": weight_fingerprint(weight)})
+    logger.info(f"Saved the {n} neighbours of {length} papers to {path}")
+    return NeighbourTable(path)
+
+def _open_rows(path, name, dtype, length, n, mode):
+    '''Memory map the rows of a table file, mmap can't map an empty file.'''
+    if length == 0:
+        if mode == "w+":
+            open(os.path.join(path, name + ".bin"), "wb").close()
+        return np.empty((0, n), dtype=dtype)
+    return np.memmap(os.path.join(path, name + ".bin"), dtype=dtype, mode=mode, shape=(length, n))
+
+def _write_rows(path, name, array, mode):
+    with open(os.path.join(path, name + ".bin"), mode) as f:
+        f.write(np.ascontiguousarray(array).tobytes())
+
+def _save_papers(path, arxiv_ids):
+    with open(os.path.join(path, NEIGHBOURS_PAPERS + ".tmp"), "w", encoding="utf-8") as f:
+        json.dump(list(arxiv_ids), f)
+    os.replace(os.path.join(path, NEIGHBOURS_PAPERS + ".tmp"), os.path.join(path, NEIGHBOURS_PAPERS))
+
+def _save_meta(path, meta):
+    with open(os.path.join(path, NEIGHBOURS_META + ".tmp"), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=4)
+    os.replace(os.path.join(path, NEIGHBOURS_META + ".tmp"), os.path.join(path, NEIGHBOURS_META))
+
+class NeighbourTable:
+    '''The top neighbours of every paper of a dataset, written by `build_neighbours`.
+
+    Row `i` holds the indices in the dataset of the `n` papers with the highest score with
+    paper `i`, best first, padded with -1, in `neighbours.bin`, and their scores as float32
+    in `scores.bin`. Both are memory mapped, so a lookup reads one row from disk. The arxiv
+    id of every row is saved in `papers.json`, so that `update` finds the rows again in a
+    dataset whose papers moved.
+
+    Attributes:
+        path: The directory of the table.
+        metric: "ccbc" or "weighted_ccbc".
+        n: The number of neighbours of every paper.
+    '''
+    def __init__(self, path) -> None:
+        with open(os.path.join(path, NEIGHBOURS_META), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta["version"] != NEIGHBOURS_VERSION:
+            raise ValueError(f"Unsupported neighbour table version {meta['version']}")
+        self.path = path
+        self.metric = meta["metric"]
+        self.n = meta["n"]
+        self.length = meta["length"]
+        self.weights = meta["weights"]
+        self.indices = _open_rows(path, "neighbours", np.int32, self.length, self.n, "r")
+        self.scores = _open_rows(path, "scores", np.float32, self.length, self.n, "r")
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        '''Return the neighbours of paper `index` and their scores as arrays, best first.'''
+        row = np.asarray(self.indices[index])
+        keep = row >= 0
+        return row[keep], np.asarray(self.scores[index])[keep]
+
+    @property
+    def arxiv_ids(self):
+        '''The arxiv id of every row, None for a table that didn't save them.'''
+        path = os.path.join(self.path, NEIGHBOURS_PAPERS)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def positions(self, arxiv_ids):
+        '''Return the index in a dataset of every row, given the arxiv ids of the dataset.
+
+        Raises:
+            ValueError: The table didn't save its papers, or some of them aren't in the
+                dataset anymore.
+        '''
+        rows = self.arxiv_ids
+        if rows is None or len(rows) != self.length:
+            raise ValueError("The table doesn't record its papers, build it again.")
+        arxiv_ids = list(arxiv_ids)
+        if arxiv_ids[:self.length] == rows:
+            return np.arange(self.length)
+        where = dict((arxiv_id, i) for i, arxiv_id in enumerate(arxiv_ids))
+        missing = [arxiv_id for arxiv_id in rows if arxiv_id not in where]
+        if missing:
+            raise ValueError(f"{len(missing)} papers of the table, like {missing[0]}, aren't in "
+                             f"the dataset anymore, build it again.")
+        return np.array([where[arxiv_id] for arxiv_id in rows], dtype=np.int64)
+
+    def update(self, dataset, weight=None, logger=logger):
+        '''Add the papers added to the dataset since the table was built or updated.
+
+        The score of two papers only depends on them, so only the rows of the new papers
+        are computed, against the whole dataset, and the new papers are merged into the
+        rows of the papers they are linked to. The rows of the other papers don't change.
+        The rows are matched with the papers of the dataset by arxiv id, so new papers can
+        be anywhere in it, like in a directory crawled again. The table is then rewritten in
+        the order of the dataset.
+
+        Args:
+            dataset: The RawSet the table was built from, with papers added to it.
+            weight: The weight dictionary the table was built with.
+            logger: loguru logger.
+
+        Returns:
+            changed: The number of rows of old papers that changed.
+
+        Raises:
+            ValueError: The weights differ, or papers of the table aren't in the dataset
+                anymore, the table must be built again.
+        '''
+        if weight_fingerprint(weight) != self.weights:
+            raise ValueError("The weights differ from the ones the table was built with, build it again.")
+        arxiv_ids = dataset._column("arxiv_id")
+        positions = self.positions(arxiv_ids)
+        length = len(arxiv_ids)
+        appended = np.array_equal(positions, np.arange(self.length))
+        if appended and length == self.length:
+            return 0
+        is_old = np.zeros(length, dtype=bool)
+        is_old[positions] = True
+        new = np.flatnonzero(~is_old).tolist()
+        index = dataset.index
+        table = index.table
+        forward = {}
+        for kind in ("citations", "references"):
+            rows = [[table.get(id) for id in set(getattr(dataset[i], kind) or ())] for i in new]
+            forward[kind] = dict(zip(new, (np.array(row, dtype=np.int32) for row in rows)))
+        paper_ids = dict((i, table.get(dataset[i].ss_id)) for i in new)
+        weights = paper_weights = reference_weights = None
+        if self.metric == "weighted_ccbc":
+            weights = _code_weights(table, weight)
+            paper_weights = np.zeros(length)
+            reference_weights = np.zeros(length)
+            paper_weights[positions] = np.fromfile(os.path.join(self.path, "paper_weights.bin"))
+            reference_weights[positions] = np.fromfile(os.path.join(self.path, "reference_weights.bin"))
+            paper_weights[new] = [weights[paper_ids[i]] for i in new]
+            reference_weights[new] = [weights[forward["references"][i]].sum() for i in new]
+        scorer = _Scorer(index, forward["citations"], forward["references"], paper_ids,
+                         self.metric, weights, paper_weights, reference_weights)
+
+        rows, merges = [], {}
+        for paper in tqdm(new):
+            candidates, values = scorer.scores(paper)
+            rows.append(_top(candidates, values, paper, self.n))
+            old = (values > 0) & is_old[candidates]
+            for neighbour, value in zip(candidates[old].tolist(), values[old].astype(np.float32).tolist()):
+                merges.setdefault(neighbour, []).append((paper, value))
+
+        if appended:
+            _write_rows(self.path, "neighbours", np.stack([row[0] for row in rows]), "ab")
+            _write_rows(self.path, "scores", np.stack([row[1] for row in rows]), "ab")
+        else:
+            self._reorder(positions, length, new, rows)
+        if self.metric == "weighted_ccbc":
+            _write_rows(self.path, "paper_weights", paper_weights, "wb")
+            _write_rows(self.path, "reference_weights", reference_weights, "wb")
+        changed = self._merge(merges, length)
+        _save_papers(self.path, arxiv_ids)
+        _save_meta(self.path, {"version": NEIGHBOURS_VERSION, "metric": self.metric, "n": self.n,
+                               "length": length, "weights": self.weights})
+        logger.info(f"Added {len(new)} papers to the neighbour table, {changed} rows changed")
+        self.__init__(self.path)
+        return changed
+
+    def _reorder(self, positions, length, new, rows, chunk_size=65536):
+        '''Rewrite the table in the order of a dataset, with the rows of its new papers.'''
+        indices = _open_rows(self.path, "neighbours.tmp", np.int32, length, self.n, "w+")
+        scores = _open_rows(self.path, "scores.tmp", np.float32, length, self.n, "w+")
+        for start in range(0, self.length, chunk_size):
+            old = np.asarray(self.indices[start:start + chunk_size])
+            # The neighbours are indices of rows too.
+            indices[positions[start:start + chunk_size]] = \
+                np.where(old >= 0, positions[np.maximum(old, 0)], -1)
+            scores[positions[start:start + chunk_size]] = self.scores[start:start + chunk_size]
+        if new:
+            indices[new] = np.stack([row[0] for row in rows])
+            scores[new] = np.stack([row[1] for row in rows])
+        indices.flush()
+        scores.flush()
+        del indices, scores
+        self.indices = self.scores = None
+        for name in ("neighbours", "scores"):
+            os.replace(os.path.join(self.path, name + ".tmp.bin"), os.path.join(self.path, name + ".bin"))
+
+    def _merge(self, merges, length):
+        '''Merge new neighbours, formated as {row : [(paper, score)]}, into old rows.'''
+        if not merges:
+            return 0
+        indices = _open_rows(self.path, "neighbours", np.int32, length, self.n, "r+")
+        scores = _open_rows(self.path, "scores", np.float32, length, self.n, "r+")
+        changed = 0
+        for row, new in merges.items():
+            keep = indices[row] >= 0
+            candidates = np.concatenate((indices[row][keep], [paper for paper, _ in new])).astype(np.int32)
+            values = np.concatenate((scores[row][keep], np.array([value for _, value in new], dtype=np.float32)))
+            top = np.lexsort((candidates, -values))[:self.n]
+            if np.array_equal(candidates[top], indices[row][keep]):
+                continue
+            indices[row] = -1
+            scores[row] = 0
+            indices[row][:len(top)] = candidates[top]
+            scores[row][:len(top)] = values[top]
+            changed += 1
+        indices.flush()
+        scores.flush()
+        return changed
@@ -0,0 +1,225 @@
+import os
+import hashlib
+import numpy as np
+
+# The quality scores saved next to a dataset, like its authors.
+QUALITY_FILE = "quality.npz"
+
+# The weights of the components, the default is the citation score alone.
+DEFAULT_WEIGHTS = {"citation": 1.0, "date": 0.0, "author": 0.0}
+
+# Days after publication when the date score peaks.
+DATE_SCALE = 225
+
+def citation_score(citations):
+    '''log(citations + 1), the citation larger than dozens is enough for reality.'''
+    return np.log(np.asarray(citations, dtype=np.int64) + 1)
+
+def date_score(dates, today):
+    '''e * x * exp(-x) with x the age in units of `DATE_SCALE` days, 0 for unknown dates.
+
+    It rises from 0 at publication to 1 after `DATE_SCALE` days and decays after.
+    '''
+    dates = np.asarray(dates, dtype="datetime64[D]")
+    days = (np.datetime64(today, "D") - dates).astype(np.float64)
+    days[np.isnat(dates)] = 0
+    x = np.clip(days / DATE_SCALE, 0, None)
+    return np.e * x * np.exp(-x)
+
+def parse_dates(dates):
+    '''Parse "YYYY-MM-DD" dates as a datetime64[D] array, NaT for missing or bad dates.'''
+    try:
+        return np.array([date or "NaT" for date in dates], dtype="datetime64[D]")
+    except ValueError:
+        parsed = np.empty(len(dates), dtype="datetime64[D]")
+        for i, date in enumerate(dates):
+            try:
+                parsed[i] = np.datetime64(date or "NaT", "D")
+            except ValueError:
+                parsed[i] = np.datetime64("NaT")
+        return parsed
+
+def author_input(authors, author_store):
+    '''log(1 + the highest citations per paper of the authors), 0 without known authors.'''
+    best = 0.0
+    for author_id in authors or ():
+        author = author_store.get(author_id) if author_store is not None else None
+        if author is not None and author.get("paperCount"):
+            best = max(best, (author.get("citationCount") or 0) / author["paperCount"])
+    return np.log1p(best)
+
+def _citation_inputs(citation_counts, citations):
+    return np.array([count if count is not None else len(cites or ())
+                     for count, cites in zip(citation_counts, citations)], dtype=np.int64)
+
+def input_fingerprints(citations, dates, authors):
+    '''Return a uint64 digest of the inputs read from every paper, to find the changed ones.
+
+    Args:
+        citations: The citation inputs, see `_citation_inputs`.
+        dates: The dates as read from the papers, strings or None.
+        authors: The lists of author ids of the papers.
+    '''
+    fingerprints = np.empty(len(citations), dtype=np.uint64)
+    for i, (count, date, ids) in enumerate(zip(citations, dates, authors)):
+        key = f"{count}\0{date}\0{chr(1).join(map(str, ids or ()))}".encode("utf-8", "surrogatepass")
+        fingerprints[i] = int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little")
+    return fingerprints
+
+class QualityEngine:
+    '''The quality scores of all the papers of a dataset, computed as arrays.
+
+    The score of a paper is a weighted sum of a citation score, a date score and an author
+    score. The inputs of every paper, its citation count, date and author score, are kept
+    as arrays, so the scores are computed for all the papers at once, and only the inputs
+    of new or changed papers are read from the items. A fingerprint of what was read from
+    every paper is kept with the inputs, so `check` finds the papers that changed since, and
+    the author inputs are read again when the author store grows.
+
+    Attributes:
+        arxiv_ids: The arXiv id of every row.
+        citations: An int64 array of the citation count of every paper.
+        dates: A datetime64[D] array of the publication dates, NaT if unknown.
+        authors: A float array of the author input of every paper, see `author_input`.
+        fingerprints: A uint64 array of the fingerprint of every paper, see
+            `input_fingerprints`.
+        author_count: The size of the author store the author inputs were read with.
+        weights: A dictionary formated as {component : weight}, default to
+            `DEFAULT_WEIGHTS`.
+        today: The date the date scores are computed at, default to today.
+    '''
+    def __init__(self, weights=None, today=None) -> None:
+        self.arxiv_ids = []
+        self.citations = np.empty(0, dtype=np.int64)
+        self.dates = np.empty(0, dtype="datetime64[D]")
+        self.authors = np.empty(0)
+        self.fingerprints = np.empty(0, dtype=np.uint64)
+        self.author_count = 0
+        self.weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+        self.today = today
+        self._scores = None
+        self._weights = None
+
+    def __len__(self):
+        return len(self.arxiv_ids)
+
+    def _today(self):
+        return np.datetime64(self.today, "D") if self.today is not None else np.datetime64("today", "D")
+
+    def components(self):
+        '''Return the citation, date and author scores of all the papers as a dictionary.'''
+        return {"citation": citation_score(self.citations),
+                "date": date_score(self.dates, self._today()),
+                "author": self.authors.copy()}
+
+    @property
+    def scores(self):
+        '''The quality of every paper as a float array, computed again when the weights change.'''
+        weights = tuple(sorted(self.weights.items()))
+        if self._scores is None or self._weights != weights:
+            scores = np.zeros(len(self))
+            for name, values in self.components().items():
+                if self.weights.get(name, 0):
+                    scores += self.weights[name] * values
+            self._scores, self._weights = scores, weights
+        return self._scores
+
+    def _read(self, dataset, indices=None):
+        '''Read the inputs of some papers of a dataset, all of them if `indices` is None.'''
+        if indices is None:
+            column = dataset._column
+        else:
+            column = lambda attr: [getattr(dataset[i], attr) for i in indices]
+        arxiv_ids = column("arxiv_id")
+        citations = _citation_inputs(column("citation_count"), column("citations"))
+        raw_dates = column("date")
+        author_ids = column("authors")
+        authors = np.array([author_input(ids, dataset.author_store) for ids in author_ids],
+                           dtype=np.float64)
+        return arxiv_ids, citations, parse_dates(raw_dates), authors, \
+            input_fingerprints(citations, raw_dates, author_ids)
+
+    def compute(self, dataset):
+        '''Read the inputs of all the papers of a dataset and compute their scores.'''
+        self.arxiv_ids, self.citations, self.dates, self.authors, self.fingerprints = self._read(dataset)
+        self.author_count = len(dataset.author_store)
+        self._scores = None
+        return self.scores
+
+    def sync(self, dataset):
+        '''Add the papers appended to a dataset since the last call, or compute all the scores
+        if the dataset got shorter. The author inputs are read again if the author store
+        changed size.'''
+        length = len(self)
+        if length > len(dataset):
+            return self.compute(dataset)
+        if self.author_count != len(dataset.author_store):
+            self.update_authors(dataset)
+        if length < len(dataset):
+            arxiv_ids, citations, dates, authors, fingerprints = self._read(dataset, range(length, len(dataset)))
+            self.arxiv_ids = self.arxiv_ids + list(arxiv_ids)
+            self.citations = np.concatenate((self.citations, citations))
+            self.dates = np.concatenate((self.dates, dates))
+            self.authors = np.concatenate((self.authors, authors))
+            self.fingerprints = np.concatenate((self.fingerprints, fingerprints))
+            self._scores = None
+        return self.scores
+
+    def update(self, dataset, indices):
+        '''Read the inputs of the papers at `indices` again, after they changed.'''
+        indices = list(indices)
+        if not indices:
+            return
+        _, citations, dates, authors, fingerprints = self._read(dataset, indices)
+        self.citations[indices] = citations
+        self.dates[indices] = dates
+        self.authors[indices] = authors
+        self.fingerprints[indices] = fingerprints
+        self._scores = None
+
+    def update_authors(self, dataset):
+        '''Read the author inputs of all the papers again, after the author store changed.'''
+        self.authors = np.array([author_input(ids, dataset.author_store) for ids in
+                                 dataset._column("authors")[:len(self)]], dtype=np.float64)
+        self.author_count = len(dataset.author_store)
+        self._scores = None
+
+    def check(self, dataset):
+        '''Read the inputs of the papers that changed since they were read again.
+
+        The fingerprints of the papers in the engine are computed from the dataset and the
+        rows that don't match are updated, like the papers edited after the inputs were saved.
+
+        Returns:
+            changed: The indices of the rows read again.
+        '''
+        length = min(len(self), len(dataset))
+        citations = _citation_inputs(dataset._column("citation_count")[:length],
+                                     dataset._column("citations")[:length])
+        fingerprints = input_fingerprints(citations, dataset._column("date")[:length],
+                                          dataset._column("authors")[:length])
+        changed = np.flatnonzero(fingerprints != self.fingerprints[:length])
+        self.update(dataset, changed.tolist())
+        return changed
+
+    def save(self, path):
+        '''Save the inputs as a npz file.'''
+        with open(path + ".tmp", "wb") as f:
+            np.savez(f, arxiv_ids=np.array(self.arxiv_ids, dtype=str), citations=self.citations,
+                     dates=self.dates, authors=self.authors, fingerprints=self.fingerprints,
+                     author_count=self.author_count)
+        os.replace(path + ".tmp", path)
+
+    def load(self, path):
+        '''Load inputs saved by `save`.'''
+        with np.load(path) as data:
+            self.arxiv_ids = data["arxiv_ids"].tolist()
+            self.citations = data["citations"]
+            self.dates = data["dates"]
+            self.authors = data["authors"]
+            # Files saved without the fingerprints are read again by `check`.
+            self.fingerprints = data["fingerprints"] if "fingerprints" in data else \
+                np.zeros(len(self.arxiv_ids), dtype=np.uint64)
+            self.author_count = int(data["author_count"]) if "author_count" in data else -1
+        self._scores = None
+        return self
@@ -1,29 +1,306 @@
+import os
+import copy
 import json
+import shutil
+import pickle
+import hashlib
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from langchain.text_splitter import CharacterTextSplitter
 from langchain.vectorstores import Chroma
 from langchain.embeddings import HuggingFaceEmbeddings
-from langchain.storage import LocalFileStore
 from langchain.text_splitter import CharacterTextSplitter
 from langchain.vectorstores import FAISS
-from langchain.embeddings import CacheBackedEmbeddings
+from langchain_core.embeddings import Embeddings
+from loguru import logger
+import numpy as np
+from racp.embedding_store import get_store, namespace_of
+from racp.utils import bounded_map
+from racp.vector_index import index_params, index_type_of, make_index, resolve_params, \
+    sample_rows, set_search_params, structure_key, train_index, uses_ivf, uses_pq
+# Bump when the layout of the snapshots changes, so old ones are built again.
+SNAPSHOT_VERSION = 2
+SNAPSHOT_META = "snapshot.json"
+DELTA_DIR = "delta"
+
 def load_json(file_path):
     return json.loads(Path(file_path).read_text())
+
+def snapshot_fingerprint(config):
+    """Return the fingerprint of the indexes built with a config.
+
+    Args:
+        config (Config): configuration for the retriever.
+
+    Returns:
+        str: a sha1 hex digest of the model name, chunk settings, normalization and index
+            type, see `racp.vector_index.structure_key`.
+    """
+    key = {"version": SNAPSHOT_VERSION, "model_name": config.model_name,
+           "chunk_size": config.chunk_size, "chunk_overlap": config.chunk_overlap,
+           "normalize_embeddings": config.normalize_embeddings}
+    index = structure_key(index_params(config))
+    if index is not None:
+        # The flat index keeps the fingerprint it had before the index types.
+        key["index"] = index
+    return hashlib.sha1(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+def documents_fingerprint(database):
+    """Return a digest of the documents of a database.
+
+    A RawSet hashes its columns without building the documents, see
+    `RawSet.documents_fingerprint`, other databases are converted first.
+    """
+    if hasattr(database, "documents_fingerprint"):
+        return database.documents_fingerprint()
+    digest = hashlib.sha1()
+    for doc in (i.to_Document() for i in database):
+        digest.update(json.dumps([doc.metadata, doc.page_content], sort_keys=True).encode())
+    return digest.hexdigest()
+
+def _text_hash(text):
+    return hashlib.sha1(text.encode("utf-8", "surrogatepass")).hexdigest()
+
+def paper_entries(database):
+    """Return what the index needs to know of every paper of a database.
+
+    A RawSet reads its columns without building the documents, see `RawSet.document_fields`.
+
+    Returns:
+        dict: formated as {arxiv id : (hash of the text, metadata, index in the database)}.
+    """
+    entries = {}
+    if hasattr(database, "document_fields"):
+        for idx, (arxiv_id, title, text, quality) in enumerate(database.document_fields()):
+            metadata = {"source": arxiv_id, "title": title, "quality": str(quality)}
+            entries[arxiv_id] = (_text_hash(text), metadata, idx)
+    else:
+        for idx, item in enumerate(database):
+            doc = item.to_Document()
+            entries[doc.metadata["source"]] = (_text_hash(doc.page_content), doc.metadata, idx)
+    return entries
+
+# The model of a worker process of `EmbeddingPipeline`.
+_model = None
+
+def _init_worker(model_name, threads):
+    global _model
+    import torch
+    from sentence_transformers import SentenceTransformer
+    torch.set_num_threads(threads)
+    _model = SentenceTransformer(model_name, device="cpu")
+
+def _preprocess(text):
+    # Like HuggingFaceEmbeddings, newlines are replaced by spaces before encoding.
+    return text.replace("\n", " ")
+
+def _encode(model, texts, normalize_embeddings):
+    texts = [_preprocess(text) for text in texts]
+    return np.asarray(model.encode(texts, batch_size=len(texts), show_progress_bar=False,
+                                   convert_to_numpy=True, normalize_embeddings=normalize_embeddings),
+                      dtype=np.float32)
+
+def _encode_batch(indices, texts, normalize_embeddings):
+    return indices, _encode(_model, texts, normalize_embeddings)
+
+class EmbeddingPipeline():
+    """Embed many texts with a sentence-transformers model, in batches of texts of similar length
+
+    A batch is padded to its longest text, so batches mixing short and long abstracts waste
+    most of their compute on padding. The texts are sorted by their number of tokens and cut
+    into batches of `batch_size` neighbours, smaller if `max_tokens` is given, and the
+    batches are embedded by `processes` worker processes of `threads` torch threads each.
+    Every worker is spawned, since forking after torch started its threads can hang, and
+    loads its own copy of the model on the CPU, so the main module must only start the work
+    under `if __name__ == "__main__"`. With one process the batches are embedded in this
+    process, on the device of `model`. The texts are encoded like `HuggingFaceEmbeddings`
+    does, with their newlines replaced by spaces.
+
+    Attributes:
+        model_name (str): the name of the sentence-transformers model.
+        normalize_embeddings (bool): whether to normalize the vectors.
+        processes (int): the number of worker processes, default to 1.
+        threads (int): the torch threads of every worker, default to the CPUs divided by
+            the processes. With one process it is only set if it is given.
+        batch_size (int): the most texts in a batch.
+        max_tokens (int): the most tokens in a batch, padding included, default to None
+            which only caps the texts.
+        model (SentenceTransformer): the model used in this process, loaded when needed
+            if None.
+    """
+    def __init__(self, model_name, normalize_embeddings=False, processes=1, threads=None,
+                 batch_size=32, max_tokens=None, model=None) -> None:
+        self.model_name = model_name
+        self.normalize_embeddings = normalize_embeddings
+        self.processes = processes
+        self.threads = threads
+        self.batch_size = batch_size
+        self.max_tokens = max_tokens
+        self.model = model
+    def _load_model(self):
+        if self.model is None:
+            from sentence_transformers import SentenceTransformer
+            self.model = SentenceTransformer(self.model_name, device="cpu")
+        return self.model
+    def lengths(self, texts):
+        """Return the number of tokens of every text, up to the length the model reads"""
+        model = self._load_model()
+        max_length = getattr(model, "max_seq_length", None) or 512
+        lengths = np.empty(len(texts), dtype=np.int64)
+        for start in range(0, len(texts), 10000):
+            ids = model.tokenizer(texts[start:start + 10000], truncation=True, max_length=max_length)["input_ids"]
+            lengths[start:start + len(ids)] = [len(i) for i in ids]
+        return lengths
+    def batches(self, lengths):
+        """Cut the indices of texts of some lengths into batches of similar lengths"""
+        order = np.argsort(lengths, kind="stable")
+        batches = []
+        start = 0
+        while start < len(order):
+            stop = min(start + self.batch_size, len(order))
+            if self.max_tokens is not None:
+                # The texts are sorted, so the last one is the longest of the batch.
+                while stop - start > 1 and (stop - start) * lengths[order[stop - 1]] > self.max_tokens:
+                    stop -= 1
+            batches.append(order[start:stop])
+            start = stop
+        return batches
+    def iter_embed(self, texts):
+        """Embed texts, yielding the vectors of every batch as soon as it is done
+
+        Args:
+            texts (list): the strings to embed.
+
+        Returns:
+            generator: (indices, vectors) pairs, the indices of the texts of a batch and a
+                float32 array of their vectors.
+        """
+        batches = self.batches(self.lengths(texts))
+        if self.processes <= 1:
+            if self.threads is not None:
+                import torch
+                torch.set_num_threads(self.threads)
+            for indices in batches:
+                yield indices, _encode(self.model, [texts[i] for i in indices], self.normalize_embeddings)
+            return
+        threads = self.threads or max(1, (os.cpu_count() or 1) // self.processes)
+        executor = ProcessPoolExecutor(self.processes, mp_context=multiprocessing.get_context("spawn"),
+                                       initializer=_init_worker, initargs=(self.model_name, threads))
+        try:
+            tasks = deque((indices, [texts[i] for i in indices], self.normalize_embeddings)
+                          for indices in batches)
+            yield from bounded_map(executor, _encode_batch, tasks, 2 * self.processes)
+        finally:
+            executor.shutdown()
+    def embed(self, texts):
+        """Embed texts, returning a float32 array of their vectors in order"""
+        vectors = None
+        for indices, batch in self.iter_embed(texts):
+            if vectors is None:
+                vectors = np.zeros((len(texts), batch.shape[1]), dtype=np.float32)
+            vectors[indices] = batch
+        return vectors if vectors is not None else np.zeros((0, 0), dtype=np.float32)
+
+class StoreBackedEmbeddings(Embeddings):
+    """Embeddings cached in a `racp.embedding_store.EmbeddingStore`
+
+    A batch of documents is looked up in the store at once, and only the texts that aren't
+    in it are embedded and appended, by `pipeline` if it is given. The texts are stored with
+    their newlines replaced by spaces, the text the model reads. Queries aren't cached.
+    """
+    def __init__(self, embeddings, store, pipeline=None) -> None:
+        self.embeddings = embeddings
+        self.store = store
+        self.pipeline = pipeline
+    def iter_embed_documents(self, texts):
+        """Yield (indices, vectors) pairs, the texts found in the store first"""
+        texts = [_preprocess(text) for text in texts]
+        vectors, found = self.store.get(texts)
+        hits = np.flatnonzero(found)
+        if len(hits):
+            yield hits, vectors[hits]
+        missing = np.flatnonzero(~found)
+        if not len(missing):
+            return
+        missing_texts = [texts[i] for i in missing]
+        if self.pipeline is not None:
+            batches = self.pipeline.iter_embed(missing_texts)
+        else:
+            batches = [(np.arange(len(missing)), np.array(self.embeddings.embed_documents(missing_texts), dtype=np.float32))]
+        for indices, new in batches:
+            self.store.add([missing_texts[i] for i in indices], new)
+            yield missing[indices], new
+    def embed_documents(self, texts):
+        vectors = None
+        for indices, batch in self.iter_embed_documents(texts):
+            if vectors is None:
+                vectors = np.zeros((len(texts), batch.shape[1]), dtype=np.float32)
+            vectors[indices] = batch
+        if vectors is None:
+            return []
+        return vectors.tolist()
+    def embed_query(self, text):
+        return self.embeddings.embed_query(text)
+
+class _IndexState():
+    """One version of the index, never changed once built
+
+    The base is the index built from the whole database, the delta a small index of the
+    papers added or changed since. The base chunks of the papers in `tombstones` are
+    skipped by the searches, and the metadata of the papers in `patches` replaces the one
+    of their chunks.
+    """
+    def __init__(self, base, base_papers, base_chunks, delta=None, tombstones=frozenset(),
+                 papers=None, patches=None) -> None:
+        self.base = base
+        # {arxiv id : (hash of the text, metadata)} of the papers in the base.
+        self.base_papers = base_papers
+        # {arxiv id : number of chunks} of the papers in the base.
+        self.base_chunks = base_chunks
+        self.delta = delta
+        self.tombstones = tombstones
+        # {arxiv id : (hash of the text, metadata)} of the papers that can be found.
+        self.papers = papers if papers is not None else base_papers
+        self.patches = patches if patches is not None else {}
+        self.hidden = sum(base_chunks.get(arxiv_id, 0) for arxiv_id in tombstones)
+
 class Retriver():
     """retriever 
     
+    With an `index_path`, the FAISS index and its docstore are saved there after they are
+    built, in a directory named after `snapshot_fingerprint`. The next retriever with the
+    same model and chunk settings loads them, memory-mapped, instead of splitting and
+    embedding the documents again, and only embeds the papers of the database that are
+    new or changed since, see `sync_database`.
+
+    Papers are added, updated and deleted by arxiv id with `add_papers` and
+    `delete_papers`. The changes go to a small delta index saved next to the snapshot, so
+    the large base index is never rewritten until `compact`. Every change builds a new
+    version of the index and swaps it in at the end: searches running meanwhile keep
+    using the version they started with.
     """
-    def __init__(self, config=None, database=None) -> None:
+    def __init__(self, config=None, database=None, index_path=None) -> None:
         """Initialize retriever using config and database
         
         Args:
             config (Config): configuration for the retriever.
             database (list): a list of Document objects to build the retriever from.
+            index_path (str): the directory of the index snapshots, default to None which
+                always builds the index.
         """
+        self.config = config
+        self.snapshot = None
+        self._state = None
+        self._embedder = None
+        self._lock = threading.RLock()
+        self.index_params = index_params(config)
         self.text_splitter = CharacterTextSplitter(chunk_size=config.chunk_size, chunk_overlap=config.chunk_overlap)
         self.build_embedding_model(config)
         if database is not None:
-            self.build_retriver_from_database(database)
+            self.build_retriver_from_database(database, index_path)
         else:
             raise ValueError('Please specify database')
         
@@ -36,31 +313,429 @@ class Retriver():
         model_kwargs = {'device': config.device}
         encode_kwargs = {'normalize_embeddings': config.normalize_embeddings}
         self.hf = HuggingFaceEmbeddings(model_name=config.model_name, model_kwargs=model_kwargs, encode_kwargs=encode_kwargs)
-    def build_retriver_from_database(self, database):
+    def build_embedding_cache(self):
+        """Wrap the embedding model with the embedding store
+
+        The store is in `config.embedding_store`, default to ./cache/embeddings, with one
+        namespace per model and normalization, see `racp.embedding_store.namespace_of`. All
+        the retrievers of a process share the store of a namespace.
+        """
+        if self._embedder is None:
+            store = get_store(getattr(self.config, "embedding_store", "./cache/embeddings"),
+                             namespace_of(self.config.model_name, self.config.normalize_embeddings))
+            self._embedder = StoreBackedEmbeddings(self.hf, store, self.build_embedding_pipeline())
+        return self._embedder
+    def build_embedding_pipeline(self):
+        """The `EmbeddingPipeline` embedding the documents
+
+        It is set by `config.embedding_processes`, `embedding_threads`,
+        `embedding_batch_size` and `embedding_max_tokens`. With one process, the default, it
+        uses the model of `self.hf` on `config.device`.
+        """
+        return EmbeddingPipeline(self.config.model_name, self.config.normalize_embeddings,
+                                 processes=getattr(self.config, "embedding_processes", 1) or 1,
+                                 threads=getattr(self.config, "embedding_threads", None),
+                                 batch_size=getattr(self.config, "embedding_batch_size", 32) or 32,
+                                 max_tokens=getattr(self.config, "embedding_max_tokens", None),
+                                 model=self.hf.client)
+    def _index_documents(self, documents, db=None, params=None):
+        """Embed documents and add them to a FAISS index, batch by batch
+
+        Every batch goes to the index as soon as it is embedded, so the vectors of all the
+        documents are never held in memory at once.
+
+        Args:
+            documents (list): the Documents to add.
+            db (FAISS): the index to add them to, default to None which builds a new one.
+            params (dict): the parameters of the new index, see
+                `racp.vector_index.index_params`, default to None which builds a flat index.
+
+        Returns:
+            FAISS: the index.
+        """
+        if db is None and params is not None and (uses_ivf(params) or uses_pq(params)):
+            return self._train_documents(documents, params)
+        from langchain.docstore.in_memory import InMemoryDocstore
+        embedder = self.build_embedding_cache()
+        texts = [doc.page_content for doc in documents]
+        for indices, vectors in embedder.iter_embed_documents(texts):
+            pairs = [(texts[i], vector) for i, vector in zip(indices.tolist(), vectors.tolist())]
+            metadatas = [documents[i].metadata for i in indices.tolist()]
+            if db is None and params is not None and params["index_type"] == "hnsw":
+                # An HNSW index needs no training, the vectors go to it as they come.
+                db = FAISS(embedder, make_index(vectors.shape[1], params), InMemoryDocstore(), {})
+            if db is None:
+                db = FAISS.from_embeddings(pairs, embedder, metadatas=metadatas)
+            else:
+                db.add_embeddings(pairs, metadatas=metadatas)
+        return db
+    def _train_documents(self, documents, params):
+        """Build an index that needs training, like IVF or PQ, from documents
+
+        The documents are embedded once to train the index on a sample of their vectors,
+        then added to it, with the vectors read back from the embedding store.
+        """
+        from langchain.docstore.in_memory import InMemoryDocstore
+        embedder = self.build_embedding_cache()
+        texts = [doc.page_content for doc in documents]
+        params = resolve_params(params, len(texts))
+        # An empty list of documents falls back to the flat index too.
+        if params["index_type"] == "flat":
+            logger.warning("Too few documents to train the index, building a flat index")
+            return self._index_documents(documents)
+        sample = sample_rows(len(texts), params["train_size"])
+        train = []
+        for indices, vectors in embedder.iter_embed_documents(texts):
+            keep = np.isin(indices, sample)
+            if keep.any():
+                train.append(np.asarray(vectors, dtype=np.float32)[keep])
+        train = np.concatenate(train)
+        index = make_index(train.shape[1], params)
+        train_index(index, train)
+        del train
+        return self._index_documents(documents, FAISS(embedder, index, InMemoryDocstore(), {}))
+    @property
+    def db(self):
+        """The FAISS base index"""
+        return self._state.base
+    def build_retriver_from_database(self, database, index_path=None):
         """Build the retriever from the database
         
         Args:
             database (list): a list of Document objects to build the retriever from.
+            index_path (str): the directory of the index snapshots, default to None.
         """
+        from time import time 
+        t0 = time()
+        if index_path is not None:
+            self.snapshot = os.path.join(index_path, snapshot_fingerprint(self.config))
+            if os.path.exists(os.path.join(self.snapshot, SNAPSHOT_META)):
+                meta = self.load_snapshot(self.snapshot)
+                fingerprint = documents_fingerprint(database)
+                if meta.get("documents") != fingerprint:
+                    synced = self.sync_database(database, fingerprint)
+                    logger.info(f"Synced the index snapshot with the database: {synced['added']} added, "
+                                f"{synced['patched']} patched, {synced['deleted']} deleted")
+                logger.info(f"Loaded index snapshot in {time() - t0:.1f}s")
+                return
         # TODO : remove k < 2000 
         # data = [i.to_Document() for k,i in enumerate(database) if k < 2000 ]
-        data = [i.to_Document() for k,i in enumerate(database) ]
-        print(f'Loaded {len(data)} documents using database ')
+        if hasattr(database, "to_Documents"):
+            # A RawSet scores the quality of all its papers at once.
+            data = database.to_Documents()
+        else:
+            data = [i.to_Document() for k,i in enumerate(database) ]
+        logger.info(f"Loaded {len(data)} documents using database")
         documents = self.text_splitter.split_documents(data)
-        ## check duplicate 
-        ids = set([doc.metadata['source'] for doc in documents])
-        print(len(ids),len(documents))
         # self.db = Chroma.from_documents(documents,self.hf)
-        from time import time 
-        t0 = time()
-        store = LocalFileStore("./cache/")
-
-        cached_embedder = CacheBackedEmbeddings.from_bytes_store(
-            self.hf, store, namespace="test"
-        )
-        self.db = FAISS.from_documents(documents, cached_embedder)
+        base = self._index_documents(documents, params=self.index_params)
+        base_papers = dict((doc.metadata['source'], (_text_hash(doc.page_content), doc.metadata)) for doc in data)
+        base_chunks = {}
+        for doc in documents:
+            base_chunks[doc.metadata['source']] = base_chunks.get(doc.metadata['source'], 0) + 1
+        self._state = _IndexState(base, base_papers, base_chunks)
         t1 = time()
-        print("loading time ",t1-t0)
+        logger.info(f"Built the index in {t1 - t0:.1f}s")
+        if self.snapshot is not None:
+            self.save_snapshot(self.snapshot, documents_fingerprint(database))
+    def save_snapshot(self, path, documents=None):
+        """Save the FAISS base index, its docstore and its papers in directory `path`
+        
+        They are written to a temporary directory first and moved to `path` at the end,
+        so an interrupted save never leaves a snapshot that looks complete. The delta of
+        the previous snapshot in `path` is removed with it.
+
+        Args:
+            path (str): the directory of the snapshot.
+            documents (str): the fingerprint of the database the index holds, if known.
+        """
+        import faiss
+        state = self._state
+        tmp = path + ".tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        faiss.write_index(state.base.index, os.path.join(tmp, "index.faiss"))
+        with open(os.path.join(tmp, "docstore.pkl"), "wb") as f:
+            pickle.dump((state.base.docstore, state.base.index_to_docstore_id), f)
+        with open(os.path.join(tmp, "papers.pkl"), "wb") as f:
+            pickle.dump((state.base_papers, state.base_chunks), f)
+        self._save_meta(tmp, documents)
+        shutil.rmtree(path + ".old", ignore_errors=True)
+        if os.path.exists(path):
+            os.replace(path, path + ".old")
+        os.replace(tmp, path)
+        shutil.rmtree(path + ".old", ignore_errors=True)
+    def _save_meta(self, path, documents):
+        state = self._state
+        meta = {"version": SNAPSHOT_VERSION, "fingerprint": snapshot_fingerprint(self.config),
+                "model_name": self.config.model_name, "documents": documents,
+                "index_type": index_type_of(state.base.index),
+                "vectors": state.base.index.ntotal,
+                "delta_vectors": state.delta.index.ntotal if state.delta is not None else 0,
+                "tombstones": len(state.tombstones)}
+        with open(os.path.join(path, SNAPSHOT_META + ".tmp"), "w") as f:
+            json.dump(meta, f, indent=4)
+        os.replace(os.path.join(path, SNAPSHOT_META + ".tmp"), os.path.join(path, SNAPSHOT_META))
+    def _save_delta(self, documents):
+        """Save the delta, tombstones and patches of the index next to its snapshot"""
+        import faiss
+        state = self._state
+        path = os.path.join(self.snapshot, DELTA_DIR)
+        tmp = path + ".tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        if state.delta is not None:
+            faiss.write_index(state.delta.index, os.path.join(tmp, "index.faiss"))
+            with open(os.path.join(tmp, "docstore.pkl"), "wb") as f:
+                pickle.dump((state.delta.docstore, state.delta.index_to_docstore_id), f)
+        # Only the papers that differ from the base are saved.
+        changed = dict((arxiv_id, entry) for arxiv_id, entry in state.papers.items()
+                       if state.base_papers.get(arxiv_id) != entry)
+        removed = [arxiv_id for arxiv_id in state.base_papers if arxiv_id not in state.papers]
+        with open(os.path.join(tmp, "changes.pkl"), "wb") as f:
+            pickle.dump((state.tombstones, changed, removed, state.patches), f)
+        shutil.rmtree(path + ".old", ignore_errors=True)
+        if os.path.exists(path):
+            os.replace(path, path + ".old")
+        os.replace(tmp, path)
+        shutil.rmtree(path + ".old", ignore_errors=True)
+        self._save_meta(self.snapshot, documents)
+    def load_snapshot(self, path):
+        """Load a FAISS index, its docstore and its delta saved by `save_snapshot`
+        
+        The vectors of the base are memory-mapped when faiss supports it for the index, so
+        they are read from disk as the searches need them.
+
+        Args:
+            path (str): the directory of the snapshot.
+
+        Returns:
+            dict: the metadata of the snapshot.
+        """
+        import faiss
+        embedder = self.build_embedding_cache()
+        index_file = os.path.join(path, "index.faiss")
+        flags = getattr(faiss, "IO_FLAG_MMAP", 0) | getattr(faiss, "IO_FLAG_READ_ONLY", 0)
+        try:
+            index = faiss.read_index(index_file, flags)
+        except RuntimeError:
+            # Some index types can't be memory-mapped.
+            index = faiss.read_index(index_file)
+        set_search_params(index, self.index_params)
+        with open(os.path.join(path, "docstore.pkl"), "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+        with open(os.path.join(path, "papers.pkl"), "rb") as f:
+            base_papers, base_chunks = pickle.load(f)
+        state = _IndexState(FAISS(embedder, index, docstore, index_to_docstore_id),
+                            base_papers, base_chunks)
+        delta_path = os.path.join(path, DELTA_DIR)
+        if os.path.exists(os.path.join(delta_path, "changes.pkl")):
+            delta = None
+            if os.path.exists(os.path.join(delta_path, "index.faiss")):
+                with open(os.path.join(delta_path, "docstore.pkl"), "rb") as f:
+                    docstore, index_to_docstore_id = pickle.load(f)
+                delta = FAISS(embedder, faiss.read_index(os.path.join(delta_path, "index.faiss")),
+                              docstore, index_to_docstore_id)
+            with open(os.path.join(delta_path, "changes.pkl"), "rb") as f:
+                tombstones, changed, removed, patches = pickle.load(f)
+            papers = dict(base_papers)
+            papers.update(changed)
+            for arxiv_id in removed:
+                papers.pop(arxiv_id, None)
+            state = _IndexState(state.base, base_papers, base_chunks, delta, tombstones, papers,
+                                patches)
+        self._state = state
+        self.snapshot = path
+        return load_json(os.path.join(path, SNAPSHOT_META))
+    def _copy_delta(self, delta):
+        """Copy the delta index, so that the one searches use isn't changed"""
+        if delta is None:
+            return None
+        import faiss
+        return FAISS(delta.embedding_function, faiss.clone_index(delta.index),
+                     copy.deepcopy(delta.docstore), dict(delta.index_to_docstore_id))
+    def _update(self, documents=(), deleted=(), patches=None, fingerprint=None):
+        """Build the next version of the index and swap it in
+
+        Args:
+            documents (list): the Documents of the papers to add or replace, they are the
+                only ones embedded.
+            deleted (list): the arxiv ids of the papers to delete.
+            patches (dict): formated as {arxiv id : metadata}, the papers whose metadata
+                changed but not their text.
+            fingerprint (str): the fingerprint of the database the index holds after the
+                update, if known.
+        """
+        with self._lock:
+            state = self._state
+            delta = self._copy_delta(state.delta)
+            papers = dict(state.papers)
+            tombstones = set(state.tombstones)
+            new_patches = dict(state.patches)
+            removed = set(deleted) | set(doc.metadata['source'] for doc in documents)
+            if delta is not None and removed:
+                ids = [docstore_id for docstore_id in delta.index_to_docstore_id.values()
+                       if delta.docstore.search(docstore_id).metadata['source'] in removed]
+                if ids:
+                    delta.delete(ids)
+            tombstones.update(arxiv_id for arxiv_id in removed if arxiv_id in state.base_chunks)
+            for arxiv_id in removed:
+                papers.pop(arxiv_id, None)
+                new_patches.pop(arxiv_id, None)
+            chunks = self.text_splitter.split_documents(list(documents))
+            if chunks:
+                delta = self._index_documents(chunks, delta)
+            for doc in documents:
+                papers[doc.metadata['source']] = (_text_hash(doc.page_content), doc.metadata)
+            for arxiv_id, metadata in (patches or {}).items():
+                papers[arxiv_id] = (papers[arxiv_id][0], metadata)
+                new_patches[arxiv_id] = metadata
+            self._state = _IndexState(state.base, state.base_papers, state.base_chunks, delta,
+                                      frozenset(tombstones), papers, new_patches)
+            if self.snapshot is not None:
+                self._save_delta(fingerprint)
+    def add_papers(self, papers, qualities=None):
+        """Add papers to the index, or update them if their arxiv id is in it already
+
+        Only the papers whose text changed are embedded, a paper whose title or quality
+        changed only gets its metadata updated.
+
+        Args:
+            papers (list): PaperItems.
+            qualities (list): the quality of every paper, default to `PaperItem.quality`.
+        """
+        with self._lock:
+            return self._add_papers(papers, qualities)
+    def _add_papers(self, papers, qualities):
+        state = self._state
+        documents, patches = [], {}
+        for k, paper in enumerate(papers):
+            doc = paper.to_Document(qualities[k] if qualities is not None else None)
+            arxiv_id = doc.metadata['source']
+            entry = (_text_hash(doc.page_content), doc.metadata)
+            if state.papers.get(arxiv_id) == entry:
+                continue
+            if arxiv_id in state.papers and state.papers[arxiv_id][0] == entry[0]:
+                patches[arxiv_id] = doc.metadata
+            else:
+                documents.append(doc)
+        if documents or patches:
+            self._update(documents, patches=patches)
+        return {"added": len(documents), "patched": len(patches)}
+    def delete_papers(self, arxiv_ids):
+        """Delete papers from the index by arxiv id, the ones not in it are skipped
+
+        Args:
+            arxiv_ids (list): the arxiv ids of the papers.
+        """
+        with self._lock:
+            deleted = [arxiv_id for arxiv_id in arxiv_ids if arxiv_id in self._state.papers]
+            if deleted:
+                self._update(deleted=deleted)
+        return {"deleted": len(deleted)}
+    def sync_database(self, database, fingerprint=None):
+        """Add, update and delete the papers of the index to match a database
+
+        Args:
+            database (RawSet): the database, a list of PaperItems works too.
+            fingerprint (str): the `documents_fingerprint` of the database if it is known.
+
+        Returns:
+            dict: the number of papers `added`, `patched` and `deleted`.
+        """
+        entries = paper_entries(database)
+        with self._lock:
+            return self._sync_entries(database, entries, fingerprint)
+    def _sync_entries(self, database, entries, fingerprint):
+        state = self._state
+        documents, patches = [], {}
+        for arxiv_id, (text_hash, metadata, idx) in entries.items():
+            entry = state.papers.get(arxiv_id)
+            if entry == (text_hash, metadata):
+                continue
+            if entry is not None and entry[0] == text_hash:
+                patches[arxiv_id] = metadata
+            else:
+                documents.append(database[idx].to_Document(metadata['quality']))
+        deleted = [arxiv_id for arxiv_id in state.papers if arxiv_id not in entries]
+        if documents or deleted or patches:
+            self._update(documents, deleted, patches, fingerprint or documents_fingerprint(database))
+        return {"added": len(documents), "patched": len(patches), "deleted": len(deleted)}
+    def compact(self):
+        """Merge the delta into the base index, without the deleted papers, and save it
+
+        The searches skip more and more base chunks as papers are updated or deleted,
+        compacting from time to time keeps them fast. An index that isn't flat is built and
+        trained again, with the vectors read from the embedding store.
+        """
+        import faiss
+        with self._lock:
+            state = self._state
+            base = state.base
+            if self.index_params["index_type"] != "flat":
+                base = self._index_documents(self._live_chunks(state), params=self.index_params)
+            else:
+                base = FAISS(base.embedding_function, faiss.clone_index(base.index),
+                             copy.deepcopy(base.docstore), dict(base.index_to_docstore_id))
+                if state.tombstones:
+                    ids = [docstore_id for docstore_id in base.index_to_docstore_id.values()
+                           if base.docstore.search(docstore_id).metadata['source'] in state.tombstones]
+                    base.delete(ids)
+                if state.delta is not None and state.delta.index.ntotal:
+                    base.merge_from(state.delta)
+                for docstore_id in base.index_to_docstore_id.values():
+                    doc = base.docstore.search(docstore_id)
+                    if doc.metadata['source'] in state.patches:
+                        doc.metadata = state.patches[doc.metadata['source']]
+            base_chunks = {}
+            for docstore_id in base.index_to_docstore_id.values():
+                source = base.docstore.search(docstore_id).metadata['source']
+                base_chunks[source] = base_chunks.get(source, 0) + 1
+            self._state = _IndexState(base, state.papers, base_chunks)
+            if self.snapshot is not None:
+                meta = load_json(os.path.join(self.snapshot, SNAPSHOT_META))
+                self.save_snapshot(self.snapshot, meta.get("documents"))
+    def _live_chunks(self, state):
+        """The chunks of the base and the delta, without the deleted ones and patched"""
+        chunks = []
+        for db, skip in ((state.base, state.tombstones), (state.delta, ())):
+            if db is None:
+                continue
+            for docstore_id in db.index_to_docstore_id.values():
+                doc = db.docstore.search(docstore_id)
+                if doc.metadata['source'] not in skip:
+                    chunks.append(self._patch(doc, state.patches))
+        return chunks
+    def search(self, query, k):
+        """Search the base and the delta of the index
+
+        Args:
+            query (str): the query to search for in the retriever.
+            k (int): number of chunks to return.
+
+        Returns:
+            list: (Document, relevance) pairs, most relevant first.
+        """
+        state = self._state
+        base = state.base
+        # Fetch the hidden chunks too, so that k chunks are left when they are skipped.
+        fetch = min(k + state.hidden, base.index.ntotal)
+        docs = [doc for doc in base.similarity_search_with_relevance_scores(query, k=fetch)
+                if doc[0].metadata['source'] not in state.tombstones] if fetch > 0 else []
+        if state.delta is not None and state.delta.index.ntotal:
+            docs += state.delta.similarity_search_with_relevance_scores(
+                query, k=min(k, state.delta.index.ntotal))
+        docs.sort(key=lambda doc: doc[1], reverse=True)
+        docs = docs[:k]
+        if state.patches:
+            docs = [(self._patch(doc, state.patches), score) for doc, score in docs]
+        return docs
+    @staticmethod
+    def _patch(doc, patches):
+        metadata = patches.get(doc.metadata['source'])
+        if metadata is None:
+            return doc
+        return type(doc)(page_content=doc.page_content, metadata=metadata)
     def retrival(self, query, k=10):
         """Perform retrieval
         
@@ -71,7 +746,7 @@ class Retriver():
         Returns:
             list: a list of dictionaries containing information about the retrieved documents.
         """
-        docs = self.db.similarity_search_with_relevance_scores(query,k=k*2)
+        docs = self.search(query, k*2)
         # 现在这个result 里面 arxiv id有重复，请你帮我去掉重复的
         result = [{'Papername':doc[0].metadata['title'],'arxiv_id':doc[0].metadata['source'],'quality':doc[0].metadata['quality'],'relevance':doc[1]} for doc in docs if doc[1]>0]
         # 如果你希望按照原始列表中的顺序保留其他字段，可以使用以下代码：
@@ -85,7 +760,6 @@ class Retriver():
                     # unique_result.append({'Papername': doc[0].metadata['title'], 'arxiv_id': doc[0].metadata['source'], 'quality': doc[0].metadata['quality'], 'relevance': doc[1]})
                     unique_result.append({'Papername': doc[0].metadata['title'], 'arxiv_id':doc[0].metadata['source'], 'relevance': doc[1]})
                     arxivids.remove(arxiv_id) 
-        print(unique_result)
         return unique_result 
         # return  f"Most similar document's page content:\n{docs[0].page_content}"
     # TODO: other retrival policy 
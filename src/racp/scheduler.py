@@ -0,0 +1,163 @@
+import queue
+from collections import deque
+import traceback
+import multiprocessing
+from tqdm import tqdm
+from loguru import logger
+
+def _worker_loop(index, worker, inbox, messages, initializer, initargs):
+    '''Ask for a batch, run it and report, until a None arrives.'''
+    if initializer is not None:
+        initializer(*initargs)
+    messages.put(("ready", index, None))
+    while True:
+        batch = inbox.get()
+        if batch is None:
+            break
+        try:
+            failures = worker(batch) or {}
+        except Exception:
+            error = traceback.format_exc(limit=1)
+            failures = {task: error for task in batch}
+        messages.put(("result", index, [(task, failures.get(task)) for task in batch]))
+
+class DownloadScheduler:
+    '''Run a function over many tasks with worker processes sharing one work queue.
+
+    Instead of giving every worker a fixed slice, all the tasks wait in one queue and a worker
+    is handed the next batch as soon as it is free. A slow or failing task only keeps its
+    own worker busy, so a full run ends shortly after its slowest task. Failed tasks go back to
+    the queue until they failed `max_retries + 1` times, after which they are moved to the
+    dead-letter list. If a worker process dies, the tasks it held are counted as failed and a
+    new worker takes its place. Progress, throughput and ETA are shown by tqdm.
+
+    Attributes:
+        worker: A picklable function called as `worker(tasks)` with a list of at most
+            `batch_size` tasks. It returns a dictionary formated as {task : error} of the tasks
+            that failed, or None. If it raises, the whole batch fails.
+        processes: Number of worker processes.
+        max_retries: Number of retries of a failed task.
+        batch_size: Maximum number of tasks handed to `worker` at a time.
+        initializer: A function called as `initializer(*initargs)` in every worker process.
+        initargs: Arguments of `initializer`.
+        callback: A function called as `callback(task, error)` in the main process when a
+            task is done (`error` is None) or dead-lettered.
+        logger: loguru logger.
+    '''
+    def __init__(
+        self,
+        worker,
+        processes=4,
+        max_retries=2,
+        batch_size=1,
+        initializer=None,
+        initargs=(),
+        callback=None,
+        logger=logger
+    ) -> None:
+        self.worker = worker
+        self.processes = processes
+        self.max_retries = max_retries
+        self.batch_size = batch_size
+        self.initializer = initializer
+        self.initargs = initargs
+        self.callback = callback
+        self.logger = logger
+
+    def _start(self, ctx, index, messages):
+        inbox = ctx.Queue()
+        process = ctx.Process(
+            target=_worker_loop,
+            args=(index, self.worker, inbox, messages, self.initializer, self.initargs)
+        )
+        process.start()
+        return process, inbox
+
+    def run(self, tasks, desc=None):
+        '''Run the worker over all the tasks.
+
+        Args:
+            tasks: A list of picklable and hashable tasks, like arXiv ids.
+            desc: Description shown in the progress bar.
+
+        Returns:
+            done: The list of tasks that succeeded.
+            dead_letters: A dictionary formated as {task : last error} of the tasks that
+                failed `max_retries + 1` times.
+        '''
+        ctx = multiprocessing.get_context()
+        messages = ctx.Queue()
+        todo = deque(tasks)
+        workers = [self._start(ctx, i, messages) for i in range(self.processes)]
+        # The parent hands out every batch, so it always knows what a dead worker held.
+        holding = [[] for _ in workers]
+        idle = set()
+        attempts = {}
+        retried = 0
+        done = []
+        dead_letters = {}
+        remaining = len(todo)
+
+        def dispatch(index):
+            batch = [todo.popleft() for _ in range(min(self.batch_size, len(todo)))]
+            holding[index] = batch
+            if batch:
+                idle.discard(index)
+                workers[index][1].put(batch)
+            else:
+                idle.add(index)
+
+        def finish(task, error):
+            nonlocal remaining, retried
+            if error is None:
+                done.append(task)
+            else:
+                attempts[task] = attempts.get(task, 0) + 1
+                if attempts[task] <= self.max_retries:
+                    retried += 1
+                    todo.append(task)
+                    return
+                self.logger.error(f"Give up {task} after {attempts[task]} tries: {error}")
+                dead_letters[task] = error
+            remaining -= 1
+            bar.update(1)
+            if self.callback is not None:
+                self.callback(task, error)
+
+        try:
+            with tqdm(total=remaining, desc=desc) as bar:
+                while remaining:
+                    try:
+                        kind, index, payload = messages.get(timeout=1)
+                    except queue.Empty:
+                        # Only look for dead workers once their messages are all read.
+                        for i, (process, _) in enumerate(workers):
+                            if process.is_alive():
+                                continue
+                            self.logger.error(f"Worker {i} died with exit code {process.exitcode}")
+                            lost, holding[i] = holding[i], []
+                            idle.discard(i)
+                            for task in lost:
+                                finish(task, f"Worker died with exit code {process.exitcode}")
+                            workers[i] = self._start(ctx, i, messages)
+                        kind = None
+                    if kind == "result":
+                        for task, error in payload:
+                            finish(task, error)
+                        bar.set_postfix(failed=len(dead_letters), retried=retried)
+                    if kind is not None:
+                        dispatch(index)
+                    # Retried tasks may have to wake up idle workers.
+                    for i in list(idle):
+                        if todo:
+                            dispatch(i)
+            for _, inbox in workers:
+                inbox.put(None)
+            for process, _ in workers:
+                process.join()
+        finally:
+            for process, _ in workers:
+                if process.is_alive():
+                    process.terminate()
+        self.logger.info(f"{len(done)} tasks done, {len(dead_letters)} dead letters")
+        return done, dead_letters
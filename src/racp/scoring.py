@@ -0,0 +1,284 @@
+import numpy as np
+from scipy import sparse
+from racp.graph import IdSet
+
+def _matrix(csr, columns):
+    '''A papers x ids scipy matrix of ones sharing the indices of a `racp.graph.CSR`.'''
+    data = np.ones(len(csr.indices), dtype=np.int32)
+    indptr = csr.indptr.astype(np.int32) if len(csr.indices) < 2**31 else csr.indptr
+    return sparse.csr_matrix((data, csr.indices, indptr), shape=(len(csr), columns), copy=False)
+
+def _encode(table, ids, columns):
+    '''Return the codes below `columns` of a set of ids and the size of the set.'''
+    if isinstance(ids, IdSet) and ids.table is table and ids.codes is not None:
+        return ids.codes, len(ids)
+    ids = set(ids or ())
+    codes = [table.get(id) for id in ids]
+    return np.array([code for code in codes if 0 <= code < columns], dtype=np.int64), len(ids)
+
+def topk_sparse(indices, scores, k, length):
+    '''Return the k highest of `length` scores that are 0 but at `indices`, best first.
+
+    Ties are broken by the lower index, so the rest of the k are the first zeros.
+
+    Args:
+        indices: The sorted indices of the non-zero scores.
+        scores: Their non-negative scores.
+        k: The number of indices to return.
+        length: The number of scores.
+
+    Returns:
+        indices: An int array of at most k indices.
+    '''
+    k = min(k, length)
+    positive = scores > 0
+    indices, scores = indices[positive], scores[positive]
+    top = indices[topk_indices(scores, k)]
+    if len(top) < k:
+        zeros = np.setdiff1d(np.arange(k + len(top)), top)
+        top = np.concatenate((top, zeros[:k - len(top)]))
+    return top
+
+def topk_indices(scores, k, candidates=None):
+    '''Return the indices of the k highest scores, best first.
+
+    Only the top k are sorted, ties are broken by the lower index.
+
+    Args:
+        scores: A float array.
+        k: The number of indices to return.
+        candidates: The indices that may score above 0, when all the scores are
+            non-negative. Only they are searched, see `topk_sparse`.
+
+    Returns:
+        indices: An int array of at most k indices.
+    '''
+    if candidates is not None:
+        candidates = np.sort(candidates)
+        return topk_sparse(candidates, scores[candidates], k, len(scores))
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    kth = np.partition(scores, len(scores) - k)[len(scores) - k]
+    above = np.flatnonzero(scores > kth)
+    ties = np.flatnonzero(scores == kth)[:k - len(above)]
+    indices = np.concatenate((above, ties))
+    return indices[np.lexsort((indices, -scores[indices]))]
+
+def _shared(postings, candidates):
+    '''Count how many times every candidate appears in postings.'''
+    papers, counts = np.unique(postings, return_counts=True)
+    shared = np.zeros(len(candidates), dtype=np.int64)
+    shared[np.searchsorted(candidates, papers)] = counts
+    return shared
+
+def _links(index, code, citations, references):
+    '''Find the papers of an index linked to a query, see `ccbc_codes`.'''
+    cocited = index.postings("citations", citations)
+    coreferenced = index.postings("references", references)
+    cite = index.postings("citations", [code] if code >= 0 else [])
+    cited = index.postings("papers", citations)
+    candidates = np.unique(np.concatenate((cocited, coreferenced, cite, cited))).astype(np.int64)
+    return candidates, cocited, coreferenced, cite, cited
+
+def ccbc_codes(index, code, citations, citation_length, references, reference_length):
+    '''Compute the ccbc of a query given by codes against the papers of an index.
+
+    Only the papers sharing a citation or a reference with the query, or citing it or cited
+    by it, are looked at: all the others score 0. The scores are the ones of
+    `racp.utils.ccbc`.
+
+    Args:
+        index: A `racp.graph.CitationIndex`.
+        code: The code of the query's ss_id, -1 if it isn't in the table.
+        citations: The codes of the query's citations that are in the table.
+        citation_length: The number of citations of the query, known or not.
+        references: The codes of the query's references that are in the table.
+        reference_length: The number of references of the query.
+
+    Returns:
+        candidates: The sorted indices of the papers linked to the query.
+        scores: Their ccbc with the query.
+    '''
+    candidates, cocited, coreferenced, cite, cited = _links(index, code, citations, references)
+    # 1. direct citation: one of the query and paper i is in the citations of the other.
+    score = np.where(np.isin(candidates, np.concatenate((cite, cited))), 0.5, 0.0)
+    # 2. and 3. shared citation and reference ratios.
+    score += CCBCScorer._ratio(_shared(cocited, candidates)[:, None],
+                               index.citation_lengths[candidates],
+                               np.array([citation_length]))[:, 0]
+    score += CCBCScorer._ratio(_shared(coreferenced, candidates)[:, None],
+                               index.reference_lengths[candidates],
+                               np.array([reference_length]))[:, 0]
+    return candidates, score / 2.5
+
+def weighted_ccbc_codes(index, code, citations, references, weights, paper_weights,
+                        reference_weights):
+    '''Compute the `racp.utils.weighted_ccbc` of a query against the papers of an index.
+
+    Like `ccbc_codes`, but every id of the query and of the index must be in the table.
+    The weighted sums are added in another order than `weighted_ccbc`, so the scores may
+    differ in the last bits.
+
+    Args:
+        index: A `racp.graph.CitationIndex`.
+        code: The code of the query's ss_id.
+        citations: The codes of the query's citations.
+        references: The codes of the query's references.
+        weights: A float array of the weight of every code of the table.
+        paper_weights: A float array of the weight of the ss_id of every paper of the index.
+        reference_weights: A float array of the sum of the weights of the references of
+            every paper of the index.
+
+    Returns:
+        candidates: The sorted indices of the papers linked to the query.
+        scores: Their weighted ccbc with the query.
+    '''
+    candidates, cocited, coreferenced, cite, cited = _links(index, code, citations, references)
+    weight = weights[code]
+    candidate_weights = paper_weights[candidates]
+    score = np.zeros(len(candidates))
+    # 1. direct citation relationship
+    score += np.where(np.isin(candidates, cite), weight / 6, 0.0)
+    score += np.where(np.isin(candidates, cited), candidate_weights / 6, 0.0)
+    # 2. shared citation ratio
+    shared = _shared(cocited, candidates)
+    union = index.citation_lengths[candidates] + len(citations) - shared
+    ratio = np.zeros(len(candidates))
+    np.divide(weight * candidate_weights * shared, union, out=ratio, where=shared > 0)
+    score += ratio / 3
+    # 3. shared reference ratio, with the weights of the references
+    coreferenced, values = index.postings("references", references, weights[references])
+    papers, inverse = np.unique(coreferenced, return_inverse=True)
+    shared = np.zeros(len(candidates), dtype=np.int64)
+    shared_weights = np.zeros(len(candidates))
+    shared[np.searchsorted(candidates, papers)] = np.bincount(inverse, minlength=len(papers))
+    shared_weights[np.searchsorted(candidates, papers)] = np.bincount(
+        inverse, weights=values, minlength=len(papers))
+    union = weights[references].sum() + reference_weights[candidates] - shared_weights
+    ratio = np.zeros(len(candidates))
+    np.divide(shared_weights, union, out=ratio, where=shared > 0)
+    score += ratio / 3
+    return candidates, score
+
+def ccbc_candidates(index, paper):
+    '''Compute the ccbc of a paper against the papers of a `racp.graph.CitationIndex`.
+
+    Args:
+        index: The CitationIndex of the dataset.
+        paper: A PaperItem, it doesn't have to be in the dataset.
+
+    Returns:
+        candidates: The sorted indices of the papers linked to `paper`, the others score 0.
+        scores: Their ccbc with `paper`, see `ccbc_codes`.
+    '''
+    table = index.table
+    citations, citation_length = _encode(table, paper.citations, len(table))
+    references, reference_length = _encode(table, paper.references, len(table))
+    return ccbc_codes(index, table.get(paper.ss_id), citations.tolist(), citation_length,
+                      references.tolist(), reference_length)
+
+class CCBCScorer:
+    '''Scores papers against all the papers of a `racp.graph.CitationGraph` at once.
+
+    The scores are the ones of `racp.utils.ccbc`, down to the last bit: the direct citation,
+    co-citation and bibliographic coupling terms are computed for every paper of the graph
+    with sparse matrix products over the interned ids instead of one set operation per pair.
+
+    Attributes:
+        graph: The CitationGraph of the dataset.
+    '''
+    def __init__(self, graph) -> None:
+        self.graph = graph
+        # Ids interned in the table after the graph was built aren't in any of its rows.
+        self.columns = len(graph.table)
+        self.citations = _matrix(graph.citations, self.columns)
+        self.references = _matrix(graph.references, self.columns)
+        self.citation_lengths = graph.citations.lengths()
+        self.reference_lengths = graph.references.lengths()
+
+    def _indicators(self, ids_list, extra=()):
+        '''A sparse ids x queries matrix marking the ids of every query, and their sizes.
+
+        Every code of `extra` adds a column marking only it.
+        '''
+        rows, cols = [], []
+        lengths = np.zeros(len(ids_list), dtype=np.int64)
+        for q, ids in enumerate(ids_list):
+            codes, lengths[q] = _encode(self.graph.table, ids, self.columns)
+            rows.append(codes)
+            cols.append(np.full(len(codes), q))
+        for q, code in enumerate(extra):
+            if 0 <= code < self.columns:
+                rows.append([code])
+                cols.append([len(ids_list) + q])
+        rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+        cols = np.concatenate(cols) if cols else np.empty(0, dtype=np.int64)
+        matrix = sparse.csr_matrix((np.ones(len(rows), dtype=np.int32), (rows, cols)),
+                                   shape=(self.columns, len(ids_list) + len(extra)))
+        return matrix, lengths
+
+    @staticmethod
+    def _product(matrix, indicators):
+        '''matrix @ indicators as a dense array.'''
+        if indicators.shape[1] <= 2:
+            # One pass over the edges per column beats the two passes of a sparse product.
+            return matrix @ indicators.toarray()
+        return (matrix @ indicators).toarray()
+
+    @staticmethod
+    def _ratio(shared, row_lengths, query_lengths):
+        '''|A & B| / |A | B| where the union isn't empty, else 0.'''
+        union = row_lengths[:, None] + query_lengths[None, :] - shared
+        ratio = np.zeros(shared.shape)
+        np.divide(shared, union, out=ratio, where=union > 0)
+        return ratio
+
+    def scores(self, papers):
+        '''Compute the ccbc of every paper against every paper of the graph.
+
+        The papers of the graph are scored in one pass over its edges, whatever the number
+        of papers, so scoring them together is cheaper than one by one. The result takes
+        `8 * len(graph) * len(papers)` bytes.
+
+        Args:
+            papers: A list of PaperItems, they don't have to be in the graph.
+
+        Returns:
+            scores: A float array of shape (len(papers), len(graph)), `scores[q, i]` is
+                `ccbc(papers[q], paper i)`.
+        '''
+        n = len(papers)
+        # The extra columns mark the ss_id of every query, to find the papers citing it.
+        codes = [self.graph.table.get(paper.ss_id) for paper in papers]
+        citations, citation_lengths = self._indicators([paper.citations for paper in papers], codes)
+        shared = self._product(self.citations, citations)
+        # 1. direct citation: one of the query and paper i is in the citations of the other.
+        cited = (shared[:, n:] > 0) | (citations[self.graph.paper_ids, :n].toarray() > 0)
+        score = np.where(cited, 0.5, 0.0)
+        # 2. and 3. shared citation and reference ratios.
+        score += self._ratio(shared[:, :n], self.citation_lengths, citation_lengths)
+        del cited, shared
+        references, reference_lengths = self._indicators([paper.references for paper in papers])
+        shared = self._product(self.references, references)
+        score += self._ratio(shared, self.reference_lengths, reference_lengths)
+        return np.ascontiguousarray((score / 2.5).T)
+
+    def topk(self, papers, k=100, batch_size=16):
+        '''Find the k papers of the graph with the highest ccbc for every paper.
+
+        Args:
+            papers: A list of PaperItems.
+            k: The number of papers to return for every query.
+            batch_size: The number of papers scored together by `scores`.
+
+        Returns:
+            results: A list of (indices, scores) array pairs, one per paper, best first.
+        '''
+        results = []
+        for start in range(0, len(papers), batch_size):
+            for scores in self.scores(papers[start:start + batch_size]):
+                # Most papers share nothing with the query and score 0.
+                indices = topk_indices(scores, k, np.flatnonzero(scores))
+                results.append((indices, scores[indices]))
+        return results
@@ -0,0 +1,136 @@
+import os
+import time
+import sqlite3
+
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS records (
+    key TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    updated REAL NOT NULL,
+    error TEXT,
+    result TEXT
+);
+CREATE INDEX IF NOT EXISTS records_kind_status ON records (kind, status);
+CREATE TABLE IF NOT EXISTS counts (
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    n INTEGER NOT NULL,
+    PRIMARY KEY (kind, status)
+);
+CREATE TRIGGER IF NOT EXISTS records_insert AFTER INSERT ON records BEGIN
+    INSERT INTO counts SELECT NEW.kind, NEW.status, 0 WHERE NOT EXISTS
+        (SELECT 1 FROM counts WHERE kind = NEW.kind AND status = NEW.status);
+    UPDATE counts SET n = n + 1 WHERE kind = NEW.kind AND status = NEW.status;
+END;
+CREATE TRIGGER IF NOT EXISTS records_update AFTER UPDATE OF status ON records
+WHEN OLD.status != NEW.status BEGIN
+    UPDATE counts SET n = n - 1 WHERE kind = OLD.kind AND status = OLD.status;
+    INSERT INTO counts SELECT NEW.kind, NEW.status, 0 WHERE NOT EXISTS
+        (SELECT 1 FROM counts WHERE kind = NEW.kind AND status = NEW.status);
+    UPDATE counts SET n = n + 1 WHERE kind = NEW.kind AND status = NEW.status;
+END;
+CREATE TRIGGER IF NOT EXISTS records_delete AFTER DELETE ON records BEGIN
+    UPDATE counts SET n = n - 1 WHERE kind = OLD.kind AND status = OLD.status;
+END;
+'''
+
+class CrawlState:
+    '''A persistent record of a crawl, stored as an SQLite database in the save path.
+
+    Every listing url and arXiv id is a record with a kind ("month", "page" or "paper"), a
+    status (`PENDING`, `DONE` or `FAILED`), the time of the last update and the last error.
+    Records are written as soon as a request finishes, so a crawl that crashed can be resumed
+    and a rerun only requests what is new or failed. The number of records per status is kept
+    in a summary table by triggers, so `status` doesn't scan anything.
+
+    Several processes can open the same state, each with its own CrawlState.
+
+    Attributes:
+        path: The path of the database file.
+    '''
+    def __init__(self, save_path, name="crawl_state.db") -> None:
+        self.path = os.path.join(save_path, name)
+        self.conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def add(self, keys, kind):
+        '''Add keys as pending records. Keys that already exist are left as they are.'''
+        now = time.time()
+        with self.conn:
+            self.conn.execute("BEGIN")
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO records (key, kind, status, updated) VALUES (?, ?, ?, ?)",
+                [(key, kind, PENDING, now) for key in keys]
+            )
+
+    def mark(self, keys, kind, status, error=None, result=None):
+        '''Set the status of keys, adding the ones that don't exist yet.
+
+        Args:
+            keys: A key or a list of keys.
+            kind: The kind of the records.
+            status: `PENDING`, `DONE` or `FAILED`.
+            error: The error message, if any.
+            result: A string to remember with the record, like the paper number of a month.
+        '''
+        if isinstance(keys, str):
+            keys = [keys]
+        now = time.time()
+        with self.conn:
+            self.conn.execute("BEGIN")
+            self.conn.executemany(
+                "INSERT INTO records (key, kind, status, updated, error, result) "
+                "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(key) DO UPDATE SET "
+                "status = excluded.status, updated = excluded.updated, "
+                "error = excluded.error, result = coalesce(excluded.result, result)",
+                [(key, kind, status, now, error, result) for key in keys]
+            )
+
+    def keys(self, kind, statuses=(PENDING, DONE, FAILED)):
+        '''Return the keys of the given kind whose status is in `statuses`.'''
+        statuses = list(statuses)
+        rows = self.conn.execute(
+            f"SELECT key FROM records WHERE kind = ? AND status IN ({','.join('?' * len(statuses))})",
+            [kind] + statuses
+        )
+        return [row[0] for row in rows]
+
+    def results(self, kind, statuses=(DONE,)):
+        '''Return a dictionary formated as {key : result} of the given kind and statuses.'''
+        statuses = list(statuses)
+        rows = self.conn.execute(
+            f"SELECT key, result FROM records WHERE kind = ? AND status IN ({','.join('?' * len(statuses))})",
+            [kind] + statuses
+        )
+        return dict(rows)
+
+    def get(self, key):
+        '''Return the record of a key as a dictionary, or None if it doesn't exist.'''
+        row = self.conn.execute(
+            "SELECT key, kind, status, updated, error, result FROM records WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("key", "kind", "status", "updated", "error", "result"), row))
+
+    def status(self, kind):
+        '''Return a dictionary counting the records of the given kind in each status.'''
+        counts = {PENDING: 0, DONE: 0, FAILED: 0}
+        counts.update(self.conn.execute("SELECT status, n FROM counts WHERE kind = ?", (kind,)))
+        return counts
@@ -0,0 +1,142 @@
+from array import array
+from itertools import islice
+
+from racp.columnar import ColumnarItems
+
+# The fields of a paper the statistics are read from.
+FIELDS = ("arxiv_id", "ss_id", "citations", "citation_count", "references", "authors",
+          "publication", "date")
+
+def _fingerprint(arxiv_id, ss_id, citations, citation_count, references, authors, publication,
+                 date):
+    '''Hash the fields of a paper the statistics are read from, see `FIELDS`.
+
+    The citations and references are long, only their lengths are hashed.
+    '''
+    return hash((arxiv_id, ss_id, len(citations or ()), citation_count, len(references or ()),
+                 tuple(authors or ()), tuple(publication or ()), date))
+
+def _item_fingerprint(item):
+    return _fingerprint(item.arxiv_id, item.ss_id, item.citations, item.citation_count,
+                        item.references, item.authors, item.publication, item.date)
+
+class DatasetStats:
+    '''The statistics of a `racp.data.RawSet`, kept up to date as papers are added.
+
+    All the statistics are computed in one pass over the papers, and `sync` only reads the
+    papers added since the last pass. The papers built in memory are checked against a
+    fingerprint of the fields they were counted with, and all the statistics are computed
+    again if one of them was changed in place. Only the lengths of the citations and the
+    references are compared, call `RawSet.compute_stats` after replacing some of them.
+    `RawSet.all_papers`, `all_authors`,
+    `publication_types`, `publication_years` and `paper_citations` return copies of them.
+
+    Attributes:
+        papers: A set of the semantics scholar ids of the papers, their citations and their
+            references.
+        authors: A dictionary formated as {author id : {"name", "paperCount",
+            "citationCount"}} of the authors found in the author store.
+        publication_types: A dictionary formated as {publication type : number of papers}.
+        publication_years: A dictionary formated as {year : number of papers}.
+        paper_citations: A dictionary formated as {arxiv id : citation count}.
+    '''
+    def __init__(self) -> None:
+        self.papers = set()
+        self.authors = {}
+        self.publication_types = {}
+        self.publication_years = {}
+        self.paper_citations = {}
+        self._length = 0
+        # The `_fingerprint` of every paper read.
+        self._fingerprints = array("q")
+        # Authors of the dataset that weren't in the author store yet, in order.
+        self._missing_authors = {}
+        self._store_length = 0
+
+    def __len__(self):
+        return self._length
+
+    def _read(self, dataset, start):
+        '''Return the columns the statistics need, from the paper at `start` on.'''
+        items = dataset.items
+        if start == 0:
+            column = dataset._column
+            if isinstance(items, ColumnarItems):
+                cite_nums = items.lengths("citations")
+            else:
+                cite_nums = [len(item.citations) for item in items]
+        else:
+            items = [dataset[idx] for idx in range(start, len(dataset))]
+            column = lambda attr: [getattr(item, attr) for item in items]
+            cite_nums = [len(item.citations) for item in items]
+        return column, cite_nums
+
+    def _is_changed(self, dataset):
+        '''Return whether a paper already read was changed in place since.'''
+        if isinstance(dataset.items, ColumnarItems):
+            # The items that aren't in memory are read from the store again unchanged.
+            return any(_item_fingerprint(item) != self._fingerprints[idx] \
+                       for idx, item in dataset.items.built() if idx < self._length)
+        return array("q", map(_item_fingerprint, islice(dataset.items, self._length))) != \
+            self._fingerprints
+    def sync(self, dataset):
+        '''Add the papers appended to a dataset since the last call, or compute all the
+        statistics again if the dataset got shorter or a paper was changed.'''
+        if self._length > len(dataset) or self._is_changed(dataset):
+            self.__init__()
+        if self._length < len(dataset):
+            column, cite_nums = self._read(dataset, self._length)
+            self.papers.update(column("ss_id"))
+            for cites in column("citations"):
+                self.papers.update(cites)
+            for refs in column("references"):
+                self.papers.update(refs)
+            for authors in column("authors"):
+                for author_id in authors or ():
+                    if author_id not in self.authors and author_id not in self._missing_authors:
+                        self._add_author(author_id, dataset.author_store)
+            for publication in column("publication"):
+                if publication != None:
+                    for type in publication:
+                        self.publication_types[type] = self.publication_types.get(type, 0) + 1
+            for date in column("date"):
+                try:
+                    year = date.split("-")[0]
+                except:
+                    continue
+                self.publication_years[year] = self.publication_years.get(year, 0) + 1
+            self.paper_citations.update(
+                (arxiv_id, count if count is not None else cite_num) for arxiv_id, count, cite_num \
+                in zip(column("arxiv_id"), column("citation_count"), cite_nums))
+            self._fingerprints.extend(map(_fingerprint, *map(column, FIELDS)))
+            self._length = len(dataset)
+        self._sync_authors(dataset.author_store)
+        return self
+
+    def _add_author(self, author_id, author_store):
+        author = author_store.get(author_id)
+        if author is None:
+            self._missing_authors[author_id] = None
+            return
+        self.authors[author_id] = {
+            "name": author["name"],
+            "paperCount": author["paperCount"],
+            "citationCount": author["citationCount"]
+        }
+        self._missing_authors.pop(author_id, None)
+
+    def _sync_authors(self, author_store):
+        '''Look up the authors that weren't in the author store again, if it changed since.'''
+        if self._store_length != len(author_store):
+            for author_id in list(self._missing_authors):
+                self._add_author(author_id, author_store)
+            self._store_length = len(author_store)
+
+    def update_citations(self, dataset, indices):
+        '''Read the citation counts of the papers at `indices` again, after they changed.'''
+        for idx in indices:
+            item = dataset[idx]
+            count = item.citation_count
+            self.paper_citations[item.arxiv_id] = count if count is not None else len(item.citations)
+            if idx < self._length:
+                self._fingerprints[idx] = _item_fingerprint(item)
@@ -1,5 +1,9 @@
 import os
 import json
+import hashlib
+from collections import deque
+from collections.abc import Mapping
+import numpy as np
 from loguru import logger
 import yaml
 logger.add(
@@ -67,52 +71,170 @@ def powerlaw_fit(
     return fit
 
 
+class PowerlawCDF(Mapping):
+    '''The cdf of a fitted power law, looked up like the dict `powerlaw_fit_cdf` used to return.
+
+    The dict had a key for every x of the fit and for every integer between two of them,
+    with the cdf of the x below. Here only the x and cdf of the fit are kept, as sorted
+    arrays, and the integers in between are found with `np.searchsorted`. Indexing, `get`,
+    `in`, `len`, iteration and `==` work like they did on the dict.
+
+    Attributes:
+        x: A sorted float array of the values of the fit.
+        cdf: A float array of their cdf.
+    '''
+    # Integers from 0 to TABLE_SIZE - 1, most citation counts, are looked up in a table.
+    TABLE_SIZE = 2**16
+
+    def __init__(self, x, cdf) -> None:
+        order = np.argsort(x, kind="stable")
+        self.x = np.asarray(x, dtype=np.float64)[order]
+        self.cdf = np.asarray(cdf, dtype=np.float64)[order]
+        # The integers from int(x[i]) + 1 to int(x[i + 1]) - 1 take the cdf of x[i].
+        self._low = np.trunc(self.x[:-1]) + 1
+        self._high = np.trunc(self.x[1:])
+        self._table = None
+
+    @classmethod
+    def from_fit(cls, fit):
+        '''Build from a `powerlaw.Fit` object.'''
+        x, cdf = fit.cdf()
+        return cls(x, cdf)
+
+    def _search(self, values):
+        '''Return the positions of the values in `x` giving their cdf, -1 if they have none.'''
+        pos = np.searchsorted(self.x, values, side="right") - 1
+        # Clipped so that the comparisons below read valid positions, masked after.
+        at = np.clip(pos, 0, max(len(self.x) - 1, 0))
+        gap = np.clip(pos, 0, max(len(self._low) - 1, 0))
+        found = (pos >= 0) & (self.x[at] == values) if len(self.x) else np.zeros(values.shape, bool)
+        if len(self._low):
+            found |= (pos >= 0) & (pos < len(self._low)) & (values == np.trunc(values)) \
+                & (values >= self._low[gap]) & (values < self._high[gap])
+        return np.where(found, pos, -1)
+
+    def _find(self, values):
+        '''Like `_search`, but small counts are read from a table of their positions.'''
+        values = np.asarray(values, dtype=np.float64)
+        if self._table is None:
+            self._table = self._search(np.arange(self.TABLE_SIZE, dtype=np.float64))
+        if values.ndim == 0:
+            return self._search(values)
+        small = (values >= 0) & (values < self.TABLE_SIZE)
+        if small.all() and np.array_equal(values, np.trunc(values)):
+            return self._table[values.astype(np.int64)]
+        small &= values == np.trunc(values)
+        pos = np.empty(values.shape, dtype=np.int64)
+        pos[small] = self._table[values[small].astype(np.int64)]
+        pos[~small] = self._search(values[~small])
+        return pos
+
+    def __call__(self, values, default=0.0):
+        '''Return the cdf of all the values at once, `default` for the values without one.
+
+        Args:
+            values: A number, list or array, like a citation count column.
+            default: The cdf of the values that aren't keys, default to 0. The old dict
+                advised 0 for the values below its smallest key.
+
+        Returns:
+            cdf: A float array of the shape of `values`.
+        '''
+        pos = self._find(values)
+        return np.where(pos >= 0, self.cdf[np.clip(pos, 0, None)] if len(self.cdf) else default,
+                        default)
+
+    def __getitem__(self, value):
+        try:
+            pos = int(self._find(value))
+        except (TypeError, ValueError):
+            raise KeyError(value)
+        if pos < 0:
+            raise KeyError(value)
+        return float(self.cdf[pos])
+
+    def __len__(self):
+        return len(self.x) + int(np.maximum(self._high - self._low, 0).sum())
+
+    def __iter__(self):
+        '''The values of the fit, then the integers between them, like the keys of the dict.'''
+        yield from self.x.tolist()
+        for low, high in zip(self._low.tolist(), self._high.tolist()):
+            yield from range(int(low), int(high))
+
+    def to_dict(self):
+        '''Return the dict `powerlaw_fit_cdf` used to return, it may be huge.'''
+        return dict(self.items())
+
+    def save(self, path):
+        '''Save the x and cdf of the fit as a npz file.'''
+        with open(path + ".tmp", "wb") as f:
+            np.savez(f, x=self.x, cdf=self.cdf)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path):
+        '''Load a cdf saved by `save`.'''
+        with np.load(path) as data:
+            return cls(data["x"], data["cdf"])
+
+def data_fingerprint(data, *args):
+    '''Return a sha1 hex digest of an array of numbers and some other arguments.'''
+    digest = hashlib.sha1(np.ascontiguousarray(data, dtype=np.float64).tobytes())
+    digest.update(repr(args).encode())
+    return digest.hexdigest()
+
 def powerlaw_fit_cdf(
     data,
     xmin=None,
-    fit_method="Likelihood"
+    fit_method="Likelihood",
+    cache_dir=None
 ):
     '''This function use `powerlaw` to fit the given data and returns cdf.
     
     Note that some values not appeared in the given data will not have a cdf
     value. For example, 100 may not exist in the data, but 99 exists. We use
-    the cdf of 99 as a substitute of the cdf of 100 in the returned dict. In 
-    addition, the returned dict's keys don't start with 0. You can treat all
-    the value less than the min of the keys as 0.
+    the cdf of 99 as a substitute of the cdf of 100. In addition, the keys
+    don't start with 0. You can treat all the value less than the min of the
+    keys as 0, which is what `PowerlawCDF.__call__` does by default.
     
     Args:
         data: List or array.
         xmin: The data value beyond which distributions should be fitted. 
         fit_method: "Likelihood" as default, "KS" optional.
+        cache_dir: A directory to keep the fitted cdfs in, keyed by a hash of `data`,
+            `xmin` and `fit_method`, so the same data is only fitted once. Default to None,
+            which doesn't cache.
 
     Returns:
-        cdf: A dictionary formated as {x : cdf(x)}.
+        cdf: A `PowerlawCDF`, that works like a dictionary formated as {x : cdf(x)}.
     '''
-    fit = powerlaw_fit(data, xmin, fit_method)
-    cdf = fit.cdf()
-    cdf = dict([(cdf[0][i], cdf[1][i]) for i in range(len(cdf[0]))])
-    count = min(cdf.keys())
-    extra_values = {}
-    last_cdf = 0
-    for k, v in cdf.items():
-        if k != count + 1:
-            for i in range(int(count)+1, int(k)):
-                extra_values[i] = last_cdf
-        last_cdf = v
-        count = k
-    cdf.update(extra_values)
+    path = None
+    if cache_dir != None:
+        path = os.path.join(makedir(cache_dir, logger),
+                            f"powerlaw_{data_fingerprint(data, xmin, fit_method)}.npz")
+        if os.path.exists(path):
+            return PowerlawCDF.load(path)
+    cdf = PowerlawCDF.from_fit(powerlaw_fit(data, xmin, fit_method))
+    if path != None:
+        cdf.save(path)
     return cdf
 
 def parse_pdf(
     pdfpath=None,
-    stream=None
+    stream=None,
+    max_pages=None,
+    max_chars=None
 ):
     '''Parse pdf files into raw text.
-    
+
     Args:
         pdfpath: The path to pdf file.
         stream: If your pdf has already been read in binary mode, then use this arg.
-    
+        max_pages: Only parse the first `max_pages` pages, default to all pages.
+        max_chars: Stop parsing once the text has `max_chars` characters and cut it there,
+            default to no limit.
+
     Returns:
         text: Raw text.
     '''
@@ -121,10 +243,141 @@ def parse_pdf(
         pdf = fitz.open(stream=stream.read(), filetype="pdf")
     else:
         pdf = fitz.open(pdfpath)
-    text = ""
-    for page in pdf.pages():
-        text += page.get_text()
-    return text
+    with pdf:
+        if max_chars is None:
+            return "".join(page.get_text() for page in pdf.pages(0, max_pages))
+        texts = []
+        length = 0
+        for page in pdf.pages(0, max_pages):
+            texts.append(page.get_text())
+            length += len(texts[-1])
+            if length >= max_chars:
+                break
+        return "".join(texts)[:max_chars]
+
+def _parse_worker(conn, max_pages, max_chars):
+    '''Parse the pdfs sent through `conn` until a None arrives.'''
+    while True:
+        path = conn.recv()
+        if path is None:
+            break
+        try:
+            conn.send((path, parse_pdf(path, max_pages=max_pages, max_chars=max_chars), None))
+        except Exception as e:
+            conn.send((path, None, repr(e)))
+
+def parse_pdfs(
+    paths,
+    processes=None,
+    timeout=60,
+    max_pages=None,
+    max_chars=None
+):
+    '''Parse many pdf files into raw text with a pool of processes.
+
+    Every process parses one file at a time and results are yielded as soon as they are
+    ready. A process that takes more than `timeout` seconds on a file, or that crashes, is
+    killed and replaced, so a malformed pdf only costs its own file.
+
+    Args:
+        paths: A directory, whose `.pdf` files are parsed, or an iterable of pdf paths.
+        processes: Number of processes, default to the number of CPUs.
+        timeout: Seconds allowed per file, None means no limit.
+        max_pages: Only parse the first `max_pages` pages of a file, default to all pages.
+        max_chars: Keep at most `max_chars` characters of a file, default to no limit.
+
+    Yields:
+        result: A tuple (path, text, error) per file in the order they finish. `text` is
+            None and `error` describes the failure if the file failed.
+    '''
+    import time
+    import multiprocessing
+    from multiprocessing.connection import wait
+    if isinstance(paths, str):
+        paths = sorted(os.path.join(paths, file) for file in os.listdir(paths) \
+                       if file.lower().endswith(".pdf"))
+    paths = iter(paths)
+    ctx = multiprocessing.get_context()
+    workers = {}  # conn : [process, path, start time]
+
+    def start():
+        conn, child = ctx.Pipe()
+        process = ctx.Process(target=_parse_worker, args=(child, max_pages, max_chars), daemon=True)
+        process.start()
+        child.close()
+        workers[conn] = [process, None, None]
+        assign(conn)
+
+    def assign(conn):
+        path = next(paths, None)
+        workers[conn][1:] = [path, time.monotonic()]
+        if path is not None:
+            conn.send(path)
+
+    def kill(conn):
+        process = workers.pop(conn)[0]
+        process.kill()
+        process.join()
+        conn.close()
+
+    try:
+        for _ in range(processes or os.cpu_count() or 1):
+            start()
+        while any(path is not None for _, path, _ in workers.values()):
+            busy = [conn for conn, (_, path, _) in workers.items() if path is not None]
+            wait_for = None
+            if timeout is not None:
+                deadline = min(workers[conn][2] for conn in busy) + timeout
+                wait_for = max(0, deadline - time.monotonic())
+            ready = wait(busy, wait_for)
+            for conn in ready:
+                try:
+                    path, text, error = conn.recv()
+                except (EOFError, OSError):
+                    # The process died, maybe killed by a crash in the parser.
+                    path = workers[conn][1]
+                    kill(conn)
+                    yield path, None, "The parsing process died"
+                    start()
+                    continue
+                yield path, text, error
+                assign(conn)
+            if timeout is not None:
+                now = time.monotonic()
+                for conn in [conn for conn in busy if conn not in ready]:
+                    path, started = workers[conn][1:]
+                    # Results that came while the caller held the generator still count.
+                    if now - started > timeout and not conn.poll():
+                        kill(conn)
+                        yield path, None, f"Timeout after {timeout} secs"
+                        start()
+    finally:
+        for conn in list(workers):
+            if workers[conn][0].is_alive():
+                try:
+                    conn.send(None)
+                except OSError:
+                    pass
+            workers[conn][0].join(1)
+            kill(conn)
+
+def bounded_map(executor, fn, tasks, window):
+    '''Like `executor.map`, with at most `window` tasks submitted and not yet returned.
+
+    Args:
+        executor: A concurrent.futures executor.
+        fn: The function to run.
+        tasks: A deque of argument tuples of `fn`, consumed as the tasks are submitted.
+        window: The maximum number of pending tasks.
+
+    Returns:
+        results: A generator of the results of `fn`, in the order of `tasks`.
+    '''
+    pending = deque()
+    while tasks or pending:
+        while tasks and len(pending) < window:
+            pending.append(executor.submit(fn, *tasks.popleft()))
+        yield pending.popleft().result()
 
 def ccbc(paperA,paperB):
     """Calculate citation similarity index. 
@@ -144,16 +397,16 @@ def ccbc(paperA,paperB):
     if paperA.ss_id in paperB.citations or \
         paperB.ss_id in paperA.citations:
             score += 0.5 
-    # 2. shared citation ratio 
-    cocite = paperA.citations.intersection(paperB.citations)
-    alcite = paperA.citations.union(paperB.citations)
+    # 2. shared citation ratio, the union is counted from the intersection
+    cocite = len(paperA.citations.intersection(paperB.citations))
+    alcite = len(paperA.citations) + len(paperB.citations) - cocite
     if alcite:
-        score += len(cocite) / len(alcite)
+        score += cocite / alcite
     # 3. shared reference ratio 
-    coref = paperA.references.intersection(paperB.references)
-    alref = paperA.references.union(paperB.references)
+    coref = len(paperA.references.intersection(paperB.references))
+    alref = len(paperA.references) + len(paperB.references) - coref
     if alref:
-        score += len(coref) / len(alref)
+        score += coref / alref
     
     return score / 2.5
 
@@ -0,0 +1,118 @@
+import numpy as np
+
+# The index types of the retriever as faiss index factory strings, all with the L2 metric.
+INDEX_TYPES = {
+    "flat": "Flat",
+    "ivf": "IVF{nlist},Flat",
+    "hnsw": "HNSW{hnsw_m}",
+    "pq": "PQ{pq_m}x{pq_bits}",
+    "ivfpq": "IVF{nlist},PQ{pq_m}x{pq_bits}",
+}
+
+DEFAULT_INDEX = {"index_type": "flat", "nlist": None, "nprobe": 16, "hnsw_m": 32,
+                 "ef_construction": 64, "ef_search": 64, "pq_m": 16, "pq_bits": 8,
+                 "train_size": 100000}
+
+# The parameters only used by the searches, they can change without building the index again.
+SEARCH_PARAMS = ("nprobe", "ef_search")
+
+# faiss warns below 39 training points per centroid.
+POINTS_PER_CENTROID = 39
+
+def index_params(config=None, **kwargs):
+    '''Return the index parameters of a config.
+
+    Args:
+        config: An object with the parameters as attributes, like the retriever config, the
+            missing ones default to `DEFAULT_INDEX`.
+        **kwargs: Parameters that override the ones of the config.
+
+    Returns:
+        params: A dictionary formated as {parameter : value} with all the keys of `DEFAULT_INDEX`.
+    '''
+    params = {}
+    for key, default in DEFAULT_INDEX.items():
+        value = getattr(config, key, None)
+        params[key] = value if value is not None else default
+    params.update(kwargs)
+    if params["index_type"] not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type {params['index_type']}, expected one of {list(INDEX_TYPES)}.")
+    return params
+
+def structure_key(params):
+    '''The parameters that change how the vectors are stored, None for the flat index.'''
+    if params["index_type"] == "flat":
+        return None
+    return dict((key, value) for key, value in params.items() if key not in SEARCH_PARAMS)
+
+def uses_ivf(params):
+    return params["index_type"] in ("ivf", "ivfpq")
+
+def uses_pq(params):
+    return params["index_type"] in ("pq", "ivfpq")
+
+def resolve_params(params, n):
+    '''Fix the parameters that depend on the number of vectors `n`.
+
+    The number of lists defaults to 4 * sqrt(n), at most n / `POINTS_PER_CENTROID` so that
+    every list is trained on enough points. An index that needs more training points than
+    there are vectors falls back to the flat index.
+    '''
+    params = dict(params)
+    train = min(n, params["train_size"])
+    if uses_ivf(params):
+        nlist = params["nlist"] or int(4 * np.sqrt(n))
+        params["nlist"] = max(1, min(nlist, train // POINTS_PER_CENTROID))
+    if uses_pq(params) and train < 2 ** params["pq_bits"]:
+        params["index_type"] = "flat"
+    if uses_ivf(params) and train < params["nlist"]:
+        params["index_type"] = "flat"
+    return params
+
+def make_index(dim, params):
+    '''Return an empty faiss index of the type and parameters of `params`, see `resolve_params`.'''
+    import faiss
+    if uses_pq(params) and dim % params["pq_m"]:
+        raise ValueError(f"pq_m={params['pq_m']} doesn't divide the vector size {dim}.")
+    index = faiss.index_factory(dim, INDEX_TYPES[params["index_type"]].format(**params), faiss.METRIC_L2)
+    if params["index_type"] == "hnsw":
+        faiss.downcast_index(index).hnsw.efConstruction = params["ef_construction"]
+    set_search_params(index, params)
+    return index
+
+def index_type_of(index):
+    '''Return the type of a faiss index built by `make_index`, one of `INDEX_TYPES`.'''
+    import faiss
+    name = type(faiss.downcast_index(index)).__name__
+    return {"IndexIVFFlat": "ivf", "IndexIVFPQ": "ivfpq", "IndexHNSWFlat": "hnsw",
+            "IndexPQ": "pq"}.get(name, "flat")
+
+def set_search_params(index, params):
+    '''Set the nprobe of an IVF index or the efSearch of an HNSW index.
+
+    The type is read from the index, which is flat if `resolve_params` fell back to it,
+    not from `params`.
+    '''
+    import faiss
+    index_type = index_type_of(index)
+    if index_type in ("ivf", "ivfpq"):
+        faiss.extract_index_ivf(index).nprobe = params["nprobe"]
+    elif index_type == "hnsw":
+        faiss.downcast_index(index).hnsw.efSearch = params["ef_search"]
+
+def train_index(index, vectors):
+    '''Train an index on some vectors, if it needs it.'''
+    if not index.is_trained:
+        index.train(np.ascontiguousarray(vectors, dtype=np.float32))
+    return index
+
+def sample_rows(n, size, seed=0):
+    '''Return at most `size` of the rows 0 to n - 1 picked at random, in order.'''
+    if n <= size:
+        return np.arange(n)
+    return np.sort(np.random.default_rng(seed).choice(n, size, replace=False))
+
+def index_memory(index):
+    '''Return the size of an index in bytes, as it is written to disk.'''
+    import faiss
+    return faiss.serialize_index(index).nbytes
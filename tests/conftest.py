@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The local stand-in HTTP servers of the benchmarks, see benchmark/mock_server.py.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "benchmark"))
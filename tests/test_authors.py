@@ -0,0 +1,60 @@
+import json
+
+from loguru import logger
+
+from racp import crawl
+from racp.data import AuthorStore, get_items_by_arxiv
+from mock_server import MockHandler, MockServer
+
+
+class SemanticScholarHandler(MockHandler):
+    # The ids of every author batch request.
+    batches = []
+
+    def respond(self, method, path, body):
+        ids = json.loads(body)["ids"]
+        if path.startswith("/author/batch"):
+            self.batches.append(ids)
+            # Semantics scholar answers null for the authors it doesn't know.
+            data = [None if author_id == "0" else {"authorId": author_id, "name": f"Author {author_id}",
+                    "paperCount": 1, "citationCount": int(author_id)} for author_id in ids]
+        else:
+            data = [{"paperId": f"s{i}", "externalIds": {"ArXiv": i[len("arXiv:"):]}, "title": i,
+                     "abstract": "", "publicationTypes": [], "publicationDate": "2023-01-01",
+                     "citations": [], "references": [],
+                     "authors": [{"authorId": str(k)} for k in range(3)]} for i in ids]
+        return 200, "application/json", json.dumps(data).encode()
+
+
+def serve(monkeypatch):
+    handler = type("Handler", (SemanticScholarHandler,), {"batches": []})
+    server = MockServer(handler)
+    monkeypatch.setattr(crawl, "SEMANTIC_SCHOLAR_API", server.url)
+    return server
+
+
+def test_authors_are_fetched_once(tmp_path, monkeypatch):
+    with serve(monkeypatch) as server:
+        store = AuthorStore(logger=logger)
+        assert store.fetch(["1", "2", "1", None, "0"]) == ["1", "2", "0"]
+        assert store.fetch(["2", "0", "3"]) == ["3"]
+        assert store.fetch(["1", "3"]) == []
+        assert server.handler.batches == [["1", "2", "0"], ["3"]]
+    assert store["3"]["citationCount"] == 3
+    assert "0" in store and store["0"] is None
+
+    store.save(str(tmp_path / "authors.json"))
+    reopened = AuthorStore(str(tmp_path / "authors.json"))
+    assert reopened.authors == store.authors
+
+
+def test_papers_share_the_author_store(monkeypatch):
+    with serve(monkeypatch) as server:
+        store = AuthorStore(logger=logger)
+        items, failed_ids = get_items_by_arxiv(["2301.00001", "2301.00002"], logger, content=False,
+                                               author_store=store)
+        items += get_items_by_arxiv(["2301.00003"], logger, content=False, author_store=store)[0]
+        assert server.handler.batches == [["0", "1", "2"]]
+    assert not failed_ids
+    assert [item.authors for item in items] == [["0", "1", "2"]] * 3
+    assert len(store) == 3
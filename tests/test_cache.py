@@ -0,0 +1,58 @@
+import pytest
+
+from racp.cache import CacheMiss, ResponseCache
+from racp.client import CrawlClient
+from mock_server import MockHandler, MockServer
+
+
+class EchoHandler(MockHandler):
+    def respond(self, method, path, body):
+        return 200, "text/plain", path.encode()
+
+
+def test_expired_entries_are_missed(tmp_path):
+    cache = ResponseCache(str(tmp_path), ttls={"paper": -1})
+    paper, listing = "http://host/graph/v1/paper/1", "http://host/list/cs.IR/2301"
+    cache.put(cache.key("GET", paper), paper, b"paper")
+    cache.put(cache.key("GET", listing), listing, b"listing")
+    assert cache.get(cache.key("GET", paper), paper) is None
+    assert cache.get(cache.key("GET", listing), listing) == b"listing"
+    # Nothing expires in replay mode.
+    cache.replay = True
+    assert cache.get(cache.key("GET", paper), paper) == b"paper"
+    with pytest.raises(CacheMiss):
+        cache.get(cache.key("GET", paper + "0"), paper + "0")
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ResponseCache(str(tmp_path), max_bytes=25)
+    urls = [f"http://host/paper/{i}" for i in range(3)]
+    cache.put(cache.key("GET", urls[0]), urls[0], b"0" * 10)
+    cache.put(cache.key("GET", urls[1]), urls[1], b"1" * 10)
+    assert cache.get(cache.key("GET", urls[0]), urls[0]) is not None
+    cache.put(cache.key("GET", urls[2]), urls[2], b"2" * 10)
+    assert cache.size() == 20
+    assert cache.get(cache.key("GET", urls[1]), urls[1]) is None
+    assert cache.get(cache.key("GET", urls[0]), urls[0]) == b"0" * 10
+
+
+def test_identical_bodies_are_stored_once(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    for i in range(3):
+        url = f"http://host/paper/{i}"
+        cache.put(cache.key("GET", url), url, b"same")
+    assert cache.size() == 4
+
+
+def test_client_replays_the_cache(tmp_path):
+    with MockServer(EchoHandler) as server:
+        client = CrawlClient(cache=ResponseCache(str(tmp_path)))
+        assert client.get(server.url + "/paper/1").text == "/paper/1"
+        assert client.get(server.url + "/paper/1").text == "/paper/1"
+        assert client.get(server.url + "/paper/1", cache=False).text == "/paper/1"
+        assert server.requests == 2
+        url = server.url
+    replay = CrawlClient(cache=ResponseCache(str(tmp_path), replay=True))
+    assert replay.get(url + "/paper/1").content == b"/paper/1"
+    with pytest.raises(CacheMiss):
+        replay.get(url + "/paper/2")
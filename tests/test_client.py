@@ -0,0 +1,59 @@
+import time
+
+import pytest
+
+from racp.client import CrawlClient, TokenBucket
+from mock_server import MockHandler, MockServer
+
+
+class FlakyHandler(MockHandler):
+    # Number of 503 answers before the first success, for every path.
+    failures = 2
+    answered = {}
+
+    def respond(self, method, path, body):
+        count = self.answered.get(path, 0)
+        self.answered[path] = count + 1
+        if path.startswith("/missing"):
+            return 404, "text/plain", b"missing"
+        if count < self.failures:
+            return 503, "text/plain", b"busy"
+        return 200, "text/plain", path.encode()
+
+
+def flaky(failures):
+    return type("Handler", (FlakyHandler,), {"failures": failures, "answered": {}})
+
+
+def test_client_retries_until_it_succeeds():
+    client = CrawlClient(max_retries=3, backoff=0.01)
+    with MockServer(flaky(2)) as server:
+        assert client.get(server.url + "/paper").text == "/paper"
+        assert server.requests == 3
+
+
+def test_client_gives_up():
+    client = CrawlClient(max_retries=1, backoff=0.01)
+    with MockServer(flaky(5)) as server:
+        with pytest.raises(ConnectionError):
+            client.get(server.url + "/paper")
+        assert server.requests == 2
+        # Client errors are not retried.
+        with pytest.raises(ConnectionError):
+            client.get(server.url + "/missing")
+        assert server.requests == 3
+
+
+def test_backoff_delay():
+    client = CrawlClient(backoff=1.0, max_backoff=4.0)
+    for attempt in range(6):
+        assert 0 <= client.backoff_delay(attempt) <= min(4.0, 2 ** attempt)
+    assert client.backoff_delay(0, retry_after=10) == 10
+
+
+def test_token_bucket_limits_the_rate():
+    bucket = TokenBucket(rate=50, capacity=1)
+    start = time.monotonic()
+    for _ in range(6):
+        bucket.acquire()
+    assert time.monotonic() - start >= 5 / 50 * 0.9
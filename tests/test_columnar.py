@@ -0,0 +1,114 @@
+from loguru import logger
+
+from racp import crawl
+from racp.data import PaperItem, RawSet
+
+
+def make_items(count):
+    items = []
+    for i in range(count):
+        item = PaperItem(logger=logger)
+        item.arxiv_id = f"a{i}"
+        item.ss_id = f"s{i}"
+        item.citations = set(f"c{j}" for j in range(i % 3))
+        item.references = set()
+        item.authors = []
+        item.title = f"Paper {i}"
+        item.abstract = f"abstract {i}"
+        items.append(item)
+    return items
+
+
+def test_refresh_citations_rewrites_the_columnar_store(tmp_path, monkeypatch):
+    path = str(tmp_path / "data.columnar")
+    dataset = RawSet()
+    dataset.load_from_papers(make_items(50))
+    dataset.save_columnar(path)
+
+    counts = dict((f"s{i}", 100 + i) for i in range(0, 50, 2))
+    monkeypatch.setattr(crawl, "get_citation_counts", lambda ss_ids, *args, **kwargs: (counts, []))
+    dataset = RawSet(path)
+    summary = dataset.refresh_citations(save_path=path)
+    assert summary["updated"] == 25
+
+    assert not list((tmp_path / "data.columnar").glob("a[0-9]*.json"))
+    reopened = RawSet(path)
+    for i, item in enumerate(reopened):
+        assert item.citation_count == (100 + i if i % 2 == 0 else None)
+    assert reopened.paper_citations()["a2"] == 102
+    assert reopened.paper_citations()["a1"] == 1
+    assert not dataset.items.changed
+
+
+def test_iterating_a_columnar_dataset_keeps_few_items(tmp_path):
+    path = str(tmp_path / "data.columnar")
+    dataset = RawSet()
+    dataset.load_from_papers(make_items(50))
+    dataset.save_columnar(path)
+
+    dataset = RawSet(path)
+    dataset.items.cache_size = 10
+    assert [item.arxiv_id for item in dataset] == [f"a{i}" for i in range(50)]
+    assert len(dataset.items.cache) == 10
+    item = dataset.items.keep(3)
+    item.title = "Changed"
+    for _ in dataset:
+        pass
+    assert dataset[3].title == "Changed"
+    assert dataset.items.column("title")[3] == "Changed"
+
+
+def test_columnar_items_changed_in_place_survive_the_cache(tmp_path):
+    path = str(tmp_path / "data.columnar")
+    dataset = RawSet()
+    dataset.load_from_papers(make_items(50))
+    dataset.save_columnar(path)
+
+    dataset = RawSet(path)
+    dataset.items.cache_size = 10
+    dataset[3].citation_count = 1000
+    dataset[4].authors.append("author")
+    dataset[5].citations.add("c9")
+    for _ in dataset:
+        pass
+    assert dataset[3].citation_count == 1000
+    assert dataset[4].authors == ["author"]
+    assert dataset.items.column("citations")[5] == set(["c0", "c1", "c9"])
+    assert sorted(dataset.items.changed) == [3, 4, 5]
+    assert len(dataset.items.cache) == 10
+
+    # Written changes don't need to be held anymore.
+    dataset.items.write_column("citation_count")
+    dataset.items.write_column("authors")
+    assert sorted(dataset.items.changed) == [5]
+    reopened = RawSet(path)
+    assert reopened[3].citation_count == 1000 and reopened[4].authors == ["author"]
+    assert reopened[5].citations == set(["c0", "c1"])
+
+
+def test_graph_views_can_be_changed(tmp_path):
+    dataset = RawSet()
+    dataset.load_from_papers(make_items(10))
+    graph = dataset.build_graph()
+    item = dataset[2]
+    assert item.citations == set(["c0", "c1"])
+    item.citations.add("c7")
+    item.references |= set(["r1"])
+    assert item.citations == set(["c0", "c1", "c7"]) and "c7" in item.citations
+    assert item.references == set(["r1"])
+    assert item.citations - set(["c0"]) == set(["c1", "c7"])
+    # The graph only changes when it is built again.
+    assert graph.citation_set(2) == set(["c0", "c1"])
+    assert dataset.build_graph().citation_set(2) == set(["c0", "c1", "c7"])
+
+    path = str(tmp_path / "data.columnar")
+    dataset.save_columnar(path)
+    dataset = RawSet(path)
+    dataset.items.cache_size = 4
+    dataset.build_graph()
+    dataset[4].citations.discard("c0")
+    for _ in dataset:
+        pass
+    assert dataset[4].citations == set()
+    assert list(dataset.items.column("citations")[4]) == []
+    assert list(dataset.items.changed) == [4]
@@ -0,0 +1,78 @@
+import json
+from urllib.parse import parse_qs, urlsplit
+
+from loguru import logger
+
+from racp import crawl
+from racp.client import CrawlClient
+from racp.state import CrawlState, DONE, FAILED
+from mock_server import MockHandler, MockServer
+
+
+class ListingHandler(MockHandler):
+    papers = 150
+    # Months whose first page fails once.
+    failing = set()
+
+    def respond(self, method, path, body):
+        url = urlsplit(path)
+        month = url.path.rstrip("/").split("/")[-1]
+        query = parse_qs(url.query)
+        if "skip" not in query:
+            if month in self.failing:
+                self.failing.discard(month)
+                return 500, "text/plain", b""
+            page = f"<html><body><small>[ total of {self.papers} entries: 1-25 ]</small></body></html>"
+        else:
+            skip = int(query["skip"][0])
+            links = "".join(f'<a href="/pdf/{month}.{i:05d}" title="Download PDF">pdf</a>'
+                            for i in range(skip, min(skip + 100, self.papers)))
+            page = f"<html><body>{links}</body></html>"
+        return 200, "text/html", page.encode()
+
+
+def test_get_ids_crawls_every_page(tmp_path):
+    handler = type("Handler", (ListingHandler,), {"failing": {"2303"}})
+    with MockServer(handler) as server:
+        ids = crawl.get_ids(1, ["cs.IR"], str(tmp_path), logger, concurrency=8, interval=0,
+                            base_url=server.url + "/list")
+        # 12 months, each a count page, a failed try for one of them, and 2 pages of ids.
+        assert server.requests == 12 * 3 + 1
+    assert sorted(ids) == sorted(f"23{month:02d}.{i:05d}" for month in range(1, 13) \
+                                 for i in range(150))
+    with CrawlState(str(tmp_path)) as state:
+        assert state.status("month")[DONE] == 12
+        assert state.status("page")[DONE] == 24
+        assert state.status("paper")[DONE] == 0
+
+
+def test_get_ids_only_crawls_what_is_left(tmp_path):
+    with MockServer(ListingHandler) as server:
+        url = server.url + "/list"
+        first = crawl.get_ids(1, ["cs.IR"], str(tmp_path), logger, interval=0, base_url=url)
+        with CrawlState(str(tmp_path)) as state:
+            state.mark(f"{url}/cs.IR/2305?skip=100&show=100", "page", FAILED, error="lost")
+        requests = server.requests
+        again = crawl.get_ids(1, ["cs.IR"], str(tmp_path), logger, interval=0, base_url=url)
+        assert server.requests == requests + 1
+    assert sorted(again) == sorted(first)
+
+
+class CitationHandler(MockHandler):
+    def respond(self, method, path, body):
+        ids = json.loads(body)["ids"]
+        if "broken" in ids:
+            return 200, "application/json", b'{"error": "Internal"}'
+        data = [None if ss_id == "unknown" else {"citationCount": len(ss_id)} for ss_id in ids]
+        return 200, "application/json", json.dumps(data).encode()
+
+
+def test_citation_counts_report_the_failed_chunks(monkeypatch):
+    with MockServer(CitationHandler) as server:
+        monkeypatch.setattr(crawl, "SEMANTIC_SCHOLAR_API", server.url)
+        client = CrawlClient(max_retries=0)
+        ss_ids = ["a", "bb", "unknown", "ccc", "broken", "dddd"]
+        counts, failed_ids = crawl.get_citation_counts(ss_ids, client=client, batch_size=2)
+        assert counts == {"a": 1, "bb": 2, "ccc": 3}
+        assert sorted(failed_ids) == ["broken", "dddd"]
+        assert crawl.get_citaions(ss_ids, client=client, batch_size=2) == counts
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("langchain")
+from racp.retriver import EmbeddingPipeline
+
+
+class FakeTokenizer:
+    def __call__(self, texts, truncation=True, max_length=None):
+        return {"input_ids": [text.split()[:max_length] for text in texts]}
+
+
+class FakeModel:
+    '''Encodes a text as its number of words and the length of its first word.'''
+    max_seq_length = 128
+
+    def __init__(self):
+        self.tokenizer = FakeTokenizer()
+        self.batches = []
+
+    def encode(self, texts, batch_size=32, show_progress_bar=False, convert_to_numpy=True,
+               normalize_embeddings=False):
+        assert batch_size == len(texts)
+        self.batches.append(list(texts))
+        return np.array([[len(text.split()), len(text.split(" ")[0])] for text in texts])
+
+
+def make_texts(count):
+    rng = np.random.default_rng(0)
+    texts = [" ".join(["w" * (i % 5 + 1)] + ["w"] * int(rng.integers(0, 300))) for i in range(count)]
+    # Newlines are read as spaces, like HuggingFaceEmbeddings does.
+    return [text.replace(" ", "\n", 2) if i % 7 == 0 else text for i, text in enumerate(texts)]
+
+
+def test_embed_keeps_the_order_of_the_texts():
+    texts = make_texts(300)
+    model = FakeModel()
+    vectors = EmbeddingPipeline("fake", batch_size=16, max_tokens=1024, model=model).embed(texts)
+    expected = [[len(text.split()), len(text.split()[0])] for text in texts]
+    assert vectors.dtype == np.float32
+    assert vectors.tolist() == expected
+    assert all("\n" not in text for batch in model.batches for text in batch)
+
+
+def test_batches_stay_under_the_token_budget():
+    texts = make_texts(300)
+    pipeline = EmbeddingPipeline("fake", batch_size=16, max_tokens=1024, model=FakeModel())
+    lengths = pipeline.lengths(texts)
+    assert lengths.max() == FakeModel.max_seq_length
+    batches = pipeline.batches(lengths)
+    assert sorted(np.concatenate(batches).tolist()) == list(range(len(texts)))
+    for batch in batches:
+        assert 1 <= len(batch) <= 16
+        # A batch is padded to its longest text.
+        assert len(batch) == 1 or len(batch) * lengths[batch].max() <= 1024
+    # Texts of similar length go together, so the batches come in order of length.
+    assert all(lengths[a].max() <= lengths[b].min() for a, b in zip(batches, batches[1:]))
+    assert len(batches[0]) == 16
+    assert max(len(batch) for batch in batches if lengths[batch].max() == 128) == 1024 // 128
+
+
+def test_embed_of_no_texts():
+    assert EmbeddingPipeline("fake", model=FakeModel()).embed([]).shape == (0, 0)
@@ -0,0 +1,40 @@
+import multiprocessing
+
+import numpy as np
+
+from racp.embedding_store import EmbeddingStore, get_store
+
+
+def test_stores_of_a_namespace_share_rows(tmp_path):
+    a = EmbeddingStore(str(tmp_path), "model")
+    b = EmbeddingStore(str(tmp_path), "model")
+    b.add(["b1", "b2"], np.ones((2, 4)))
+    a.add(["a1"], np.full((1, 4), 2.0))
+    vectors, found = a.get(["a1", "b2"])
+    assert found.all()
+    assert (vectors[0] == 2).all() and (vectors[1] == 1).all()
+    vectors, found = b.get(["a1"])
+    assert found.all() and (vectors[0] == 2).all()
+    assert len(EmbeddingStore(str(tmp_path), "model")) == 3
+    assert get_store(str(tmp_path), "model") is get_store(str(tmp_path / "."), "model")
+
+
+def _append(path, worker):
+    store = EmbeddingStore(path, "model")
+    for i in range(20):
+        store.add([f"{worker}-{i}", "shared"], np.full((2, 4), worker, dtype=np.float32))
+
+
+def test_processes_append_to_one_namespace(tmp_path):
+    ctx = multiprocessing.get_context("spawn")
+    workers = [ctx.Process(target=_append, args=(str(tmp_path), worker)) for worker in range(1, 4)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join()
+    store = EmbeddingStore(str(tmp_path), "model")
+    texts = [f"{worker}-{i}" for worker in range(1, 4) for i in range(20)]
+    vectors, found = store.get(texts)
+    assert found.all()
+    assert (vectors[:, 0] == np.repeat([1, 2, 3], 20)).all()
+    assert store.get(["shared"])[1].all() and len(store) == 61
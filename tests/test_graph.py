@@ -0,0 +1,67 @@
+import random
+
+import numpy as np
+
+from racp.data import PaperItem, RawSet
+from racp.graph import CSR, IdSet, IdTable
+
+
+def make_items(count, pool=40, seed=0):
+    rng = random.Random(seed)
+    items = []
+    for i in range(count):
+        item = PaperItem()
+        item.arxiv_id = f"a{i}"
+        item.ss_id = f"s{i}"
+        item.citations = set(f"s{rng.randrange(pool)}" for _ in range(rng.randint(0, 8)))
+        item.references = set(f"s{rng.randrange(pool)}" for _ in range(rng.randint(0, 8)))
+        items.append(item)
+    return items
+
+
+def test_id_table_interns_ids_once():
+    table = IdTable(["b", "a", "b"])
+    assert table.ids == ["b", "a"]
+    assert table.intern("c") == 2 and table.get("d") == -1
+    assert table.encode(["c", "b", "c", "e"]).tolist() == [0, 2, 3]
+    assert "e" in table and table[3] == "e"
+
+
+def test_csr_rows_are_sorted_sets():
+    table = IdTable()
+    rows = [["x", "y", "x"], set(), None, ("z", "y")]
+    csr = CSR.from_lists(table, rows)
+    assert len(csr) == 4
+    assert csr.lengths().tolist() == [2, 0, 0, 2]
+    for i, row in enumerate(rows):
+        assert [table[code] for code in csr[i]] == sorted(set(row or ()), key=table.get)
+    transposed = csr.transpose(len(table))
+    assert [transposed[table.get(id)].tolist() for id in "xyz"] == [[0], [0, 3], [3]]
+
+
+def test_id_sets_work_like_sets():
+    table = IdTable()
+    csr = CSR.from_lists(table, [["a", "b", "c"], ["b", "c", "d"], ["z"]])
+    a, b, c = (IdSet(table, csr[i]) for i in range(3))
+    expected = ({"a", "b", "c"}, {"b", "c", "d"}, {"z"})
+    for view, ids in zip((a, b, c), expected):
+        assert view == ids and len(view) == len(ids) and set(view) == ids
+    assert a.intersection(b) == {"b", "c"}
+    assert a.union(b) == {"a", "b", "c", "d"}
+    assert a & c == set() and a - b == {"a"}
+    assert "a" in a and "d" not in a and "unknown" not in a
+    assert a.intersection({"c", "unknown"}) == {"c"}
+
+
+def test_build_graph_keeps_the_ids_of_the_items():
+    items = make_items(30)
+    expected = [(set(item.citations), set(item.references)) for item in items]
+    dataset = RawSet()
+    dataset.load_from_papers(items)
+    graph = dataset.build_graph()
+    assert len(graph) == 30
+    assert graph.table.get("s3") == graph.paper_ids[3]
+    for item, (citations, references) in zip(dataset, expected):
+        assert isinstance(item.citations, IdSet)
+        assert item.citations == citations and item.references == references
+    assert np.array_equal(graph.citations.lengths(), [len(c) for c, _ in expected])
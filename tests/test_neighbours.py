@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from racp.data import PaperItem, RawSet
+from racp.neighbours import NeighbourTable, build_neighbours
+
+
+def make_item(i):
+    item = PaperItem()
+    item.arxiv_id = f"{i:04d}"
+    item.ss_id = f"s{i}"
+    # Papers sharing citations and references have a ccbc above 0.
+    item.citations = set(f"c{j}" for j in range(i % 4, i % 4 + 3))
+    item.references = set(f"r{j}" for j in range(i % 5, i % 5 + 2))
+    item.authors = []
+    item.title = f"Paper {i}"
+    return item
+
+
+def assert_same_table(table, expected, dataset):
+    assert len(table) == len(expected)
+    ids = dataset._column("arxiv_id")
+    for i in range(len(dataset)):
+        rows, scores = table[i]
+        expected_rows, expected_scores = expected[i]
+        # Ties can be ordered differently, the scores can't.
+        assert np.allclose(scores, expected_scores)
+        assert set(ids[j] for j in rows[scores > scores.min()]) == \
+            set(ids[j] for j in expected_rows[expected_scores > scores.min()])
+
+
+@pytest.mark.parametrize("inserted", [[3, 10], [40, 41]])
+def test_update_finds_the_rows_of_a_reloaded_directory(tmp_path, inserted):
+    data = tmp_path / "data"
+    data.mkdir()
+    for i in range(42):
+        if i not in inserted:
+            make_item(i).save_json(str(data))
+    table_path = str(tmp_path / "table")
+    build_neighbours(RawSet(str(data), processes=1), table_path, n=8, processes=1)
+
+    # The new files sort among the old ones, so the papers move in the dataset.
+    for i in inserted:
+        make_item(i).save_json(str(data))
+    dataset = RawSet(str(data), processes=1)
+    table = NeighbourTable(table_path)
+    table.update(dataset)
+    assert table.arxiv_ids == dataset._column("arxiv_id")
+
+    build_neighbours(dataset, str(tmp_path / "fresh"), n=8, processes=1)
+    assert_same_table(table, NeighbourTable(str(tmp_path / "fresh")), dataset)
+
+
+def test_update_raises_when_papers_are_gone(tmp_path):
+    dataset = RawSet()
+    dataset.load_from_papers([make_item(i) for i in range(20)])
+    build_neighbours(dataset, str(tmp_path), n=4, processes=1)
+    smaller = RawSet()
+    smaller.load_from_papers([make_item(i) for i in range(1, 20)])
+    with pytest.raises(ValueError):
+        NeighbourTable(str(tmp_path)).update(smaller)
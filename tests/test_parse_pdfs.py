@@ -0,0 +1,51 @@
+import multiprocessing
+import os
+import time
+
+import pytest
+
+from racp import utils
+
+
+def make_pdf(path, pages):
+    fitz = pytest.importorskip("fitz")
+    pdf = fitz.open()
+    for i in range(pages):
+        pdf.new_page().insert_text((72, 72), f"Page {i}")
+    pdf.save(path)
+    pdf.close()
+
+
+def test_parse_pdfs_reads_a_directory(tmp_path):
+    for i in range(3):
+        make_pdf(str(tmp_path / f"{i}.pdf"), pages=i + 1)
+    (tmp_path / "broken.pdf").write_bytes(b"not a pdf")
+    results = dict((os.path.basename(path), (text, error)) for path, text, error \
+                   in utils.parse_pdfs(str(tmp_path), processes=2, max_pages=2))
+    assert sorted(results) == ["0.pdf", "1.pdf", "2.pdf", "broken.pdf"]
+    assert results["2.pdf"][0].split() == ["Page", "0", "Page", "1"]
+    assert results["broken.pdf"][0] is None and results["broken.pdf"][1]
+
+
+def slow_parse(path, max_pages=None, max_chars=None):
+    if "slow" in path:
+        time.sleep(60)
+    if "crash" in path:
+        os._exit(1)
+    return path
+
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != "fork",
+                    reason="the workers see the patched parser only when they are forked")
+def test_slow_and_crashing_files_only_cost_themselves(monkeypatch):
+    monkeypatch.setattr(utils, "parse_pdf", slow_parse)
+    paths = ["a", "slow", "b", "crash", "c", "d"]
+    start = time.monotonic()
+    results = dict((path, (text, error)) for path, text, error \
+                   in utils.parse_pdfs(paths, processes=2, timeout=1))
+    assert time.monotonic() - start < 10
+    assert sorted(results) == sorted(paths)
+    for path in ("a", "b", "c", "d"):
+        assert results[path] == (path, None)
+    assert results["slow"] == (None, "Timeout after 1 secs")
+    assert results["crash"] == (None, "The parsing process died")
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from racp.utils import PowerlawCDF, powerlaw_fit, powerlaw_fit_cdf
+
+
+def dict_cdf(x, y):
+    '''The dict `powerlaw_fit_cdf` returned before `PowerlawCDF`.'''
+    cdf = dict([(x[i], y[i]) for i in range(len(x))])
+    count = min(cdf.keys())
+    extra_values = {}
+    last_cdf = 0
+    for k, v in cdf.items():
+        if k != count + 1:
+            for i in range(int(count)+1, int(k)):
+                extra_values[i] = last_cdf
+        last_cdf = v
+        count = k
+    cdf.update(extra_values)
+    return cdf
+
+
+def test_lookups_match_the_dict():
+    x = np.array([1.0, 2.0, 2.5, 7.0, 8.0, 40.0, 1000.0])
+    y = np.linspace(0.1, 1.0, len(x))
+    expected = dict_cdf(x, y)
+    cdf = PowerlawCDF(x, y)
+    assert cdf == expected and len(cdf) == len(expected)
+    assert sorted(cdf) == sorted(expected)
+    values = [0, 1, 2, 2.5, 3, 3.5, 6, 7, 39, 40, 41, 999, 1000, 1001, 70000, -1]
+    for value in values:
+        assert cdf.get(value) == expected.get(value)
+        assert (value in cdf) == (value in expected)
+    assert cdf(values).tolist() == [expected.get(value, 0.0) for value in values]
+    assert cdf(np.array(values).reshape(4, 4)).shape == (4, 4)
+    with pytest.raises(KeyError):
+        cdf[3.5]
+
+
+def test_fitted_cdf_is_cached(tmp_path):
+    pytest.importorskip("powerlaw")
+    data = np.minimum(np.random.default_rng(0).zipf(1.8, 2000), 5000)
+    fit = powerlaw_fit(data, xmin=1)
+    x, y = fit.cdf()
+    expected = dict_cdf(x, y)
+    cdf = powerlaw_fit_cdf(data, xmin=1, cache_dir=str(tmp_path))
+    assert cdf == expected
+    assert len(list(tmp_path.glob("powerlaw_*.npz"))) == 1
+    cached = powerlaw_fit_cdf(data, xmin=1, cache_dir=str(tmp_path))
+    assert np.array_equal(cached.x, cdf.x) and np.array_equal(cached.cdf, cdf.cdf)
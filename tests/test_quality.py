@@ -0,0 +1,46 @@
+import json
+
+import numpy as np
+
+from racp.data import PaperItem, RawSet
+from racp.quality import QUALITY_FILE, citation_score
+
+
+def make_item(i):
+    item = PaperItem()
+    item.arxiv_id = f"{i:04d}"
+    item.ss_id = f"s{i}"
+    item.citation_count = i
+    item.citations = set()
+    item.references = set()
+    item.authors = [f"author{i % 3}"]
+    item.date = "2023-01-01"
+    item.title = f"Paper {i}"
+    return item
+
+
+def test_quality_reads_the_papers_changed_since_it_was_saved(tmp_path):
+    for i in range(10):
+        make_item(i).save_json(str(tmp_path))
+    dataset = RawSet(str(tmp_path), processes=1)
+    dataset.save_quality()
+    assert (tmp_path / QUALITY_FILE).exists()
+
+    path = tmp_path / "0003.json"
+    data = json.loads(path.read_text())
+    data["citationCount"] = 500
+    path.write_text(json.dumps(data))
+    reopened = RawSet(str(tmp_path), processes=1)
+    expected = citation_score([500 if i == 3 else i for i in range(10)])
+    assert np.allclose(reopened.quality.scores, expected)
+
+
+def test_author_inputs_follow_the_author_store(tmp_path):
+    dataset = RawSet()
+    dataset.load_from_papers([make_item(i) for i in range(6)])
+    dataset.quality.weights = {"citation": 0.0, "date": 0.0, "author": 1.0}
+    assert not dataset.quality.scores.any()
+
+    dataset.author_store.add({"authorId": "author1", "paperCount": 2, "citationCount": 20})
+    scores = dataset.quality.scores
+    assert np.allclose(scores, [np.log1p(10) if i % 3 == 1 else 0 for i in range(6)])
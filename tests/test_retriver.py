@@ -0,0 +1,171 @@
+import hashlib
+import json
+import os
+import types
+
+import numpy as np
+import pytest
+
+pytest.importorskip("langchain")
+pytest.importorskip("faiss")
+from racp import retriver
+from racp.data import PaperItem, RawSet
+from racp.retriver import Retriver
+
+
+def vector(text):
+    return np.frombuffer(hashlib.sha1(text.encode()).digest()[:8], np.uint8) / 255.0
+
+
+class FakeTokenizer:
+    def __call__(self, texts, truncation=True, max_length=None):
+        return {"input_ids": [text.split()[:max_length] for text in texts]}
+
+
+class FakeModel:
+    '''Encodes a text as 8 bytes of its sha1, counting the texts it encodes.'''
+    max_seq_length = 128
+
+    def __init__(self):
+        self.tokenizer = FakeTokenizer()
+        self.texts = 0
+
+    def encode(self, texts, batch_size=32, show_progress_bar=False, convert_to_numpy=True,
+               normalize_embeddings=False):
+        self.texts += len(texts)
+        return np.array([vector(text) for text in texts])
+
+
+class FakeEmbeddings:
+    '''Stands for HuggingFaceEmbeddings, so that no model is downloaded.'''
+    client = FakeModel()
+
+    def __init__(self, model_name=None, model_kwargs=None, encode_kwargs=None):
+        pass
+
+    def embed_documents(self, texts):
+        return [vector(text).tolist() for text in texts]
+
+    def embed_query(self, text):
+        return vector(text).tolist()
+
+
+@pytest.fixture
+def model(monkeypatch):
+    monkeypatch.setattr(retriver, "HuggingFaceEmbeddings", FakeEmbeddings)
+    FakeEmbeddings.client = FakeModel()
+    return FakeEmbeddings.client
+
+
+def make_config(tmp_path, **kwargs):
+    # Every abstract is shorter than a chunk, so a paper is one document.
+    config = dict(chunk_size=200, chunk_overlap=0, model_name="fake", device="cpu",
+                  normalize_embeddings=False, embedding_store=str(tmp_path / "embeddings"))
+    return types.SimpleNamespace(**dict(config, **kwargs))
+
+
+def paper(i, abstract=None):
+    item = PaperItem()
+    item.arxiv_id = f"a{i}"
+    item.title = f"Paper {i}"
+    item.abstract = abstract or f"abstract of paper {i}"
+    item.citation_count = i
+    item.citations = set()
+    return item
+
+
+def dataset(papers):
+    data = RawSet()
+    data.load_from_papers(papers)
+    return data
+
+
+def expected(papers, query, k):
+    distances = [((vector(item.abstract) - vector(query)) ** 2).sum() for item in papers]
+    return sorted(papers[i].arxiv_id for i in np.argsort(distances, kind="stable")[:k])
+
+
+def found(retriever, query, k):
+    return sorted(doc.metadata["source"] for doc, _ in retriever.search(query, k))
+
+
+def check(retriever, papers):
+    for query in ("graph", "retrieval", "paper 3"):
+        assert found(retriever, query, 10) == expected(papers, query, 10)
+
+
+def test_the_snapshot_is_loaded_again(tmp_path, model):
+    papers = [paper(i) for i in range(50)]
+    path = str(tmp_path / "index")
+    check(Retriver(make_config(tmp_path), dataset(papers), index_path=path), papers)
+    assert model.texts == 50
+    snapshots = os.listdir(path)
+    assert len(snapshots) == 1
+
+    # A new embedding store, so only a loaded snapshot embeds nothing.
+    config = make_config(tmp_path, embedding_store=str(tmp_path / "other"))
+    check(Retriver(config, dataset(papers), index_path=path), papers)
+    assert model.texts == 50
+    # Another chunk size is another snapshot.
+    Retriver(make_config(tmp_path, chunk_size=300), dataset(papers), index_path=path)
+    assert len(os.listdir(path)) == 2
+
+
+def test_papers_are_added_updated_and_deleted(tmp_path, model):
+    papers = dict((f"a{i}", paper(i)) for i in range(50))
+    path = str(tmp_path / "index")
+    retriever = Retriver(make_config(tmp_path), dataset(list(papers.values())), index_path=path)
+    quality = paper(7)
+    quality.citation_count = 1000
+    changes = [paper(100), paper(101), paper(5, "an entirely new abstract"), quality]
+    assert retriever.add_papers(changes) == {"added": 3, "patched": 1}
+    assert retriever.delete_papers(["a9", "a10", "unknown"]) == {"deleted": 2}
+    assert model.texts == 53
+    for item in changes:
+        papers[item.arxiv_id] = item
+    del papers["a9"], papers["a10"]
+    check(retriever, list(papers.values()))
+    assert retriever._state.patches["a7"]["quality"] == quality.to_Document().metadata["quality"]
+
+    # The delta is saved with the snapshot, and the database of the next retriever changed.
+    papers["a20"] = paper(20, "another new abstract")
+    papers["a200"] = paper(200)
+    retriever = Retriver(make_config(tmp_path), dataset(list(papers.values())), index_path=path)
+    assert model.texts == 55
+    check(retriever, list(papers.values()))
+
+    retriever.compact()
+    assert retriever._state.delta is None
+    assert retriever._state.base.index.ntotal == len(papers)
+    check(retriever, list(papers.values()))
+    check(Retriver(make_config(tmp_path), dataset(list(papers.values())), index_path=path),
+          list(papers.values()))
+    assert model.texts == 55
+
+
+@pytest.mark.parametrize("index_type", ["ivf", "hnsw"])
+def test_approximate_indexes(tmp_path, model, index_type):
+    from racp.vector_index import index_type_of
+    papers = [paper(i) for i in range(200)]
+    path = str(tmp_path / "index")
+    # Every list is probed, so the ivf index finds the exact neighbours.
+    config = make_config(tmp_path, index_type=index_type, nlist=4, nprobe=4)
+    retriever = Retriver(config, dataset(papers), index_path=path)
+    assert index_type_of(retriever.db.index) == index_type
+    assert retriever.db.index.ntotal == 200
+    if index_type == "ivf":
+        check(retriever, papers)
+    retriever = Retriver(config, dataset(papers), index_path=path)
+    assert index_type_of(retriever.db.index) == index_type
+    with open(os.path.join(retriever.snapshot, "snapshot.json")) as f:
+        assert json.load(f)["index_type"] == index_type
+    assert model.texts == 200
+
+
+def test_too_few_documents_fall_back_to_flat(tmp_path, model):
+    from racp.vector_index import index_type_of
+    papers = [paper(i) for i in range(10)]
+    config = make_config(tmp_path, index_type="ivfpq", pq_m=4)
+    retriever = Retriver(config, dataset(papers), index_path=str(tmp_path / "index"))
+    assert index_type_of(retriever.db.index) == "flat"
+    check(retriever, papers)
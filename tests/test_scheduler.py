@@ -0,0 +1,45 @@
+import multiprocessing
+import os
+
+import pytest
+
+from racp.scheduler import DownloadScheduler
+
+
+pytestmark = pytest.mark.skipif(multiprocessing.get_start_method() != "fork",
+                                reason="the tasks keep their markers in the forked workers")
+
+
+def work(tasks):
+    '''"bad" tasks always fail, "flaky" tasks fail and "crash" tasks kill their worker the
+    first time, which they remember by creating the file after the colon.'''
+    failures = {}
+    for task in tasks:
+        kind, _, marker = task.partition(":")
+        if kind == "bad":
+            failures[task] = "bad task"
+        elif kind in ("flaky", "crash") and not os.path.exists(marker):
+            open(marker, "w").close()
+            if kind == "crash":
+                os._exit(1)
+            failures[task] = "flaky task"
+    return failures
+
+
+def test_failed_tasks_are_retried_then_dead_lettered(tmp_path):
+    tasks = [f"ok:{i}" for i in range(20)] + ["bad:", f"flaky:{tmp_path / 'flaky'}"]
+    finished = []
+    scheduler = DownloadScheduler(work, processes=3, max_retries=2, batch_size=2,
+                                  callback=lambda task, error: finished.append(task))
+    done, dead_letters = scheduler.run(tasks)
+    assert sorted(done) == sorted(tasks[:20] + [tasks[-1]])
+    assert dead_letters == {"bad:": "bad task"}
+    assert sorted(finished) == sorted(tasks)
+
+
+def test_the_tasks_of_a_dead_worker_are_retried(tmp_path):
+    tasks = [f"ok:{i}" for i in range(5)] + [f"crash:{tmp_path / 'crash'}"]
+    scheduler = DownloadScheduler(work, processes=2, max_retries=1)
+    done, dead_letters = scheduler.run(tasks)
+    assert sorted(done) == sorted(tasks)
+    assert not dead_letters
@@ -0,0 +1,81 @@
+import random
+
+import numpy as np
+
+from racp.data import PaperItem, RawSet
+from racp.graph import CitationIndex
+from racp.scoring import ccbc_candidates
+from racp.utils import ccbc
+
+
+def make_items(count, pool=40, seed=0):
+    rng = random.Random(seed)
+    items = []
+    for i in range(count):
+        item = PaperItem()
+        item.arxiv_id = f"a{i}"
+        item.ss_id = f"s{i}"
+        item.citations = set(f"s{rng.randrange(pool)}" for _ in range(rng.randint(0, 8)))
+        item.references = set(f"s{rng.randrange(pool)}" for _ in range(rng.randint(0, 8)))
+        items.append(item)
+    return items
+
+
+def make_query():
+    paper = PaperItem()
+    paper.ss_id = "outside"
+    paper.citations = {"s1", "s2", "unknown"}
+    paper.references = {"s3", "s5"}
+    return paper
+
+
+def test_scorer_matches_ccbc():
+    items = make_items(60)
+    dataset = RawSet()
+    dataset.load_from_papers(items)
+    queries = items[:20] + [make_query()]
+    expected = np.array([[ccbc(query, item) for item in items] for query in queries])
+    assert np.array_equal(dataset.scorer.scores(queries), expected)
+
+
+def test_topk_matches_the_ccbc_loop():
+    items = make_items(60)
+    dataset = RawSet()
+    dataset.load_from_papers(items)
+    for query in items[:20] + [make_query()]:
+        scores = np.array([ccbc(query, item) for item in items])
+        # Best first, ties to the paper loaded first.
+        expected = sorted(range(len(items)), key=lambda i: -scores[i])[:10]
+        found = [int(item.arxiv_id[1:]) for item in dataset.topk(query, k=10)]
+        assert found == expected
+        batch = [int(item.arxiv_id[1:]) for item in dataset.topk_batch([query], k=10)[0]]
+        assert np.array_equal(scores[batch], scores[expected])
+
+
+def test_index_follows_added_papers():
+    items = make_items(60)
+    dataset = RawSet()
+    dataset.load_from_papers(items[:40])
+    dataset.index
+    for item in items[40:]:
+        dataset.add_item(item)
+    assert len(dataset.index) == 60
+    query = make_query()
+    scores = np.array([ccbc(query, item) for item in items])
+    expected = sorted(range(len(items)), key=lambda i: -scores[i])[:10]
+    assert [int(item.arxiv_id[1:]) for item in dataset.topk(query, k=10)] == expected
+
+
+def test_saved_index_finds_the_same_papers(tmp_path):
+    dataset = RawSet()
+    dataset.load_from_papers(make_items(60))
+    index = dataset.index
+    index.save(str(tmp_path / "index"))
+    loaded = CitationIndex.load(str(tmp_path / "index"), dataset.graph.table)
+    assert len(loaded) == 60
+    for kind in CitationIndex.KINDS:
+        for code in range(len(index.table)):
+            assert np.array_equal(loaded.postings(kind, [code]), index.postings(kind, [code]))
+    candidates, scores = ccbc_candidates(loaded, make_query())
+    expected, expected_scores = ccbc_candidates(index, make_query())
+    assert np.array_equal(candidates, expected) and np.array_equal(scores, expected_scores)
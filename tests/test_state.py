@@ -0,0 +1,21 @@
+from racp.state import CrawlState, PENDING, DONE, FAILED
+
+
+def test_records_are_kept_between_runs(tmp_path):
+    with CrawlState(str(tmp_path)) as state:
+        state.add(["a", "b", "c"], "paper")
+        state.add(["a"], "paper")
+        state.mark("a", "paper", DONE, result="1")
+        state.mark(["b", "d"], "paper", FAILED, error="timeout")
+    with CrawlState(str(tmp_path)) as state:
+        assert state.status("paper") == {PENDING: 1, DONE: 1, FAILED: 2}
+        assert sorted(state.keys("paper", (PENDING, FAILED))) == ["b", "c", "d"]
+        assert state.results("paper") == {"a": "1"}
+        assert state.get("b")["error"] == "timeout"
+        assert state.get("e") is None
+        # The result of a record is kept when it is marked again without one.
+        state.mark("a", "paper", FAILED, error="lost")
+        state.mark("a", "paper", DONE)
+        assert state.results("paper") == {"a": "1"}
+        assert state.status("paper") == {PENDING: 1, DONE: 1, FAILED: 2}
+        assert state.status("page") == {PENDING: 0, DONE: 0, FAILED: 0}
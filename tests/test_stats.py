@@ -0,0 +1,49 @@
+from racp.data import PaperItem, RawSet
+
+
+def make_item(i):
+    item = PaperItem()
+    item.arxiv_id = f"a{i}"
+    item.ss_id = f"s{i}"
+    item.citations = set(f"c{j}" for j in range(i % 3))
+    item.references = set()
+    item.authors = [f"author{i % 2}"]
+    item.publication = ["JournalArticle"]
+    item.date = f"20{10 + i % 2}-01-01"
+    item.title = f"Paper {i}"
+    return item
+
+
+def test_statistics_are_copies():
+    dataset = RawSet()
+    dataset.load_from_papers([make_item(i) for i in range(6)])
+    dataset.author_store.add({"authorId": "author0", "name": "A", "paperCount": 1,
+                              "citationCount": 2})
+    dataset.all_papers().add("x")
+    dataset.all_authors()["author0"]["name"] = "B"
+    dataset.publication_types().clear()
+    dataset.paper_citations()["a0"] = 100
+    assert "x" not in dataset.all_papers()
+    assert dataset.all_authors()["author0"]["name"] == "A"
+    assert dataset.publication_types() == {"JournalArticle": 6}
+    assert dataset.paper_citations()["a0"] == 0
+
+
+def test_statistics_follow_changed_items(tmp_path):
+    dataset = RawSet()
+    dataset.load_from_papers([make_item(i) for i in range(6)])
+    assert dataset.publication_years() == {"2010": 3, "2011": 3}
+    dataset[0].date = "2012-01-01"
+    dataset[1].citations.add("new")
+    dataset[2].citation_count = 50
+    assert dataset.publication_years() == {"2010": 2, "2011": 3, "2012": 1}
+    assert "new" in dataset.all_papers()
+    assert dataset.paper_citations()["a1"] == 2
+    assert dataset.paper_citations()["a2"] == 50
+
+    path = str(tmp_path / "data.columnar")
+    dataset.save_columnar(path)
+    dataset = RawSet(path)
+    assert dataset.publication_years() == {"2010": 2, "2011": 3, "2012": 1}
+    dataset[3].publication = ["Review"]
+    assert dataset.publication_types() == {"JournalArticle": 5, "Review": 1}
@@ -0,0 +1,30 @@
+import pytest
+
+from racp.vector_index import index_params, resolve_params, structure_key
+
+
+def test_index_params_default_to_the_flat_index():
+    params = index_params(None, nprobe=8)
+    assert params["index_type"] == "flat" and params["nprobe"] == 8
+    assert structure_key(params) is None
+    with pytest.raises(ValueError):
+        index_params(None, index_type="lsh")
+
+
+def test_search_params_are_not_part_of_the_structure():
+    ivf = index_params(None, index_type="ivf", nlist=64)
+    assert structure_key(ivf) == structure_key(dict(ivf, nprobe=1, ef_search=1))
+    assert structure_key(ivf) != structure_key(dict(ivf, nlist=32))
+
+
+def test_resolve_params():
+    ivf = index_params(None, index_type="ivf")
+    assert resolve_params(ivf, 100000)["nlist"] == int(4 * 100000 ** 0.5)
+    # Every list is trained on at least 39 points.
+    assert resolve_params(ivf, 1000)["nlist"] == 1000 // 39
+    assert resolve_params(ivf, 10)["nlist"] == 1
+    assert resolve_params(ivf, 0)["index_type"] == "flat"
+    pq = index_params(None, index_type="pq", pq_bits=8)
+    assert resolve_params(pq, 255)["index_type"] == "flat"
+    assert resolve_params(pq, 256)["index_type"] == "pq"
+    assert resolve_params(index_params(None, index_type="hnsw"), 0)["index_type"] == "hnsw"
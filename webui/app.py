@@ -11,12 +11,32 @@ import yaml
 from racp.retriver import Retriver
 from racp.data import PaperItem ,RawSet
 from racp import utils 
-print("start loading database...")
+from racp.cache import ResponseCache
+from racp.client import CrawlClient, set_client
 config = utils.load_config("./retriver_config.yaml")
-database = RawSet(config.dbpath,length = -1)
-print("start loading retriver...")
-retriver = Retriver(config,database)
-print("initialization end ... ")
+if getattr(config, "response_cache", None):
+    # 同一篇论文再次查询时直接从缓存读取，不再重新下载
+    set_client(CrawlClient(cache=ResponseCache(config.response_cache)))
+
+# 嵌入进程用 spawn 启动，会重新导入本模块，所以数据集和索引在第一次使用时才加载，
+# flask run 和 WSGI 服务器不会执行 __main__ 里的代码
+database = None
+retriver = None
+
+def get_database():
+    global database
+    if database is None:
+        print("start loading database...")
+        database = RawSet(config.dbpath,length = -1,processes=getattr(config, "load_processes", None))
+    return database
+
+def get_retriver():
+    global retriver
+    if retriver is None:
+        print("start loading retriver...")
+        # 数据集、模型和切分参数不变时直接加载保存的索引
+        retriver = Retriver(config,get_database(),index_path=getattr(config, "index_path", None))
+    return retriver
 
 def process_text_and_file(input_text, uploaded_file):
     """return string of raw text """
@@ -33,11 +53,13 @@ def process_arxiv_id(arxiv_id,k=1000,api_key=""):
     # 根据arxiv id 爬 pdf -> 文档 
     try:
         paper = PaperItem(arxiv_id=arxiv_id,key=api_key)
-        topkitems = database.topk(paper,k=k)
+        topkitems = get_database().topk(paper,k=k)
         topkpaper = RawSet()
         topkpaper.load_from_papers(topkitems)
         # build retriver 
-        local_retriver = Retriver(config,topkpaper)
+        # 只有 k 篇论文，训练或构建 IVF/HNSW 索引不划算，用 flat 索引
+        local_config = utils.ConfigObject(dict(vars(config), index_type="flat"))
+        local_retriver = Retriver(local_config,topkpaper)
         result = local_retriver.retrival(paper.abstract,k=10)
     except ConnectionError as e:
         result = e 
@@ -72,7 +94,7 @@ def index():
             processed_text = process_text_and_file(input_text, uploaded_file,api_key)
             # 将结果存储在session中，以便在下一次请求时使用
             session['processed_text'] = processed_text
-            result = retriver.retrival(processed_text)
+            result = get_retriver().retrival(processed_text)
             session['arxiv_result'] = result
         
         # print(session['arxiv_result'])
@@ -86,4 +108,6 @@ def index():
     session.pop('arxiv_result', None)
     return render_template('index.html')
 if __name__ == '__main__':
+    get_retriver()
+    print("initialization end ... ")
     app.run(port=6006,debug=False)
\ No newline at end of file